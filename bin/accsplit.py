@@ -0,0 +1,131 @@
+#
+#  accsplit.py
+###########################################################################
+#
+#  Purpose:
+#
+#      Splits accession IDs into (prefixPart, numericPart) for the
+#      ACC_Accession bcp file, like accessionlib.split_accnum(), but with
+#      string fast paths for the few ID shapes strainmarkerload.py writes:
+#
+#          ENSMUSG<digits>              ENSMUSG00000000001
+#          MGP_<strain>_G<digits>       MGP_AJ_G0000011
+#          MGI_C57BL6J_<digits>         MGI_C57BL6J_95661
+#
+#      Anything else goes to accessionlib.split_accnum().
+#
+#      The fast paths are checked against split_accnum(): the first ID of
+#      each distinct prefix is split both ways, and the fast path is only
+#      used for that prefix if the results agree. With verify=True every
+#      ID is split both ways, split_accnum() wins, and disagreements are
+#      counted.
+#
+#  Usage:
+#
+#      import accsplit
+#      splitter = accsplit.AccSplitter()
+#      prefixPart, numericPart = splitter.split(accID)
+#
+#      # check every ID in FILE (one per line, or the accID column of an
+#      # ACC_Accession bcp file with -c 2) against split_accnum()
+#      python accsplit.py [-c COLUMN] FILE
+#
+###########################################################################
+
+import sys
+import argparse
+
+import accessionlib
+
+ENSPREFIX = 'ENSMUSG'
+MGPPREFIX = 'MGP_'
+B6PREFIX = 'MGI_C57BL6J_'
+
+class AccSplitter:
+    # Is: an accession ID splitter
+    # Has: the prefixes whose fast path agreed with split_accnum(), the number
+    #   of IDs split each way, the disagreements found when verifying
+    # Does: splits accession IDs into (prefixPart, numericPart)
+    #
+    def __init__ (self, verify=False):
+        # Purpose: constructor
+        self.verify = verify
+        self.trusted = {}       # {prefix: True if the fast path agrees with split_accnum}
+        self.fastCt = 0
+        self.slowCt = 0
+        self.mismatches = []    # [(accID, fast result, split_accnum result), ...]
+
+    def fastSplit (self, accID):
+        # Returns: (prefix, digits) for the known shapes, else None
+
+        if accID.startswith(ENSPREFIX):
+            i = len(ENSPREFIX)
+        elif accID.startswith(B6PREFIX):
+            i = len(B6PREFIX)
+        elif accID.startswith(MGPPREFIX):
+            i = accID.rfind('_G') + 2
+            if i < len(MGPPREFIX) + 2:
+                return None
+        else:
+            return None
+        digits = accID[i:]
+        if not digits.isdigit() or not digits.isascii():
+            return None
+        return (accID[:i], digits)
+
+    def split (self, accID):
+        # Returns: (prefixPart, numericPart), as accessionlib.split_accnum()
+
+        parts = self.fastSplit(accID)
+        if parts is None:
+            self.slowCt += 1
+            return accessionlib.split_accnum(accID)
+
+        prefix, digits = parts
+        trusted = self.trusted.get(prefix)
+        if trusted is None or self.verify:
+            fast = (prefix, int(digits))
+            expected = tuple(accessionlib.split_accnum(accID))
+            if trusted is None:
+                trusted = self.trusted[prefix] = fast == expected
+            if fast != expected:
+                self.mismatches.append((accID, fast, expected))
+            self.slowCt += 1
+            return expected
+        if not trusted:
+            self.slowCt += 1
+            return accessionlib.split_accnum(accID)
+
+        self.fastCt += 1
+        return (prefix, int(digits))
+
+    def report (self):
+        # Returns: a one-line summary of the split counts and any disagreements
+
+        untrusted = sorted([p for p in self.trusted if not self.trusted[p]])
+        return 'accession IDs split: %s fast, %s by split_accnum, %s disagreements%s' \
+            % (self.fastCt, self.slowCt, len(self.mismatches),
+               (', fast path disabled for: %s' % ', '.join(untrusted)) if untrusted else '')
+
+# end class AccSplitter ---------------------------------
+
+def main():
+    parser = argparse.ArgumentParser(description='Check AccSplitter against accessionlib.split_accnum.')
+    parser.add_argument('-c', '--column', metavar='INT', type=int, default=1,
+        help='1-based tab-delimited column holding the accession ID. Default: 1')
+    parser.add_argument('file', help='File of accession IDs, "-" for stdin')
+    args = parser.parse_args()
+
+    splitter = AccSplitter(verify=True)
+    fp = sys.stdin if args.file == '-' else open(args.file, 'r')
+    for line in fp:
+        line = line.rstrip('\n')
+        if line:
+            splitter.split(line.split('\t')[args.column - 1])
+    for accID, fast, expected in splitter.mismatches[:20]:
+        print('%s: fast %s, split_accnum %s' % (accID, fast, expected))
+    print(splitter.report())
+    return 1 if splitter.mismatches else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
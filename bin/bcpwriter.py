@@ -0,0 +1,271 @@
+#
+#  bcpwriter.py
+###########################################################################
+#
+#  Purpose:
+#
+#      Writers (and readers) for the bcp files of the tables loaded by
+#      strainmarkerload.py, in one of two formats:
+#
+#      text    tab-delimited text, one row per line, loaded by bcpin.csh
+#      binary  PostgreSQL binary COPY format, loaded by
+#              psql "\copy TABLE from FILE with (format binary)"
+#
+#      Rows are passed as tuples of column values, in table column order.
+#      The binary writer converts each value to the column's type, so the
+#      server does not parse integers and dates back out of text.
+#
+#      Trailing columns that are the same on every row (created by/modified
+#      by, creation/modification date) are given once, as constants, and
+#      rendered once; write() then takes only the leading columns.
+#      Rendered rows are collected and written BATCHROWS at a time to a file
+#      opened with a BUFFERSIZE buffer.
+#
+#      TextWriter without a table also writes the downstream gene model files;
+#      ListWriter keeps such rows in memory, for callers in the same process.
+#
+#  Usage:
+#
+#      import bcpwriter
+#      w = bcpwriter.openWriter('ACC_Accession.bcp', 'ACC_Accession', 'binary',
+#              constants=(userKey, userKey, loaddate, loaddate))
+#      w.write((accKey, accID, prefixPart, numericPart, ..., private, preferred))
+#      w.close()
+#
+#      gm = bcpwriter.TextWriter('gm_mgpinputfile.txt')
+#      gm.write((mgpensID, chr, start, end, strand, description, ''))
+#
+#      for row in bcpwriter.readRows('ACC_Accession.bcp', 'ACC_Accession', 'binary'):
+#          ...   # row is a list of strings, as in the text format
+#
+#      # verify a binary file row for row against a text file of the same table
+#      python bcpwriter.py TABLE TEXTFILE BINARYFILE
+#
+#  Column types (TABLES):
+#
+#      int4, int2   '' (or None) is written as NULL
+#      text         written as is
+#      date         loaddate, "MM/DD/YYYY", written as a timestamp;
+#                   read back in the same "MM/DD/YYYY" form
+#
+#  Notes:
+#
+#      The binary format must match the table's column types exactly
+#      (an int2 column cannot be loaded from int4 data); TABLES must be
+#      kept in step with the schema.
+#
+###########################################################################
+
+import sys
+import struct
+import datetime
+
+FORMATS = ['text', 'binary']
+
+TABLES = {
+    'MRK_StrainMarker': ['int4', 'int4', 'int4', 'int4', 'int4', 'int4', 'date', 'date'],
+    'ACC_Accession': ['int4', 'text', 'text', 'int4', 'int4', 'int4', 'int4', 'int2', 'int2',
+        'int4', 'int4', 'date', 'date'],
+    'ACC_AccessionReference': ['int4', 'int4', 'int4', 'int4', 'date', 'date'],
+}
+
+# binary COPY file header: signature, flags, header extension length
+COPYSIGNATURE = b'PGCOPY\n\377\r\n\0'
+COPYHEADER = COPYSIGNATURE + struct.pack('!ii', 0, 0)
+COPYTRAILER = struct.pack('!h', -1)
+
+DATEFORMAT = '%m/%d/%Y'
+PGEPOCH = datetime.datetime(2000, 1, 1)
+
+INT4 = struct.Struct('!ii')     # length, value
+INT2 = struct.Struct('!ih')
+INT8 = struct.Struct('!iq')
+LENGTH = struct.Struct('!i')
+NULL = LENGTH.pack(-1)
+
+BUFFERSIZE = 1024 * 1024    # bytes, file buffer of each writer
+BATCHROWS = 4096            # rendered rows collected before each write()
+
+class TextWriter:
+    # Is: a writer of tab-delimited files (bcp or gene model files)
+    # Has: an open text file, the pre-rendered constant columns, a batch of rendered rows,
+    #   the number of rows written
+    # Does: writes rows as tab-delimited lines
+    #
+    def __init__ (self, path, table=None, constants=()):
+        # Purpose: constructor
+        self.fp = open(path, 'w', buffering=BUFFERSIZE)
+        self.table = table
+        self.suffix = ''.join(['\t%s' % c for c in constants]) + '\n'
+        self.rows = []
+        self.rowCt = 0
+
+    def write (self, row):
+        self.rowCt += 1
+        self.rows.append('\t'.join(map(str, row)) + self.suffix)
+        if len(self.rows) >= BATCHROWS:
+            self.flush()
+
+    def flush (self):
+        self.fp.write(''.join(self.rows))
+        self.rows = []
+
+    def close (self):
+        self.flush()
+        self.fp.close()
+
+# end class TextWriter ---------------------------------
+
+class ListWriter:
+    # Is: a writer that keeps its rows in memory
+    # Has: the rows written, as given
+    # Does: appends rows to a list; close() keeps them
+    #
+    def __init__ (self):
+        # Purpose: constructor
+        self.rows = []
+
+    def write (self, row):
+        self.rows.append(row)
+
+    def close (self):
+        pass
+
+# end class ListWriter ---------------------------------
+
+class BinaryCopyWriter:
+    # Is: a writer of PostgreSQL binary COPY files
+    # Has: an open binary file, the column types of the table, the pre-encoded
+    #   constant columns, a batch of encoded tuples, the number of rows written
+    # Does: writes the header, one tuple per row, and the trailer on close
+    #
+    def __init__ (self, path, table, constants=()):
+        # Purpose: constructor
+        self.fp = open(path, 'wb', buffering=BUFFERSIZE)
+        self.table = table
+        types = TABLES[table]
+        self.types = types[:len(types) - len(constants)]
+        self.tupleHeader = struct.pack('!h', len(types))
+        self.dates = {}   # {date string: encoded timestamp field}
+        self.suffix = b''.join([self.encode(type, value) \
+            for type, value in zip(types[len(self.types):], constants)])
+        self.rows = []
+        self.rowCt = 0
+        self.fp.write(COPYHEADER)
+
+    def write (self, row):
+        if len(row) != len(self.types):
+            raise ValueError('%s: expected %s columns, got %s' % (self.table, len(self.types), len(row)))
+        self.rowCt += 1
+        fields = [self.tupleHeader]
+        for type, value in zip(self.types, row):
+            fields.append(self.encode(type, value))
+        fields.append(self.suffix)
+        self.rows.append(b''.join(fields))
+        if len(self.rows) >= BATCHROWS:
+            self.flush()
+
+    def encode (self, type, value):
+        if value is None or value == '':
+            return NULL
+        if type == 'int4':
+            return INT4.pack(4, int(value))
+        if type == 'int2':
+            return INT2.pack(2, int(value))
+        if type == 'date':
+            field = self.dates.get(value)
+            if field is None:
+                delta = datetime.datetime.strptime(value, DATEFORMAT) - PGEPOCH
+                field = self.dates[value] = INT8.pack(8, (delta.days * 86400 + delta.seconds) * 1000000)
+            return field
+        data = str(value).encode()
+        return LENGTH.pack(len(data)) + data
+
+    def flush (self):
+        self.fp.write(b''.join(self.rows))
+        self.rows = []
+
+    def close (self):
+        self.flush()
+        self.fp.write(COPYTRAILER)
+        self.fp.close()
+
+# end class BinaryCopyWriter ---------------------------------
+
+def openWriter(path, table, format='text', constants=()):
+    # Purpose: opens a bcp writer for table in the given format
+    #   constants are the values of the table's last len(constants) columns
+    # Returns: TextWriter or BinaryCopyWriter
+    # Throws: ValueError for an unknown format
+
+    if format == 'text':
+        return TextWriter(path, table, constants)
+    if format == 'binary':
+        return BinaryCopyWriter(path, table, constants)
+    raise ValueError('unknown bcp format: %s' % format)
+
+def readRows(path, table, format='text'):
+    # Purpose: reads the rows of a bcp file
+    # Returns: generator of rows, each a list of strings as in the text
+    #   format (NULL is '')
+
+    if format == 'text':
+        with open(path, 'r') as fp:
+            for line in fp:
+                yield line.rstrip('\n').split('\t')
+        return
+
+    types = TABLES[table]
+    with open(path, 'rb') as fp:
+        if fp.read(len(COPYHEADER))[:len(COPYSIGNATURE)] != COPYSIGNATURE:
+            raise ValueError('%s: not a binary COPY file' % path)
+        while True:
+            nFields = struct.unpack('!h', fp.read(2))[0]
+            if nFields == -1:
+                return
+            row = []
+            for type in types:
+                size = LENGTH.unpack(fp.read(4))[0]
+                if size == -1:
+                    row.append('')
+                    continue
+                data = fp.read(size)
+                if type == 'int4':
+                    row.append(str(struct.unpack('!i', data)[0]))
+                elif type == 'int2':
+                    row.append(str(struct.unpack('!h', data)[0]))
+                elif type == 'date':
+                    usec = struct.unpack('!q', data)[0]
+                    row.append((PGEPOCH + datetime.timedelta(microseconds=usec)).strftime(DATEFORMAT))
+                else:
+                    row.append(data.decode())
+            yield row
+
+def verify(table, textPath, binaryPath):
+    # Purpose: compares a binary COPY file row for row with a text bcp file
+    # Returns: number of differences (rows that differ, plus a count mismatch)
+
+    diffs = 0
+    textRows = readRows(textPath, table, 'text')
+    binaryRows = readRows(binaryPath, table, 'binary')
+    n = 0
+    for textRow in textRows:
+        n += 1
+        binaryRow = next(binaryRows, None)
+        if binaryRow is None:
+            print('%s: binary file ends at row %s' % (table, n))
+            return diffs + 1
+        if textRow != binaryRow:
+            diffs += 1
+            print('%s row %s:\n  text:   %s\n  binary: %s' % (table, n, textRow, binaryRow))
+    if next(binaryRows, None) is not None:
+        print('%s: binary file has more than %s rows' % (table, n))
+        diffs += 1
+    print('%s: %s rows, %s differences' % (table, n, diffs))
+    return diffs
+
+if __name__ == '__main__':
+    if len(sys.argv) != 4:
+        print('usage: bcpwriter.py TABLE TEXTFILE BINARYFILE')
+        sys.exit(2)
+    sys.exit(1 if verify(sys.argv[1], sys.argv[2], sys.argv[3]) else 0)
@@ -0,0 +1,130 @@
+#
+#  gffcolumns.py
+###########################################################################
+#
+#  Purpose:
+#
+#      Columnar (NumPy) batches of GFF3 feature coordinates, so that the
+#      coordinate sanity checks in strainmarkerload.py can run as vectorized
+#      masks over a whole file instead of one feature at a time.
+#
+#  Usage:
+#
+#      import gffcolumns
+#      batch = gffcolumns.FeatureBatch(lineNos, chrs, starts, ends, strands, ids, biotypes)
+#      masks = gffcolumns.qcMasks(batch, chrLookup, biotypeLookup)
+#      for lineNo in batch.lineNo[masks['strand']]:
+#          ...
+#
+#  A batch holds one row per feature:
+#
+#      lineNo      int64   1-based line number in the input file
+#      chrCode     int32   index into chrNames
+#      start, end  int64   coordinates; -1 if missing from the input
+#      strandCode  int8    STRAND_MISSING, STRAND_PLUS, STRAND_MINUS, STRAND_OTHER
+#      hasID       bool    feature has a (strain gene) ID
+#      biotypeCode int32   index into biotypeNames (raw biotype strings)
+#
+#  Notes:
+#
+#      Requires numpy.
+#
+###########################################################################
+
+import numpy as np
+
+STRAND_MISSING = 0
+STRAND_PLUS = 1
+STRAND_MINUS = 2
+STRAND_OTHER = 3
+
+# QC buckets returned by qcMasks; all but chr_m cause the record to be skipped
+QC_KEYS = ['chr_m', 'chr_u', 'start', 'end', 'start/end', 'strand', 'mgpens', 'biotype_u']
+
+class FeatureBatch:
+    # Is: a columnar batch of GFF3 features
+    # Has: one NumPy array per column, plus the category tables for the
+    #   chromosome and biotype codes
+    # Does: converts parallel lists of raw (string) column values
+    #
+    def __init__ (self, lineNos, chrs, starts, ends, strands, ids, biotypes):
+        # Purpose: constructor
+        self.lineNo = np.asarray(lineNos, dtype=np.int64)
+        self.chrNames, self.chrCode = categorize(chrs)
+        self.start = toCoordinates(starts)
+        self.end = toCoordinates(ends)
+        self.strandCode = toStrandCodes(strands)
+        self.hasID = np.asarray([i != '' for i in ids], dtype=bool)
+        self.biotypeNames, self.biotypeCode = categorize(biotypes)
+
+    def __len__ (self):
+        return len(self.lineNo)
+
+# end class FeatureBatch ---------------------------------
+
+def categorize(values):
+    # Purpose: dictionary-encodes a list of strings
+    # Returns: (array of distinct strings, int32 array of codes into it)
+
+    if len(values) == 0:
+        return np.asarray([], dtype=str), np.zeros(0, dtype=np.int32)
+    names, codes = np.unique(np.asarray(values, dtype=str), return_inverse=True)
+    return names, codes.astype(np.int32)
+
+def toCoordinates(values):
+    # Purpose: converts coordinate strings to int64, with -1 for ''
+    # Throws: ValueError if a non-empty value is not an integer
+
+    if len(values) == 0:
+        return np.zeros(0, dtype=np.int64)
+    a = np.asarray(values, dtype=str)
+    return np.where(a == '', '-1', a).astype(np.int64)
+
+def toStrandCodes(values):
+    # Purpose: converts strand strings to STRAND_* codes
+
+    a = np.asarray(values, dtype=str)
+    codes = np.full(len(a), STRAND_OTHER, dtype=np.int8)
+    codes[a == ''] = STRAND_MISSING
+    codes[a == '+'] = STRAND_PLUS
+    codes[a == '-'] = STRAND_MINUS
+    return codes
+
+def qcMasks(batch, chrLookup, biotypeLookup):
+    # Purpose: runs the coordinate QC checks over a batch
+    # Returns: {qc bucket: boolean mask, ..., 'skip': boolean mask}
+    #   the buckets are QC_KEYS; 'skip' is true for rows that fail any
+    #   check other than chr_m
+    # Assumes: chrLookup and biotypeLookup (lower-case raw biotype) are
+    #   dict-like; they are only consulted once per distinct value
+
+    chrMissing = (batch.chrNames == '')[batch.chrCode]
+    chrKnown = np.asarray([c in chrLookup for c in batch.chrNames], dtype=bool)[batch.chrCode]
+    startMissing = batch.start < 0
+    endMissing = batch.end < 0
+    biotypeKnown = np.asarray([b.lower().strip() in biotypeLookup for b in batch.biotypeNames], dtype=bool)[batch.biotypeCode]
+
+    masks = {}
+    masks['chr_m'] = chrMissing
+    masks['chr_u'] = ~chrMissing & ~chrKnown
+    masks['start'] = startMissing
+    masks['end'] = endMissing
+    masks['start/end'] = ~startMissing & ~endMissing & (batch.start > batch.end)
+    masks['strand'] = batch.strandCode == STRAND_MISSING
+    masks['mgpens'] = ~batch.hasID
+    masks['biotype_u'] = ~biotypeKnown
+
+    skip = np.zeros(len(batch), dtype=bool)
+    for key in QC_KEYS:
+        if key != 'chr_m':
+            skip |= masks[key]
+    masks['skip'] = skip
+    return masks
+
+def countByCategory(names, codes, mask):
+    # Purpose: counts the masked rows per category
+    # Returns: list of (name, count), in order of each name's first masked row
+
+    uniq, first, counts = np.unique(codes[mask], return_index=True, return_counts=True)
+    order = np.argsort(first, kind='stable')
+    return [(str(names[uniq[i]]), int(counts[i])) for i in order]
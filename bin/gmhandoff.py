@@ -0,0 +1,296 @@
+#
+#  gmhandoff.py
+###########################################################################
+#
+#  Purpose:
+#
+#      A compact, columnar, indexed handoff of the gene model data that
+#      strainmarkerload.py writes for straingenemodelload: one file holds
+#      what the gene model input file and the biotype file hold, keyed by
+#      strain gene ID. A reader memory-maps it and finds a gene model by
+#      binary search on the ID index, without tokenizing text.
+#
+#  Usage:
+#
+#      import gmhandoff
+#
+#      # writing; the two facets take the same rows as the text files
+#      h = gmhandoff.HandoffWriter('gm_mgp.gmb')
+#      h.gmWriter.write((smID, chr, start, end, strand, description, ''))
+#      h.biotypeWriter.write((smID, biotype))
+#      h.close()
+#
+#      # reading
+#      r = gmhandoff.HandoffReader('gm_mgp.gmb')
+#      gm = r.get('MGP_AJ_G0000011')   # (id, chr, start, end, strand, description, biotype) or None
+#      for gm in r: ...                 # in the order written
+#      r.close()
+#
+#      # command line
+#      python gmhandoff.py export FILE.gmb GMFILE BIOTYPEFILE   # the plain text files
+#      python gmhandoff.py get FILE.gmb ID [ID ...]
+#
+#  Format (all integers little-endian; each section starts on an 8-byte boundary):
+#
+#      header      magic "GMHAND01", then 6 x uint64:
+#                    nRows, nStrings, strings blob size, data blob size, reserved, reserved
+#      idStart     uint64[nRows]   offset of the row's ID in the data blob
+#      idLen       uint32[nRows]
+#      descStart   uint64[nRows]   offset of the row's description in the data blob
+#      descLen     uint32[nRows]
+#      start, end  int64[nRows]    coordinates; NOCOORD if empty
+#      chr         uint32[nRows]   string ids (small shared string table)
+#      strand      uint32[nRows]
+#      biotype     uint32[nRows]   NOSTRING if the row has no biotype
+#      flags       uint8[nRows]    FLAG_TRAILINGTAB: the text gene model line ends in a tab
+#      index       uint32[nRows]   row numbers in ID order (utf-8 byte order)
+#      strIndex    uint64[nStrings + 1]  string i is strings[strIndex[i]:strIndex[i+1]]
+#      strings     utf-8 string table
+#      data        utf-8 IDs and descriptions
+#
+#  Rows are kept in the order they were written, so export() reproduces the
+#  text files byte for byte.
+#
+###########################################################################
+
+import os
+import sys
+import mmap
+import struct
+from array import array
+
+MAGIC = b'GMHAND01'
+HEADER = struct.Struct('<8s6Q')
+NOCOORD = -(2**63)
+NOSTRING = 2**32 - 1
+FLAG_TRAILINGTAB = 1
+
+def parseCoord(s):
+    # Purpose: coordinate string to int64; must round-trip so export() is exact
+    # Throws: ValueError if it does not
+
+    if s == '':
+        return NOCOORD
+    v = int(s)
+    if str(v) != s:
+        raise ValueError('coordinate does not round-trip: %s' % s)
+    return v
+
+def writeAligned(fp, data):
+    fp.write(data)
+    pad = -len(data) % 8
+    if pad:
+        fp.write(b'\0' * pad)
+
+class GmFacet:
+    # Is: one of the two text-file-shaped inputs of a HandoffWriter
+    # Does: passes rows to the writer
+    #
+    def __init__ (self, write):
+        # Purpose: constructor
+        self.write = write
+
+    def close (self):
+        pass
+
+# end class GmFacet ---------------------------------
+
+class HandoffWriter:
+    # Is: a writer of a gene model handoff file
+    # Has: the small per-row columns in memory; IDs and descriptions are
+    #   streamed to a temporary data file
+    # Does: collects gene model and biotype rows, writes the file on close
+    #
+    def __init__ (self, path):
+        # Purpose: constructor
+        self.path = path
+        self.dataPath = path + '.data.tmp'
+        self.data = open(self.dataPath, 'wb', buffering=1024 * 1024)
+        self.dataSize = 0
+        self.ids = []
+        self.rowByID = {}
+        self.idStart = array('Q')
+        self.idLen = array('I')
+        self.descStart = array('Q')
+        self.descLen = array('I')
+        self.starts = array('q')
+        self.ends = array('q')
+        self.chrs = array('I')
+        self.strands = array('I')
+        self.biotypes = array('I')
+        self.flags = array('B')
+        self.strings = {}
+        self.gmWriter = GmFacet(self.writeGm)
+        self.biotypeWriter = GmFacet(self.writeBiotype)
+
+    def sid (self, s):
+        i = self.strings.get(s)
+        if i is None:
+            i = self.strings[s] = len(self.strings)
+        return i
+
+    def append (self, s):
+        b = s.encode()
+        self.data.write(b)
+        start = self.dataSize
+        self.dataSize += len(b)
+        return start, len(b)
+
+    def writeGm (self, row):
+        # row: (id, chr, start, end, strand, description) plus '' for a trailing tab
+        smID, chr, start, end, strand, description = [str(c) for c in row[:6]]
+        self.rowByID[smID] = len(self.ids)
+        self.ids.append(smID)
+        s, n = self.append(smID)
+        self.idStart.append(s)
+        self.idLen.append(n)
+        s, n = self.append(description)
+        self.descStart.append(s)
+        self.descLen.append(n)
+        self.starts.append(parseCoord(start))
+        self.ends.append(parseCoord(end))
+        self.chrs.append(self.sid(chr))
+        self.strands.append(self.sid(strand))
+        self.biotypes.append(NOSTRING)
+        self.flags.append(FLAG_TRAILINGTAB if len(row) > 6 else 0)
+
+    def writeBiotype (self, row):
+        # row: (id, biotype); the gene model row of id must have been written
+        smID, biotype = row
+        self.biotypes[self.rowByID[smID]] = self.sid(str(biotype))
+
+    def close (self):
+        self.data.close()
+        index = sorted(range(len(self.ids)), key=lambda i: self.ids[i].encode())
+        strIndex = array('Q', [0])
+        blob = bytearray()
+        for s in self.strings:
+            blob += s.encode()
+            strIndex.append(len(blob))
+        tmp = self.path + '.tmp'
+        with open(tmp, 'wb') as fp:
+            fp.write(HEADER.pack(MAGIC, len(self.ids), len(self.strings), len(blob), self.dataSize, 0, 0))
+            for a in (self.idStart, self.idLen, self.descStart, self.descLen, self.starts, self.ends,
+                      self.chrs, self.strands, self.biotypes, self.flags, array('I', index), strIndex):
+                writeAligned(fp, a.tobytes())
+            writeAligned(fp, bytes(blob))
+            with open(self.dataPath, 'rb') as data:
+                while True:
+                    chunk = data.read(1024 * 1024)
+                    if not chunk:
+                        break
+                    fp.write(chunk)
+        os.remove(self.dataPath)
+        os.replace(tmp, self.path)
+
+# end class HandoffWriter ---------------------------------
+
+class HandoffReader:
+    # Is: a memory-mapped gene model handoff file
+    # Has: one memoryview per column
+    # Does: finds gene models by ID, iterates them, exports the text files
+    #
+    def __init__ (self, path):
+        # Purpose: constructor
+        self.fp = open(path, 'rb')
+        self.mm = mmap.mmap(self.fp.fileno(), 0, access=mmap.ACCESS_READ)
+        self.mv = mv = memoryview(self.mm)
+        magic, nRows, nStrings, stringsSize, dataSize, x, y = HEADER.unpack_from(self.mm, 0)
+        if magic != MAGIC:
+            raise ValueError('not a gene model handoff file: %s' % path)
+        self.nRows = nRows
+        self.pos = HEADER.size
+        def section (fmt, n):
+            size = n * struct.calcsize(fmt)
+            s = mv[self.pos:self.pos + size].cast(fmt)
+            self.pos += size + (-size % 8)
+            return s
+        self.idStart = section('Q', nRows)
+        self.idLen = section('I', nRows)
+        self.descStart = section('Q', nRows)
+        self.descLen = section('I', nRows)
+        self.starts = section('q', nRows)
+        self.ends = section('q', nRows)
+        self.chrs = section('I', nRows)
+        self.strands = section('I', nRows)
+        self.biotypes = section('I', nRows)
+        self.flags = section('B', nRows)
+        self.index = section('I', nRows)
+        self.strIndex = section('Q', nStrings + 1)
+        self.stringsBlob = section('B', stringsSize)
+        self.data = mv[self.pos:self.pos + dataSize]
+        self.strings = [str(self.stringsBlob[self.strIndex[i]:self.strIndex[i+1]], 'utf-8') for i in range(nStrings)]
+
+    def __len__ (self):
+        return self.nRows
+
+    def idBytes (self, i):
+        return bytes(self.data[self.idStart[i]:self.idStart[i] + self.idLen[i]])
+
+    def find (self, smID):
+        # Returns: the row number of smID, or None
+        key = smID.encode()
+        lo, hi = 0, self.nRows
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.idBytes(self.index[mid]) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self.nRows and self.idBytes(self.index[lo]) == key:
+            return self.index[lo]
+        return None
+
+    def row (self, i):
+        # Returns: (id, chr, start, end, strand, description, biotype) of row i, as text
+        start = self.starts[i]
+        end = self.ends[i]
+        biotype = self.biotypes[i]
+        return (str(self.idBytes(i), 'utf-8'),
+                self.strings[self.chrs[i]],
+                '' if start == NOCOORD else str(start),
+                '' if end == NOCOORD else str(end),
+                self.strings[self.strands[i]],
+                str(self.data[self.descStart[i]:self.descStart[i] + self.descLen[i]], 'utf-8'),
+                None if biotype == NOSTRING else self.strings[biotype])
+
+    def get (self, smID):
+        i = self.find(smID)
+        return None if i is None else self.row(i)
+
+    def __iter__ (self):
+        for i in range(self.nRows):
+            yield self.row(i)
+
+    def export (self, gmPath, biotypePath):
+        # Purpose: writes the plain text gene model and biotype files
+        with open(gmPath, 'w') as gm, open(biotypePath, 'w') as bt:
+            for i in range(self.nRows):
+                row = self.row(i)
+                gm.write('\t'.join(row[:6]) + ('\t\n' if self.flags[i] & FLAG_TRAILINGTAB else '\n'))
+                if row[6] is not None:
+                    bt.write('%s\t%s\n' % (row[0], row[6]))
+
+    def close (self):
+        for a in (self.idStart, self.idLen, self.descStart, self.descLen, self.starts, self.ends,
+                  self.chrs, self.strands, self.biotypes, self.flags, self.index, self.strIndex,
+                  self.stringsBlob, self.data, self.mv):
+            a.release()
+        self.mm.close()
+        self.fp.close()
+
+# end class HandoffReader ---------------------------------
+
+if __name__ == '__main__':
+    if len(sys.argv) == 5 and sys.argv[1] == 'export':
+        r = HandoffReader(sys.argv[2])
+        r.export(sys.argv[3], sys.argv[4])
+        r.close()
+    elif len(sys.argv) >= 4 and sys.argv[1] == 'get':
+        r = HandoffReader(sys.argv[2])
+        for smID in sys.argv[3:]:
+            print(r.get(smID))
+        r.close()
+    else:
+        print('usage: gmhandoff.py export FILE.gmb GMFILE BIOTYPEFILE | get FILE.gmb ID [ID ...]')
+        sys.exit(2)
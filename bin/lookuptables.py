@@ -0,0 +1,254 @@
+#
+#  lookuptables.py
+###########################################################################
+#
+#  Purpose:
+#
+#      Compact, read-only lookup tables for the marker and Ensembl lookups
+#      of strainmarkerload.py. Instead of one Python object per marker (and
+#      a list of strings per Ensembl ID), IDs are stored as integers in
+#      sorted arrays and symbols in one interned string table; a lookup is
+#      a binary search.
+#
+#      MarkerTable     {MGI ID: MarkerRow(markerID, markerKey, symbol)}
+#      EnsemblTable    {Ensembl ID: [MGI ID, ...]}
+#
+#      Both are filled with add() and then frozen; after freeze() they
+#      support "in", [], get(), len() and iteration over the keys, like the
+#      dicts they replace. IDs that do not have the expected shape
+#      ("MGI:<digits>", "ENSMUSG<11 digits>") are kept in a small dict.
+#
+#  Usage:
+#
+#      import lookuptables
+#      markers = lookuptables.MarkerTable()
+#      markers.add('MGI:87853', 11, 'a')
+#      markers.freeze()
+#      markers['MGI:87853'].symbol
+#
+#      ensembl = lookuptables.EnsemblTable()
+#      ensembl.add('ENSMUSG00000027596', 'MGI:87853')
+#      ensembl.freeze()
+#      ensembl['ENSMUSG00000027596']      # ['MGI:87853']
+#
+###########################################################################
+
+import bisect
+import collections
+from array import array
+
+MGIPREFIX = 'MGI:'
+ENSPREFIX = 'ENSMUSG'
+ENSDIGITS = 11
+
+MarkerRow = collections.namedtuple('MarkerRow', ['markerID', 'markerKey', 'symbol'])
+
+def mgiNumber(mgiID):
+    # Returns: the numeric part of "MGI:<digits>" (no leading zeros), else None
+
+    if not mgiID.startswith(MGIPREFIX):
+        return None
+    digits = mgiID[len(MGIPREFIX):]
+    if not digits.isdigit() or not digits.isascii() or (digits[0] == '0' and digits != '0'):
+        return None
+    return int(digits)
+
+def ensemblNumber(ensID):
+    # Returns: the numeric part of "ENSMUSG<11 digits>", else None
+
+    if not ensID.startswith(ENSPREFIX):
+        return None
+    digits = ensID[len(ENSPREFIX):]
+    if len(digits) != ENSDIGITS or not digits.isdigit() or not digits.isascii():
+        return None
+    return int(digits)
+
+def sortOrder(keys):
+    # Returns: the row numbers of keys in key order (stable); None if
+    #   keys is already sorted
+
+    if all(keys[i] <= keys[i + 1] for i in range(len(keys) - 1)):
+        return None
+    return sorted(range(len(keys)), key=keys.__getitem__)
+
+class StringTable:
+    # Is: an interned table of strings
+    # Has: the strings as one utf-8 blob and their end offsets
+    # Does: returns the id of a string (adding it once), the string of an id
+    #
+    def __init__ (self):
+        # Purpose: constructor
+        self.blob = bytearray()
+        self.ends = array('Q')
+        self.ids = {}   # {string: id}, only until freeze()
+
+    def add (self, s):
+        i = self.ids.get(s)
+        if i is None:
+            i = self.ids[s] = len(self.ends)
+            self.blob += s.encode()
+            self.ends.append(len(self.blob))
+        return i
+
+    def __getitem__ (self, i):
+        start = self.ends[i - 1] if i > 0 else 0
+        return self.blob[start:self.ends[i]].decode()
+
+    def __len__ (self):
+        return len(self.ends)
+
+    def freeze (self):
+        self.ids = None
+        self.blob = bytes(self.blob)
+
+# end class StringTable ---------------------------------
+
+class MarkerTable:
+    # Is: a read-only {MGI ID: MarkerRow} mapping
+    # Has: sorted numeric MGI IDs with the marker key and symbol id of each,
+    #   the interned symbols, a dict for irregular IDs
+    # Does: see the header
+    #
+    def __init__ (self):
+        # Purpose: constructor
+        self.mgiNums = array('l')
+        self.markerKeys = array('l')
+        self.symbolIds = array('L')
+        self.symbols = StringTable()
+        self.other = {}     # {MGI ID: MarkerRow} for IDs that are not MGI:<digits>
+
+    def add (self, mgiID, markerKey, symbol):
+        n = mgiNumber(mgiID)
+        if n is None:
+            self.other[mgiID] = MarkerRow(mgiID, markerKey, symbol)
+            return
+        self.mgiNums.append(n)
+        self.markerKeys.append(markerKey)
+        self.symbolIds.append(self.symbols.add(symbol))
+
+    def freeze (self):
+        # Purpose: sorts the rows on MGI ID; the last row of a repeated ID wins,
+        #   as with a dict
+        order = sortOrder(self.mgiNums)
+        if order is not None:
+            self.mgiNums = array('l', [self.mgiNums[i] for i in order])
+            self.markerKeys = array('l', [self.markerKeys[i] for i in order])
+            self.symbolIds = array('L', [self.symbolIds[i] for i in order])
+        self.symbols.freeze()
+
+    def find (self, mgiID):
+        # Returns: the row number of mgiID, or None
+        n = mgiNumber(mgiID)
+        if n is None:
+            return None
+        i = bisect.bisect_right(self.mgiNums, n) - 1
+        if i >= 0 and self.mgiNums[i] == n:
+            return i
+        return None
+
+    def __contains__ (self, mgiID):
+        return self.find(mgiID) is not None or mgiID in self.other
+
+    def get (self, mgiID, default=None):
+        i = self.find(mgiID)
+        if i is None:
+            return self.other.get(mgiID, default)
+        return MarkerRow(mgiID, self.markerKeys[i], self.symbols[self.symbolIds[i]])
+
+    def __getitem__ (self, mgiID):
+        row = self.get(mgiID)
+        if row is None:
+            raise KeyError(mgiID)
+        return row
+
+    def __len__ (self):
+        return len(set(self.mgiNums)) + len(self.other)
+
+    def __iter__ (self):
+        last = None
+        for n in self.mgiNums:
+            if n != last:
+                yield '%s%s' % (MGIPREFIX, n)
+            last = n
+        for mgiID in self.other:
+            yield mgiID
+
+# end class MarkerTable ---------------------------------
+
+class EnsemblTable:
+    # Is: a read-only {Ensembl ID: [MGI ID, ...]} mapping
+    # Has: sorted numeric Ensembl IDs, the start of each one's MGI IDs in a
+    #   single array of numeric MGI IDs (most have one), a dict for
+    #   irregular IDs
+    # Does: see the header
+    #
+    def __init__ (self):
+        # Purpose: constructor
+        self.ensNums = array('q')       # one per add() until freeze(), then unique
+        self.mgiNums = array('l')       # one per add()
+        self.starts = None              # after freeze(): ensNums[i] maps to mgiNums[starts[i]:starts[i+1]]
+        self.other = {}                 # {Ensembl ID: [MGI ID, ...]} for irregular IDs
+
+    def add (self, ensID, mgiID):
+        e = ensemblNumber(ensID)
+        m = mgiNumber(mgiID)
+        if e is None or m is None:
+            self.other.setdefault(ensID, []).append(mgiID)
+            return
+        self.ensNums.append(e)
+        self.mgiNums.append(m)
+
+    def freeze (self):
+        # Purpose: groups the MGI IDs by Ensembl ID, keeping the order they were added
+        order = sortOrder(self.ensNums)
+        if order is not None:
+            self.ensNums = array('q', [self.ensNums[i] for i in order])
+            self.mgiNums = array('l', [self.mgiNums[i] for i in order])
+        ensNums = array('q')
+        self.starts = array('L')
+        for i, e in enumerate(self.ensNums):
+            if len(ensNums) == 0 or ensNums[-1] != e:
+                ensNums.append(e)
+                self.starts.append(i)
+        self.starts.append(len(self.mgiNums))
+        self.ensNums = ensNums
+
+    def find (self, ensID):
+        # Returns: the row number of ensID, or None
+        e = ensemblNumber(ensID)
+        if e is None:
+            return None
+        i = bisect.bisect_left(self.ensNums, e)
+        if i < len(self.ensNums) and self.ensNums[i] == e:
+            return i
+        return None
+
+    def __contains__ (self, ensID):
+        return self.find(ensID) is not None or ensID in self.other
+
+    def get (self, ensID, default=None):
+        i = self.find(ensID)
+        if i is None:
+            return self.other.get(ensID, default)
+        mgiIDs = ['%s%s' % (MGIPREFIX, m) for m in self.mgiNums[self.starts[i]:self.starts[i + 1]]]
+        if ensID in self.other:
+            mgiIDs.extend(self.other[ensID])
+        return mgiIDs
+
+    def __getitem__ (self, ensID):
+        mgiIDs = self.get(ensID)
+        if mgiIDs is None:
+            raise KeyError(ensID)
+        return mgiIDs
+
+    def __len__ (self):
+        return len(self.ensNums) + len([k for k in self.other if self.find(k) is None])
+
+    def __iter__ (self):
+        for e in self.ensNums:
+            yield '%s%0*d' % (ENSPREFIX, ENSDIGITS, e)
+        for ensID in self.other:
+            if self.find(ensID) is None:
+                yield ensID
+
+# end class EnsemblTable ---------------------------------
@@ -0,0 +1,316 @@
+#
+# gff3cache.py
+#
+# A binary, pre-parsed sidecar for GFF3 files.
+#
+# Converting a GFF3 file once lets later runs memory-map the sidecar and read the
+# columns of every line without splitting and scanning the text again. The sidecar
+# is line-exact: every input line (features, comments, anything else) can be
+# rebuilt from it character for character.
+#
+# Usage:
+#    # build the sidecar of each file whose sidecar is missing or stale: FILE -> FILE.g3c
+#    # exits non-zero if a sidecar cannot be built; readers then use the text
+#    python gff3cache.py FILE [FILE ...]
+#
+#    import gff3cache
+#    c = gff3cache.openCache("myfile.gff3")    # None if missing or stale
+#    if c:
+#        for i in range(len(c)):
+#            if c.isFeature(i):
+#                chr, start = c.column(i, 0), c.start(i)
+#                tokens = c.tokens(i)          # raw column 9 "name=value" tokens
+#            line = c.line(i)                  # original text of line i
+#
+# Format (all integers little-endian; each section starts on an 8-byte boundary):
+#    header      magic "G3CACHE1", then 8 x uint64:
+#                  source size, source mtime (ns), nLines, nStrings, nTokens,
+#                  nModels, blob size, reserved
+#    kind        uint8[nLines]       KIND_FEATURE, KIND_COMMENT or KIND_OTHER,
+#                                    plus FLAG_NEWLINE if the line ended in "\n"
+#    columns     uint32[nLines * 6]  string ids of columns 1,2,3,6,7,8; for
+#                                    non-feature lines, column 1 is the whole line
+#    start, end  int32[nLines]       columns 4 and 5; NOCOORD if empty
+#    tokenIndex  uint32[nLines + 1]  line i owns tokens[tokenIndex[i]:tokenIndex[i+1]]
+#    tokens      uint32[nTokens]     string ids of the ";"-separated column 9 tokens
+#    models      uint32[nModels]     line number (0-based) of each top-level feature,
+#                                    i.e. the first line of each model
+#    strIndex    uint64[nStrings + 1] string i is blob[strIndex[i]:strIndex[i+1]]
+#    blob        utf-8 string table (each distinct string stored once)
+#
+# A feature line whose start or end cannot be stored exactly (not an integer, or outside
+# int32) is kept as a KIND_OTHER line with its whole text. Readers parse such lines from
+# their text, as they would without the sidecar, so they fail or report them the same way.
+#
+# A sidecar is fresh if the source's size and mtime match the ones recorded in it.
+#
+import os
+import sys
+import mmap
+import struct
+from array import array
+
+import gff3lite
+
+MAGIC = b'G3CACHE1'
+HEADER = struct.Struct('<8s8Q')
+SUFFIX = '.g3c'
+
+KIND_FEATURE = 0
+KIND_COMMENT = 1
+KIND_OTHER = 2
+KIND_MASK = 0x7f
+FLAG_NEWLINE = 0x80
+
+NCOLS = 6       # columns 1,2,3,6,7,8 - stored as string ids
+COLMAP = [0, 1, 2, None, None, 3, 4, 5]
+NOCOORD = -(2**31)
+
+#
+def cachePath (path) :
+  return path + SUFFIX
+
+#
+def isFresh (path, cpath=None) :
+  # True if the sidecar of path exists and was built from the current version of path.
+  cpath = cpath or cachePath(path)
+  try:
+    st = os.stat(path)
+    with open(cpath, 'rb') as fd:
+      h = HEADER.unpack(fd.read(HEADER.size))
+  except (OSError, struct.error):
+    return False
+  return h[0] == MAGIC and h[1] == st.st_size and h[2] == st.st_mtime_ns
+
+#
+def openCache (path) :
+  # Returns a Gff3Cache over the sidecar of path, or None if there is no fresh sidecar.
+  if not isFresh(path):
+    return None
+  return Gff3Cache(cachePath(path))
+
+#
+def parseCoord (s) :
+  # Coordinates must round-trip exactly, or the sidecar could not rebuild the line.
+  if s == '':
+    return NOCOORD
+  v = int(s)
+  if str(v) != s or v <= NOCOORD or v >= 2**31:
+    raise ValueError("Coordinate does not round-trip: " + s)
+  return v
+
+#
+def build (path, cpath=None, rejects=None) :
+  # Converts the GFF3 file at path into a sidecar at cpath (default: path + SUFFIX).
+  # rejects: optional list; (line number, reason) is appended for each feature line
+  #   kept as text because its coordinates cannot be stored (see above)
+  cpath = cpath or cachePath(path)
+  st = os.stat(path)
+  strings = {}
+  def sid (s) :
+    i = strings.get(s)
+    if i is None:
+      i = strings[s] = len(strings)
+    return i
+  kinds = array('B')
+  cols = array('I')
+  starts = array('i')
+  ends = array('i')
+  tokenIndex = array('I', [0])
+  tokens = array('I')
+  models = array('I')
+  inFasta = False
+  with open(path, 'r') as fd:
+    for n, line in enumerate(fd):
+      flag = 0
+      if line.endswith(gff3lite.NL):
+        flag = FLAG_NEWLINE
+        line = line[:-1]
+      flds = None if inFasta else line.split(gff3lite.TAB)
+      if line.startswith(gff3lite.HASH):
+        kind = KIND_COMMENT
+        inFasta = line.startswith('##FASTA')
+      elif flds is not None and len(flds) == 9:
+        kind = KIND_FEATURE
+        try:
+          coords = (parseCoord(flds[3]), parseCoord(flds[4]))
+        except ValueError as e:
+          kind = KIND_OTHER
+          if rejects is not None:
+            rejects.append((n + 1, str(e)))
+      else:
+        kind = KIND_OTHER
+      kinds.append(kind | flag)
+      if kind == KIND_FEATURE:
+        cols.extend([sid(flds[0]), sid(flds[1]), sid(flds[2]), sid(flds[5]), sid(flds[6]), sid(flds[7])])
+        starts.append(coords[0])
+        ends.append(coords[1])
+        c9 = flds[8].split(gff3lite.SEMI)
+        tokens.extend([sid(t) for t in c9])
+        if not any(t.strip().startswith('Parent=') for t in c9):
+          models.append(n)
+      else:
+        cols.extend([sid(line), 0, 0, 0, 0, 0])
+        starts.append(NOCOORD)
+        ends.append(NOCOORD)
+      tokenIndex.append(len(tokens))
+  strIndex = array('Q', [0])
+  blob = bytearray()
+  for s in strings:
+    blob += s.encode()
+    strIndex.append(len(blob))
+  tmp = cpath + '.tmp'
+  with open(tmp, 'wb') as ofd:
+    ofd.write(HEADER.pack(MAGIC, st.st_size, st.st_mtime_ns, len(kinds), len(strings),
+                          len(tokens), len(models), len(blob), 0))
+    for a in (kinds, cols, starts, ends, tokenIndex, tokens, models, strIndex):
+      writeAligned(ofd, a.tobytes())
+    ofd.write(blob)
+  os.replace(tmp, cpath)
+  return cpath
+
+#
+def writeAligned (fd, data) :
+  fd.write(data)
+  pad = -len(data) % 8
+  if pad:
+    fd.write(b'\0' * pad)
+
+#
+class Gff3Cache :
+  # A memory-mapped sidecar. Strings are decoded on first use and kept.
+  def __init__ (self, cpath) :
+    self.fd = open(cpath, 'rb')
+    self.mm = mmap.mmap(self.fd.fileno(), 0, access=mmap.ACCESS_READ)
+    self.mv = mv = memoryview(self.mm)
+    (magic, self.srcSize, self.srcMtime, nLines, nStrings, nTokens, nModels, blobSize, x) = \
+        HEADER.unpack_from(self.mm, 0)
+    if magic != MAGIC:
+      raise RuntimeError("Not a gff3cache file: " + cpath)
+    self.pos = HEADER.size
+    def section (fmt, n) :
+      size = n * struct.calcsize(fmt)
+      s = mv[self.pos:self.pos + size].cast(fmt)
+      self.pos += size + (-size % 8)
+      return s
+    self.kinds = section('B', nLines)
+    self.cols = section('I', nLines * NCOLS)
+    self.starts = section('i', nLines)
+    self.ends = section('i', nLines)
+    self.tokenIndex = section('I', nLines + 1)
+    self.tokenIds = section('I', nTokens)
+    self.models = section('I', nModels)
+    self.strIndex = section('Q', nStrings + 1)
+    self.blob = mv[self.pos:self.pos + blobSize]
+    self.nLines = nLines
+    self.strs = [None] * nStrings
+
+  def close (self) :
+    for a in (self.kinds, self.cols, self.starts, self.ends, self.tokenIndex,
+              self.tokenIds, self.models, self.strIndex, self.blob, self.mv):
+      a.release()
+    self.mm.close()
+    self.fd.close()
+
+  def __len__ (self) :
+    return self.nLines
+
+  def string (self, i) :
+    s = self.strs[i]
+    if s is None:
+      s = self.strs[i] = str(self.blob[self.strIndex[i]:self.strIndex[i+1]], 'utf-8')
+    return s
+
+  def kind (self, i) :
+    return self.kinds[i] & KIND_MASK
+
+  def isFeature (self, i) :
+    return self.kinds[i] & KIND_MASK == KIND_FEATURE
+
+  def hasNewline (self, i) :
+    return self.kinds[i] & FLAG_NEWLINE != 0
+
+  # column c (0-based) of feature line i, as the original text
+  def column (self, i, c) :
+    if c == 3 or c == 4:
+      v = self.starts[i] if c == 3 else self.ends[i]
+      return '' if v == NOCOORD else str(v)
+    if c == 8:
+      return gff3lite.SEMI.join(self.tokens(i))
+    return self.string(self.cols[NCOLS * i + COLMAP[c]])
+
+  def start (self, i) :
+    v = self.starts[i]
+    return None if v == NOCOORD else v
+
+  def end (self, i) :
+    v = self.ends[i]
+    return None if v == NOCOORD else v
+
+  # raw column 9 tokens of feature line i (as from splitting column 9 on ";").
+  # With withNewline, the last token keeps the line's newline, as when splitting the raw line.
+  def tokens (self, i, withNewline=False) :
+    ts = [self.string(t) for t in self.tokenIds[self.tokenIndex[i]:self.tokenIndex[i+1]]]
+    if withNewline and self.hasNewline(i):
+      ts[-1] = ts[-1] + gff3lite.NL
+    return ts
+
+  # the original text of line i, including its newline
+  def line (self, i) :
+    if self.isFeature(i):
+      text = gff3lite.TAB.join([self.column(i, c) for c in range(9)])
+    else:
+      text = self.string(self.cols[NCOLS * i])
+    return text + gff3lite.NL if self.hasNewline(i) else text
+
+  def lines (self) :
+    for i in range(self.nLines):
+      yield self.line(i)
+
+  # feature line i parsed as by gff3lite.parseLine (coordinates as ints, column 9 as a dict)
+  def feature (self, i) :
+    if self.start(i) is None or self.end(i) is None:
+      # same failure as parsing the text
+      return gff3lite.parseLine(self.line(i))
+    f = [self.column(i, c) for c in range(8)]
+    f[3] = self.starts[i]
+    f[4] = self.ends[i]
+    f.append(parseTokens(self.tokens(i)))
+    return f
+
+  # (first line, end line) of each model, in file order
+  def modelRanges (self) :
+    n = len(self.models)
+    for m in range(n):
+      yield (self.models[m], self.models[m+1] if m + 1 < n else self.nLines)
+
+#
+def parseTokens (tokens) :
+  # Same as gff3lite.parseColumn9 on the joined tokens.
+  if len(tokens) == 1 and tokens[0] == '.':
+    return {}
+  c9 = {}
+  for p in tokens:
+    p = p.strip()
+    if len(p) == 0:
+      continue
+    bits = p.split(gff3lite.EQ, 1)
+    if len(bits) == 1:
+      continue
+    n = bits[0].strip()
+    v = bits[1].strip()
+    if n in gff3lite.MULTIVALUED:
+      c9[n] = list(map(gff3lite.ulib.unquote, v.split(gff3lite.COMMA)))
+    else:
+      c9[n] = gff3lite.ulib.unquote(v)
+  return c9
+
+if __name__ == '__main__':
+  for path in sys.argv[1:]:
+    if isFresh(path):
+      sys.stderr.write('%s is fresh\n' % cachePath(path))
+    else:
+      rejects = []
+      sys.stderr.write('%s -> %s\n' % (path, build(path, rejects=rejects)))
+      for (lineNo, reason) in rejects:
+        sys.stderr.write('%s line %d kept as text: %s\n' % (path, lineNo, reason))
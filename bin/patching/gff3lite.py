@@ -15,12 +15,27 @@
 #        id = r[8]['ID'] 
 #        # coordinates converted to int
 #        length = r[4] - r[3] + 1
+#    # iterate over models sorted by chromosome and start, using at most ~256MB
+#    # of (serialized) models in memory; the rest is spilled to temp files.
+#    for m in Gff3Parser("myfile.gff3", returnGroups=True).sortIterate(maxMemory=256*2**20):
+#        ...
 #
+import os
 import sys
 import types
+import multiprocessing
 import urllib.parse as ulib
 import json
 import re
+import heapq
+import pickle
+import struct
+import tempfile
+import mmap
+import collections
+import io
+from array import array
+from operator import itemgetter
 
 GFF3HEADER = '##gff-version 3\n'
 TAB = '\t'
@@ -34,6 +49,12 @@ GT = '>'
 MULTIVALUED = ["Parent", "Dbxref", "Alias", "Note", "Ontology_term"]
 GROUPSEPARATOR = "###"
 
+# Start method of the mapChunks worker pool. The chunk workers of our callers read state
+# (configuration, lookups) that the caller set in module globals before the pool started,
+# which only forked workers inherit; spawn and forkserver (the defaults on macOS and, from
+# Python 3.14, Linux) would start them with the module's initial values.
+POOLCONTEXT = 'fork'
+
 class Gff3Parser :
   def __init__(self, source, returnHeader=True, returnGroups=False, convertDots='.'):
     self.source = source
@@ -43,14 +64,14 @@ class Gff3Parser :
 
   def open(self):
     if type(self.source) is str:
-      self.sfd = open(source, 'r')
+      self.sfd = open(self.source, 'r')
     else:
       self.sfd = self.source
     self.currLine = None
 
   def close(self):
     if type(self.source) is str:
-      sfd.close()
+      self.sfd.close()
 
   # In nature, one gene can be inside another, e.g., gene A might exist in an intron of gene B.
   # Some providers of GFF3 files segregate each model into its own contiguous set of lines, while
@@ -69,8 +90,8 @@ class Gff3Parser :
     #
     if f is None:
         # signals the end of the input. Return anything left in the buffer/
-        ret = self.buffer
-        self.buffer = []
+        ret = list(self.buffer)
+        self.buffer = collections.deque()
         self.id2group = {}
         return ret
     #
@@ -78,12 +99,14 @@ class Gff3Parser :
     if 'Parent' not in attrs:
         # top level feature.
         # 1. flush items from buffer. Must be careful to preserve ordering of top level features
+        # The buffer is a deque: groups are only ever removed from the front, in FIFO order.
         flushed = []
-        for grp in self.buffer:
-            tlf = grp[0]
+        while self.buffer:
+            tlf = self.buffer[0][0]
             # Flush a group if the current feature shows we've moved beyond its top level feature or
             # moved to a different chromosome.
             if tlf[0] != f[0] or tlf[4] < f[3]:
+                grp = self.buffer.popleft()
                 for g in grp:
                     self.id2group.pop(g[8].get('ID',None), None)
                 flushed.append(grp)
@@ -91,8 +114,6 @@ class Gff3Parser :
                 # don't check the rest of the buffer, or we lose
                 # input ordering
                 break
-        # remove flushed items from the buffer
-        self.buffer = self.buffer[len(flushed):]
         # start new group and add to buffer
         grp = [f]
         self.buffer.append(grp)
@@ -118,7 +139,7 @@ class Gff3Parser :
     header = []
     group = []
     currSeqid = None
-    self.buffer = []
+    self.buffer = collections.deque()
     self.pending = {}
     self.id2group = {}
     for line in self.sfd:
@@ -159,8 +180,15 @@ class Gff3Parser :
     if len(self.pending) > 0 :
         sys.stderr.write("Orphan records detected. " + str(self.pending) + "\n")
 
+  # Returns the models sorted by chromosome, then start position of the top-level feature.
+  # Models with equal keys keep their input order.
+  #
+  # By default all models are sorted in memory. If maxMemory (bytes) is given, models are
+  # held in a compact serialized form instead, and whenever the serialized models exceed
+  # maxMemory they are sorted and spilled to a temporary file (a "run") in tmpDir.
+  # The runs are then k-way merged. The ordering is identical to the in-memory sort.
   #
-  def sortIterate (self) :
+  def sortIterate (self, maxMemory=None, tmpDir=None) :
     # 
     origRH = self.returnHeader
     origRG = self.returnGroups
@@ -170,9 +198,12 @@ class Gff3Parser :
     header = next(gffStream)
     if origRH:
         yield header
-    allModels = list(gffStream)
-    # sort by models by chromosome, then start position of the top-level feature
-    allModels.sort(key = lambda m: (m[0][0], m[0][3]))
+    if maxMemory is None:
+        allModels = list(gffStream)
+        # sort by models by chromosome, then start position of the top-level feature
+        allModels.sort(key = modelSortKey)
+    else:
+        allModels = externalSort(gffStream, maxMemory, tmpDir)
     for model in allModels:
         if origRG:
             yield model
@@ -180,6 +211,224 @@ class Gff3Parser :
             for m in model:
                 yield m
 #
+def modelSortKey (model) :
+  tlf = model[0]
+  return (tlf[0], tlf[3])
+
+#
+# External merge sort of models, used by Gff3Parser.sortIterate. Works for any picklable
+# items, given a key function (default: modelSortKey).
+#
+# Each model is pickled as it arrives and only the (key, bytes) pair is kept. When the
+# pickled models exceed maxMemory bytes, they are sorted and written to a temporary
+# file as a run of length-prefixed records. At the end, runs are merged with heapq.merge,
+# which is stable across runs, so models with equal keys come out in input order.
+# If everything fits in one run, nothing is written to disk.
+#
+def externalSort (models, maxMemory, tmpDir=None, key=modelSortKey) :
+  runs = []
+  batch = []
+  batchSize = 0
+  for model in models:
+    blob = pickle.dumps(model, pickle.HIGHEST_PROTOCOL)
+    batch.append((key(model), blob))
+    batchSize += len(blob)
+    if batchSize >= maxMemory:
+      runs.append(writeRun(batch, tmpDir))
+      batch = []
+      batchSize = 0
+      if len(runs) >= MAXRUNS:
+        # too many open runs; collapse them into one
+        runs = [mergeRuns(runs, tmpDir, key)]
+  # stable sort, so equal keys keep input order
+  batch.sort(key = itemgetter(0))
+  if len(runs) == 0:
+    for (k, blob) in batch:
+      yield pickle.loads(blob)
+    return
+  if len(batch) > 0:
+    runs.append(writeRun(batch, tmpDir, presorted=True))
+  batch = None
+  try:
+    for (k, model) in heapq.merge(*[readRun(fd, key) for fd in runs], key = itemgetter(0)):
+      yield model
+  finally:
+    for fd in runs:
+      fd.close()
+
+#
+RUNHEADER = struct.Struct('<I')
+MAXRUNS = 128
+def writeRun (batch, tmpDir=None, presorted=False) :
+  # Sorts batch (list of (key, pickled model)) and writes it to an anonymous temp file.
+  # Returns the open file, rewound to the start.
+  if not presorted:
+    batch.sort(key = itemgetter(0))
+  fd = tempfile.TemporaryFile(mode='w+b', dir=tmpDir)
+  for (k, blob) in batch:
+    fd.write(RUNHEADER.pack(len(blob)))
+    fd.write(blob)
+  fd.seek(0)
+  return fd
+
+#
+def mergeRuns (runs, tmpDir=None, key=modelSortKey) :
+  # Merges runs (in order, so the merge stays stable) into a single new run and closes them.
+  fd = tempfile.TemporaryFile(mode='w+b', dir=tmpDir)
+  for (k, model) in heapq.merge(*[readRun(r, key) for r in runs], key = itemgetter(0)):
+    blob = pickle.dumps(model, pickle.HIGHEST_PROTOCOL)
+    fd.write(RUNHEADER.pack(len(blob)))
+    fd.write(blob)
+  for r in runs:
+    r.close()
+  fd.seek(0)
+  return fd
+
+#
+def readRun (fd, key=modelSortKey) :
+  # Yields (key, model) records from a run written by writeRun.
+  n = RUNHEADER.size
+  while True:
+    h = fd.read(n)
+    if len(h) < n:
+      return
+    model = pickle.loads(fd.read(RUNHEADER.unpack(h)[0]))
+    yield (key(model), model)
+
+#
+# Parallel parsing.
+#
+# A GFF3 file can be cut into byte ranges that are parsed independently, provided every cut
+# falls on a safe boundary, where no model can be open:
+#   - right after a "###" line (the spec says all forward references are resolved there), or
+#   - at a feature line whose chromosome differs from that of the feature before it.
+# Nothing is cut inside a FASTA section; the chunk before it runs to the end of the file.
+#
+def findChunks (fname, nChunks) :
+  # Returns a list of (start, end) byte ranges that cover the file, cut at safe boundaries
+  # near nChunks evenly spaced offsets. There may be fewer than nChunks ranges.
+  size = os.path.getsize(fname)
+  cuts = [0]
+  with open(fname, 'rb') as fd:
+    for i in range(1, nChunks):
+      target = (size * i) // nChunks
+      if target <= cuts[-1]:
+        continue
+      cut = nextBoundary(fd, target)
+      if cut is None:
+        break
+      if cut > cuts[-1] and cut < size:
+        cuts.append(cut)
+  cuts.append(size)
+  return list(zip(cuts[:-1], cuts[1:]))
+
+#
+def nextBoundary (fd, offset) :
+  # Returns the offset of the first safe boundary at or after offset (on a line start),
+  # or None if there is none before the end of the file or a FASTA section.
+  fd.seek(offset - 1)
+  if fd.read(1) != b'\n':
+    # in the middle of a line; move to the start of the next one
+    fd.readline()
+  prevSeqid = None
+  while True:
+    pos = fd.tell()
+    line = fd.readline()
+    if not line or line.startswith(b'>') or line.startswith(b'##FASTA'):
+      return None
+    if line.startswith(b'#'):
+      if line.rstrip() == b'###':
+        return fd.tell()
+      continue
+    parts = line.split(b'\t', 1)
+    if len(parts) == 1:
+      continue
+    if prevSeqid is not None and parts[0] != prevSeqid:
+      return pos
+    prevSeqid = parts[0]
+
+#
+def readChunk (fname, start, end) :
+  # Returns the lines of fname in the byte range [start, end).
+  with open(fname, 'rb') as fd:
+    fd.seek(start)
+    data = fd.read(end - start)
+  # split on '\n' only, as lineOffsets does; str.splitlines would also split on '\r', '\x0b',
+  # '\x85', '\u2028' etc. inside a field, and shift the line numbers of the chunk
+  return [line.decode() for line in io.BytesIO(data).readlines()]
+
+#
+def mapChunks (fname, func, nWorkers, *args, nChunks=None) :
+  # Cuts fname into chunks (see findChunks) and yields func(lines, *args) for each chunk, in
+  # file order. The calls run in a pool of nWorkers processes; func and its results must be
+  # picklable. nChunks (keyword only, so it is never taken for one of args) defaults to 4
+  # per worker, so a slow chunk does not stall the pool.
+  # The pool always forks (see POOLCONTEXT), so func may rely on module globals set by the caller.
+  # At most 2 * nWorkers chunks are submitted ahead of the one being yielded, so a slow
+  # consumer does not collect the results of the whole file in memory.
+  if nChunks is None:
+    nChunks = 4 * max(nWorkers, 1)
+  tasks = [(fname, start, end, func, args) for (start, end) in findChunks(fname, nChunks)]
+  if nWorkers <= 1:
+    for t in tasks:
+      yield runChunk(t)
+    return
+  with multiprocessing.get_context(POOLCONTEXT).Pool(nWorkers) as pool:
+    pending = collections.deque()
+    for t in tasks:
+      pending.append(pool.apply_async(runChunk, (t,)))
+      if len(pending) > 2 * nWorkers:
+        yield pending.popleft().get()
+    while pending:
+      yield pending.popleft().get()
+
+#
+def runChunk (task) :
+  (fname, start, end, func, args) = task
+  return func(readChunk(fname, start, end), *args)
+
+#
+def lineOffsets (fname) :
+  # Returns an array of the byte offsets of the start of each line of fname, followed by
+  # the file size, so line i (0-based) is bytes offsets[i]:offsets[i+1].
+  offsets = array('Q', [0])
+  with open(fname, 'rb') as fd:
+    if os.fstat(fd.fileno()).st_size == 0:
+      return offsets
+    with mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+      size = len(mm)
+      pos = mm.find(b'\n')
+      while pos != -1:
+        offsets.append(pos + 1)
+        pos = mm.find(b'\n', pos + 1)
+      if offsets[-1] != size:
+        offsets.append(size)
+  return offsets
+
+#
+def countLines (fname, text) :
+  # Returns the number of feature lines of fname that contain text, without parsing; each
+  # line is counted once and "#" lines are not counted. The file is memory-mapped and
+  # scanned for text, so it should be an attribute that only occurs in column 9, such as
+  # "ID=gene:" (which any feature type, gene, ncRNA_gene, pseudogene, ... may carry).
+  pattern = text.encode()
+  n = 0
+  with open(fname, 'rb') as fd:
+    if os.fstat(fd.fileno()).st_size == 0:
+      return 0
+    with mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+      pos = mm.find(pattern)
+      while pos != -1:
+        bol = mm.rfind(b'\n', 0, pos) + 1
+        if mm[bol:bol + 1] != b'#':
+          n += 1
+        eol = mm.find(b'\n', pos)
+        if eol == -1:
+          break
+        pos = mm.find(pattern, eol + 1)
+  return n
+
+#
 def parseColumn9 (text) :
   c9 = {}
   if text == ".":
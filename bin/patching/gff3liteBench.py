@@ -0,0 +1,66 @@
+#
+# gff3liteBench.py
+#
+# Benchmarks for gff3lite.
+#
+# Generates adversarial GFF3 input in memory and times the parser over it.
+# Timings are written to stdout, one line per input size, so scaling can be
+# eyeballed: per-feature cost should stay flat as the input grows.
+#
+# Usage:
+#    python gff3liteBench.py [-n SIZE ...]
+#
+# Input shapes:
+#    nested - one long outer gene spanning the whole chromosome, with SIZE
+#             short genes (gene/mRNA/exon) nested inside it. The outer gene
+#             keeps every later model in the de-interleave buffer until the
+#             end of the chromosome, which is the worst case for
+#             Gff3Parser.deInterleaveNext().
+#
+import sys
+import io
+import time
+import argparse
+
+import gff3lite
+
+#
+def nestedGenes (n) :
+  # Returns GFF3 text with one outer gene containing n nested genes.
+  lines = [gff3lite.GFF3HEADER]
+  span = 100 * (n + 2)
+  lines.append('1\tbench\tgene\t1\t%d\t.\t+\t.\tID=gene:OUTER\n' % span)
+  lines.append('1\tbench\tmRNA\t1\t%d\t.\t+\t.\tID=transcript:OUTER;Parent=gene:OUTER\n' % span)
+  for i in range(n):
+    s = 100 * (i + 1)
+    e = s + 50
+    lines.append('1\tbench\tgene\t%d\t%d\t.\t-\t.\tID=gene:G%d\n' % (s, e, i))
+    lines.append('1\tbench\tmRNA\t%d\t%d\t.\t-\t.\tID=transcript:G%d;Parent=gene:G%d\n' % (s, e, i, i))
+    lines.append('1\tbench\texon\t%d\t%d\t.\t-\t.\tParent=transcript:G%d\n' % (s, e, i))
+  # the outer gene's last exon comes after all the nested genes
+  lines.append('1\tbench\texon\t%d\t%d\t.\t+\t.\tParent=transcript:OUTER\n' % (span - 10, span))
+  return ''.join(lines)
+
+#
+def timeIterate (text) :
+  # Returns (seconds, number of features yielded) for one full iterate().
+  t0 = time.perf_counter()
+  n = 0
+  for r in gff3lite.Gff3Parser(io.StringIO(text), returnHeader=False).iterate():
+    n += 1
+  return (time.perf_counter() - t0, n)
+
+#
+def main () :
+  parser = argparse.ArgumentParser(description='Benchmark gff3lite on adversarial input.')
+  parser.add_argument('-n', '--size', metavar='INT', type=int, action='append',
+      help='Number of nested genes. May be repeated. Default: 10000 20000 40000 80000')
+  args = parser.parse_args()
+  sizes = args.size or [10000, 20000, 40000, 80000]
+  print('shape\tgenes\tfeatures\tseconds\tusec/feature')
+  for n in sizes:
+    secs, nf = timeIterate(nestedGenes(n))
+    print('nested\t%d\t%d\t%.3f\t%.2f' % (n, nf, secs, 1e6 * secs / max(nf, 1)))
+
+if __name__ == '__main__':
+  main()
@@ -46,6 +46,8 @@ import sys
 import re
 from db import sql
 import gff3lite
+import gff3cache
+import sqltrace
 from urllib.request import urlopen
 import argparse
 
@@ -54,13 +56,22 @@ PPG = 'projection_parent_gene'
 MGP = 'mgp'
 STRAIN = ''
 PATCH_ARCHIVED_MGP_IDS=os.environ['PATCH_ARCHIVED_MGP_IDS']
+PATCH_SQL_TRACE=os.environ.get('PATCH_SQL_TRACE')
+
+# Set by processParallel for the worker processes, which inherit them because
+# gff3lite.mapChunks always forks its pool (see gff3lite.POOLCONTEXT).
+PATCHER = None
+LOOKUPS = None
 
 class Patcher :
     def __init__ (self):
         self.LIMIT = 3
+        self.WORKERS = 1
+        self.ifile = None
         self.ifd = sys.stdin
         self.ofd = sys.stdout
         self.PPG2count = {}
+        self.tracer = None
         # [Source:NCBI gene (formerly Entrezgene);Acc:226304]
         self.RE1 = re.compile(r'\[Source:NCBI.*Acc:([0-9]+)\]')
         # [Source:MGI Symbol;Acc:MGI:3801960] 
@@ -76,13 +87,24 @@ class Patcher :
             help='Output gff3 file. If not specified, writes to stdout.')
         parser.add_argument('-L', '--limit', metavar='INT', type=int, default=self.LIMIT,
             help='Association count limit.')
+        parser.add_argument('-j', '--jobs', metavar='INT', type=int, default=self.WORKERS,
+            help='Number of worker processes. Only used with -i (an uncompressed file).')
+        parser.add_argument('-t', '--sql-trace', metavar='FILE', default=PATCH_SQL_TRACE,
+            help='Append the label, time and row count of each MGI query to FILE (JSON lines). ' +
+            'Default: $PATCH_SQL_TRACE, if set.')
+        parser.add_argument('--sql-slow', metavar='SECONDS', type=float, default=5,
+            help='Also log the EXPLAIN (ANALYZE, BUFFERS) plan of queries that take this long. Default: 5')
 
         args = parser.parse_args()
         if args.input:
+            self.ifile = args.input
             self.ifd = open(args.input, 'r')
         if args.output:
             self.ofd = open(args.output, 'w')
         self.LIMIT = args.limit
+        self.WORKERS = args.jobs
+        if args.sql_trace:
+            self.tracer = sqltrace.SqlTracer(args.sql_trace, args.sql_slow, append=True)
         return args
 
 
@@ -95,6 +117,12 @@ class Patcher :
             ppgCount = self.PPG2count.setdefault(ppg,0)
             self.PPG2count[ppg] = ppgCount + 1
 
+    def sql (self, label, q) :
+        # runs q, through the SQL tracer if there is one
+        if self.tracer:
+            return self.tracer.sql(label, q)
+        return sql(q)
+
     def getMgiGeneModelIds (self):
         symbol2mgi = {}
         entrez2mgi = {}
@@ -109,7 +137,7 @@ class Patcher :
             AND a._logicaldb_key = 1
             AND a.preferred = 1
             '''
-        for r in sql(q1):
+        for r in self.sql('patch: lookup marker symbols', q1):
             symbol2mgi[r['symbol']] = r['accid']
 
         q2 = '''
@@ -123,7 +151,7 @@ class Patcher :
             AND me._logicaldb_key in (59,60)
             AND me.preferred = 1
             '''
-        for r in sql(q2):
+        for r in self.sql('patch: lookup entrez/ensembl ids', q2):
             if r['_logicaldb_key'] == 59:
                 entrez2mgi[r['accid']] = r['mgiid'] 
             else:
@@ -145,23 +173,34 @@ class Patcher :
         return ensembl2mgp
 
 
-    def process(self, entrez2mgi, mgi2ensembl, symbol2mgi, ensembl2mgp) :
+    def setStrain(self, line) :
         global STRAIN
+        if line.startswith('#!genome-build '):
+            #!genome-build  A_J_v3
+            gb = line.strip().split()[1]
+            i = gb.rindex('_')
+            strain = gb[:i].replace('_','').lower()
+            if strain != STRAIN:
+                STRAIN = strain
+                self.log('STRAIN = ' + STRAIN)
+
+    def process(self, entrez2mgi, mgi2ensembl, symbol2mgi, ensembl2mgp, lines=None) :
         results = []
-        for line in self.ifd:
+        if lines is None:
+            lines = self.ifd
+        for line in lines:
+            if type(line) is list:
+                # already parsed (from a gff3cache sidecar)
+                f = line
             # comment lines get printed as is
-            if line.startswith('#') :
-                if line.startswith('#!genome-build '):
-                    #!genome-build  A_J_v3
-                    gb = line.strip().split()[1]
-                    i = gb.rindex('_')
-                    STRAIN = gb[:i].replace('_','').lower()
-                    self.log('STRAIN = ' + STRAIN)
+            elif line.startswith('#') :
+                self.setStrain(line)
                 results.append(line)
                 continue
+            else:
+                f = gff3lite.parseLine(line)
             # Any feature line that is not a top level feature, or is top level but has no projection parent,
             # gets printed as is.
-            f = gff3lite.parseLine(line)
             attrs = f[8] # get a handle on the column 9 attributes
             if PPG in attrs:
                 # strip the version number
@@ -214,10 +253,40 @@ class Patcher :
         return results
 
 
+    def processParallel(self, entrez2mgi, mgi2ensembl, symbol2mgi, ensembl2mgp) :
+        # Same as process(), but the input file is cut into chunks (see gff3lite.findChunks)
+        # that are patched in self.WORKERS processes. Output lines keep their input order.
+        global PATCHER, LOOKUPS
+        # the strain comes from the header, which only the first chunk sees
+        for line in self.ifd:
+            if not line.startswith('#'):
+                break
+            self.setStrain(line)
+        PATCHER = self
+        LOOKUPS = (entrez2mgi, mgi2ensembl, symbol2mgi, ensembl2mgp)
+        results = []
+        for (lines, counts) in gff3lite.mapChunks(self.ifile, patchChunk, self.WORKERS):
+            results.extend(lines)
+            for (ppg, n) in counts.items():
+                self.PPG2count[ppg] = self.PPG2count.get(ppg, 0) + n
+        return results
+
     def doPatching (self) :
         ensembl2mgp = self.getMGPids(PATCH_ARCHIVED_MGP_IDS)
         symbol2mgi, entrez2mgi, mgi2ensembl = self.getMgiGeneModelIds()
-        lines = self.process(entrez2mgi, mgi2ensembl, symbol2mgi, ensembl2mgp)
+        if self.tracer:
+            for line in self.tracer.report():
+                self.log(line)
+            self.tracer.close()
+        cache = gff3cache.openCache(self.ifile) if self.ifile else None
+        if cache:
+            self.log('Using gff3cache: ' + gff3cache.cachePath(self.ifile))
+            lines = self.process(entrez2mgi, mgi2ensembl, symbol2mgi, ensembl2mgp, lines=cachedLines(cache))
+            cache.close()
+        elif self.WORKERS > 1 and self.ifile:
+            lines = self.processParallel(entrez2mgi, mgi2ensembl, symbol2mgi, ensembl2mgp)
+        else:
+            lines = self.process(entrez2mgi, mgi2ensembl, symbol2mgi, ensembl2mgp)
         return lines
 
     def applyLimit (self, lines) :
@@ -247,6 +316,21 @@ class Patcher :
         results = self.applyLimit(results)
         self.writeOutput(results)
 
+def cachedLines (cache) :
+    # Lines of a gff3cache sidecar, in the form Patcher.process accepts:
+    # feature lines already parsed, everything else as text.
+    for i in range(len(cache)):
+        if cache.isFeature(i):
+            yield cache.feature(i)
+        else:
+            yield cache.line(i)
+
+def patchChunk (lines) :
+    # Worker for Patcher.processParallel. Returns the patched lines and their PPG counts.
+    PATCHER.PPG2count = {}
+    results = PATCHER.process(*LOOKUPS, lines=lines)
+    return (results, PATCHER.PPG2count)
+
 if __name__ == '__main__':
     Patcher().main()
 
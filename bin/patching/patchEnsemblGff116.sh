@@ -13,7 +13,7 @@ function log {
     echo $* >> ${PATCH_LOG}
 }
 
-rm -f ${PATCH_LOG}
+rm -f ${PATCH_LOG} ${PATCH_SQL_TRACE}
 log "PatchEnsemblGff116 started at:" `date`
 
 while [ $# -gt 0 ]; do
@@ -36,8 +36,16 @@ while [ $# -gt 0 ]; do
     log "fnameNoExt=" $fnameNoExt
     log "ofile=" $ofile
     mkdir -p ${PATCH_ODIR}/${strain}
-    if [ "${lastExt}" == "gz" ] ; then
+    if [ "${lastExt}" == "gz" ] && [ "${PATCH_WORKERS:-1}" -gt 1 ] ; then
+	# parallel patching needs a seekable file, not a pipe
+	tmpfile="${PATCH_ODIR}/${strain}/${fnameNoExt}.tmp"
+	gunzip -c $1 > ${tmpfile}
+	$PYTHON patchEnsemblGff116.py -L $PATCH_PPG_LIMIT -j $PATCH_WORKERS -i ${tmpfile} 2>> ${PATCH_LOG} | gzip > ${ofile}
+	rm -f ${tmpfile}
+    elif [ "${lastExt}" == "gz" ] ; then
 	gunzip -c $1 | $PYTHON patchEnsemblGff116.py -L $PATCH_PPG_LIMIT 2>> ${PATCH_LOG} | gzip > ${ofile} 
+    elif [ "${PATCH_WORKERS:-1}" -gt 1 ] ; then
+	$PYTHON patchEnsemblGff116.py -L $PATCH_PPG_LIMIT -j $PATCH_WORKERS -i "$1" > "${ofile}" 2>> ${PATCH_LOG}
     else
 	$PYTHON patchEnsemblGff116.py -L $PATCH_PPG_LIMIT < "$1" > "${ofile}" 2>> ${PATCH_LOG}
     fi
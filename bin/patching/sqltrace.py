@@ -0,0 +1,137 @@
+#
+# sqltrace.py
+#
+# Structured tracing of the SQL statements a load runs through db.sql.
+#
+# Every statement is run under a label ("lookup markers", "delete strain markers", ...)
+# and written to a JSON lines log, one object per statement:
+#
+#    {"time": "2026-10-19 09:12:03", "label": "lookup markers", "seconds": 4.2183,
+#     "rows": 81234, "sql": "select m._Marker_key, ..."}
+#
+# "rows" is the number of rows returned, or the number affected when the caller
+# says how to get it from the results (e.g. a "returning ... select count(*)"
+# delete); it is null when neither is known. Statements that take slowSeconds
+# or more also get a "plan": the EXPLAIN (ANALYZE, BUFFERS) output for read-only
+# statements, the plain EXPLAIN (estimated) plan for statements that change data,
+# since ANALYZE would run them a second time. Statements that cannot be explained
+# (DDL) get no plan.
+#
+# Usage:
+#    import sqltrace
+#    tracer = sqltrace.SqlTracer('load.sql.jsonl', slowSeconds=5)
+#    results = tracer.sql('lookup markers', 'select ...', 'auto')
+#    tracer.record('bcp MRK_StrainMarker', seconds, statement=bcpCmd)   # timed elsewhere
+#    for line in tracer.report(): print(line)
+#    tracer.close()
+#
+import re
+import json
+import time
+
+import db
+
+# statements that may be run again under EXPLAIN ANALYZE without side effects
+READONLY = re.compile(r'^\s*(select|with)\b', re.I)
+WRITES = re.compile(r'\b(insert|update|delete|into|nextval|setval|lock)\b', re.I)
+# statements EXPLAIN accepts
+EXPLAINABLE = re.compile(r'^\s*(select|with|insert|update|delete|values)\b', re.I)
+
+#
+def normalize (cmd) :
+  # The statement on one line, for the log.
+  return ' '.join(cmd.split())
+
+#
+def isReadOnly (cmd) :
+  return READONLY.match(cmd) is not None and WRITES.search(cmd) is None
+
+#
+def rowCount (results, mode='auto', rows=None) :
+  # Rows returned (len of the results), or rows(results) if given; None if unknown,
+  # as for statements run with mode None (no results).
+  if rows is not None:
+    try:
+      return rows(results)
+    except (LookupError, TypeError, ValueError):
+      return None
+  if mode is not None and isinstance(results, list):
+    return len(results)
+  return None
+
+#
+class SqlTracer :
+  # Runs statements through db.sql, times them, writes one log entry each and
+  # explains the slow ones. Keeps the statement count, time and rows of each label.
+  def __init__ (self, path=None, slowSeconds=0, append=False, query=None) :
+    # path: the trace log; None traces without writing a log
+    # slowSeconds: statements that take at least this long are explained; 0 = none
+    # query: the function that runs a statement, default db.sql
+    self.path = path
+    self.fp = open(path, 'a' if append else 'w') if path else None
+    self.slowSeconds = slowSeconds
+    self.query = query or db.sql
+    self.stats = {}   # {label: [statements, seconds, rows]}, in first-run order
+
+  def sql (self, label, cmd, mode='auto', rows=None) :
+    # Runs cmd as db.sql(cmd, mode) and traces it.
+    # rows: optional function of the results that returns the rows affected
+    # Returns the results of db.sql.
+    start = time.time()
+    results = self.query(cmd, mode)
+    seconds = time.time() - start
+    plan = None
+    if self.slowSeconds and seconds >= self.slowSeconds:
+      plan = self.explain(cmd)
+    self.record(label, seconds, rowCount(results, mode, rows), cmd, plan)
+    return results
+
+  def explain (self, cmd) :
+    # Returns the plan of cmd as a list of lines, None if it cannot be explained.
+    if isReadOnly(cmd):
+      prefix = 'explain (analyze, buffers) '
+    elif EXPLAINABLE.match(cmd):
+      prefix = 'explain '
+    else:
+      return None
+    try:
+      results = self.query(prefix + cmd, 'auto')
+    except Exception as e:
+      return ['explain failed: %s' % normalize(str(e))]
+    return [list(r.values())[0] for r in results or []]
+
+  def record (self, label, seconds, rows=None, statement=None, plan=None) :
+    # Logs one statement (or command) that was timed by the caller.
+    s = self.stats.setdefault(label, [0, 0.0, None])
+    s[0] += 1
+    s[1] += seconds
+    if rows is not None:
+      s[2] = (s[2] or 0) + rows
+    if self.fp is None:
+      return
+    entry = {
+      'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+      'label': label,
+      'seconds': round(seconds, 4),
+      'rows': rows,
+    }
+    if statement is not None:
+      entry['sql'] = normalize(statement)
+    if plan is not None:
+      entry['plan'] = plan
+    self.fp.write(json.dumps(entry) + '\n')
+    self.fp.flush()
+
+  def report (self) :
+    # Returns the per-label totals as lines of text, slowest label first.
+    total = sum([s[1] for s in self.stats.values()])
+    n = sum([s[0] for s in self.stats.values()])
+    lines = ['sql: %s statements, %.2f sec%s' % (n, total, (', trace in %s' % self.path) if self.path else '')]
+    for label, (ct, seconds, rows) in sorted(self.stats.items(), key=lambda x: -x[1][1]):
+      lines.append('  %-40s %5s x %9.2f sec%s' % (label, ct, seconds, '' if rows is None else ', %s rows' % rows))
+    return lines
+
+  def close (self) :
+    if self.fp:
+      self.fp.close()
+      self.fp = None
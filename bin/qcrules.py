@@ -0,0 +1,174 @@
+#
+#  qcrules.py
+###########################################################################
+#
+#  Purpose:
+#
+#      Declarative QC rules for strainmarkerload.py. A rule is declared
+#      once, with its name, the QC bucket its findings go to, a predicate,
+#      a severity and the message of its bucket; a RuleSet runs all of its
+#      rules over a record in one pass and keeps, for each rule, the number
+#      of records it flagged and the time spent in it.
+#
+#      A predicate takes the record and returns a false value if the record
+#      passes, else True or a dict of the fields to report with the finding.
+#
+#      Severities:
+#
+#      report  the finding is reported, the record is kept
+#      skip    the finding is reported, the record is skipped
+#      fatal   the finding is reported, the load fails
+#
+#  Usage:
+#
+#      import qcrules
+#      rules = qcrules.RuleSet([
+#          qcrules.Rule('start', lambda r: r[1] == '', qcrules.SKIP, 'Start Coordinate missing'),
+#          qcrules.Rule('chr_u', lambda r: r[0] not in chrs and {'chr': r[0]}, qcrules.SKIP, ...),
+#      ])
+#      findings, severity = rules.check(record)   # [(rule, fields), ...] in rule order, worst severity or None
+#      for line in rules.report(): print(line)
+#
+#  Notes:
+#
+#      Hit counts are exact. Times are measured on one record in TIMEEVERY
+#      and scaled up, so that the timing costs little next to the rules.
+#
+###########################################################################
+
+import time
+
+REPORT = 'report'
+SKIP = 'skip'
+FATAL = 'fatal'
+SEVERITIES = [REPORT, SKIP, FATAL]     # least to most severe
+
+TIMEEVERY = 16      # records between timed checks
+
+class Rule:
+    # Is: one QC check
+    # Has: a name, the QC bucket of its findings (default: the name), the
+    #   predicate, severity and message, the record kinds it applies to
+    #   (None = all); the number of records flagged and the (estimated)
+    #   seconds spent in the predicate
+    # Does: see the header
+    #
+    def __init__ (self, name, predicate, severity, message, bucket=None, kinds=None):
+        # Purpose: constructor
+        # Throws: ValueError for an unknown severity
+        if severity not in SEVERITIES:
+            raise ValueError('%s: unknown severity: %s' % (name, severity))
+        self.name = name
+        self.predicate = predicate
+        self.severity = severity
+        self.message = message
+        self.bucket = bucket or name
+        self.kinds = kinds
+        self.hits = 0
+        self.seconds = 0.0
+
+# end class Rule ---------------------------------
+
+class RuleSet:
+    # Is: a set of rules run together
+    # Has: the rules in the order their findings are reported; the number of
+    #   records checked, the time of checks made outside check() (batches);
+    #   the counts are kept by the root set, those made by select() share them
+    # Does: runs the rules over records in one pass, counts and times them
+    #
+    def __init__ (self, rules):
+        # Purpose: constructor
+        # Throws: ValueError if two rules have the same name
+        self.rules = list(rules)
+        self.byName = {}
+        for rule in self.rules:
+            if rule.name in self.byName:
+                raise ValueError('duplicate QC rule: %s' % rule.name)
+            self.byName[rule.name] = rule
+        self.predicates = [(rule, rule.predicate) for rule in self.rules]
+        self.severityRank = dict([(rule, SEVERITIES.index(rule.severity)) for rule in self.rules])
+        self.records = 0
+        self.batchSeconds = 0.0
+        self.root = self
+
+    def select (self, kind=None, exclude=()):
+        # Returns: a RuleSet of the rules that apply to records of kind and
+        #   are not named in exclude; the rules (and their counts) are shared
+        subset = RuleSet([rule for rule in self.rules
+            if rule.name not in exclude and (kind is None or rule.kinds is None or kind in rule.kinds)])
+        subset.root = self.root
+        return subset
+
+    def rule (self, name):
+        return self.byName[name]
+
+    def check (self, record):
+        # Purpose: runs every rule over record
+        # Returns: ([(rule, fields dict), ...] in rule order, the worst
+        #   severity found, or None if the record passed every rule)
+        root = self.root
+        root.records += 1
+        findings = []
+        if root.records % TIMEEVERY:
+            for rule, predicate in self.predicates:
+                result = predicate(record)
+                if result:
+                    findings.append((rule, result))
+        else:
+            for rule, predicate in self.predicates:
+                start = time.perf_counter()
+                result = predicate(record)
+                rule.seconds += (time.perf_counter() - start) * TIMEEVERY
+                if result:
+                    findings.append((rule, result))
+        if not findings:
+            return findings, None
+        worst = 0
+        for i in range(len(findings)):
+            rule, result = findings[i]
+            rule.hits += 1
+            if result is True:
+                findings[i] = (rule, {})
+            worst = max(worst, self.severityRank[rule])
+        return findings, SEVERITIES[worst]
+
+    def record (self, name, hits):
+        # Purpose: counts the findings of a rule checked outside check(),
+        #   e.g. as a vectorized batch
+        self.byName[name].hits += hits
+
+    def addBatchTime (self, seconds):
+        # Purpose: adds the time of checks made outside check()
+        self.root.batchSeconds += seconds
+
+    def reset (self):
+        self.records = 0
+        self.batchSeconds = 0.0
+        for rule in self.rules:
+            rule.hits = 0
+            rule.seconds = 0.0
+
+    def stats (self):
+        # Returns: (records, batch seconds, [(name, hits, seconds), ...]),
+        #   to be merged into another process's RuleSet
+        return (self.records, self.batchSeconds, [(rule.name, rule.hits, rule.seconds) for rule in self.rules])
+
+    def merge (self, stats):
+        records, batchSeconds, ruleStats = stats
+        self.records += records
+        self.batchSeconds += batchSeconds
+        for name, hits, seconds in ruleStats:
+            rule = self.byName[name]
+            rule.hits += hits
+            rule.seconds += seconds
+
+    def report (self, title='QC rules'):
+        # Returns: the hits and time of each rule as lines of text, slowest first
+        total = sum([rule.seconds for rule in self.rules])
+        lines = ['%s: %s records, %.2f sec%s' % (title, self.records, total,
+            (', %.2f sec in batches' % self.batchSeconds) if self.batchSeconds else '')]
+        for rule in sorted(self.rules, key=lambda r: -r.seconds):
+            lines.append('  %-16s %-6s %9s hits %8.2f sec' % (rule.name, rule.severity, rule.hits, rule.seconds))
+        return lines
+
+# end class RuleSet ---------------------------------
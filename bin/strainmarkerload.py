@@ -8,7 +8,19 @@
 #
 #  Usage:
 #
-#      strainmarkerload.py
+#      strainmarkerload.py [--strains LIST] [--chromosomes LIST] [--sample FRACTION]
+#
+#      the options restrict a QC only run to a subset of the input, see
+#      STRAIN_FILTER, CHR_FILTER and SAMPLE_FRACTION in strainmarkerload.config
+#
+#      or, in-process (importing the module reads no settings and runs nothing):
+#
+#      import strainmarkerload
+#      config = strainmarkerload.LoadConfig.fromEnvironment()   # or LoadConfig(INPUTDIR=..., ...)
+#      lookups = strainmarkerload.Lookups()   # loaded by the first run, reused by later ones
+#      rc = strainmarkerload.run(config, lookups)
+#      lookups.marker, lookups.ensembl       # the marker and Ensembl lookups, for reuse
+#      strainmarkerload.geneModels()         # the gene model rows, with GM_FORMAT=memory
 #
 #  Inputs:
 #
@@ -58,13 +70,36 @@ import sys
 import os
 import Set
 import re
+import io
+import itertools
+import json
+import mmap
+import multiprocessing
+import subprocess
+import concurrent.futures
+import time
+import zlib
+import heapq
+import pickle
+import resource
+import argparse
+from array import array
 
 import db
 import mgi_utils
 import loadlib
-import accessionlib
 
-db.setTrace(True)
+# gff3lite lives with the patching scripts
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'patching'))
+import gff3lite
+import gff3cache
+import sqltrace
+
+import bcpwriter
+import accsplit
+import gmhandoff
+import lookuptables
+import qcrules
 
 #
 #  CONSTANTS
@@ -75,6 +110,8 @@ USAGE='strainmarkerload.py'
 #
 #  GLOBALS
 #
+#  settings are placeholders until configure() sets them from a LoadConfig
+#
 
 #
 # sequence description templates
@@ -100,15 +137,48 @@ loaddate = loadlib.loaddate
 nonMuscStrainKeys = [31303, 1398, 34371] # caroli, spretus, pahari
 
 # the release numbers from MGP and B6 genome
-releaseMGP = os.environ['RELEASE_MGP']
-releaseB6 = os.environ['RELEASE_B6']
+releaseMGP = None
+releaseB6 = None
 
 # true if we want to run QC and not load relationships
-QC_ONLY = os.environ['QC_ONLY']
+# a QC only run allocates no keys and writes no bcp or gene model files, only the curator log
+QC_ONLY = None
+qcOnly = False
 
 # if true only load B6 strain markers
-loadOnlyB6 = os.environ['B6_ONLY']
-print('loadOnlyB6: %s' % loadOnlyB6)
+loadOnlyB6 = None
+
+# minimum number of gene records in each strain file: the lines with an ID=gene: attribute,
+# which parseMGPFile() keys the strain markers on; checked before anything is loaded
+minRecords = 0
+
+# subset filters, for QC only runs: strain names (MGI strain, genome-version strain or
+# file name; B6 is C57BL/6J), chromosomes, and a deterministic sample of the records
+# (0 < sampleFraction <= 1); filtered lines are dropped before they are tokenized
+strainFilter = []
+chrFilter = set()
+sampleFraction = 1.0
+
+# number of worker processes used to tokenize each GFF3 input file
+gff3Workers = 1
+# approximate size of the chunks each worker tokenizes; few chunks are in flight at a
+# time (see gff3lite.mapChunks), so this bounds the memory of a parallel parse
+gff3ChunkBytes = 16 * 1024 * 1024
+
+# start method of the worker pools: the workers read the globals set by configure()
+# and init() (settings, lookups, QC rules), which only forked workers inherit; spawn
+# and forkserver (the defaults on macOS and, from Python 3.14, Linux) would see the
+# placeholder values above
+poolContext = multiprocessing.get_context('fork')
+
+# if true, read GFF3 inputs from their pre-parsed gff3cache sidecars when fresh
+gff3CacheEnabled = False
+
+# if true, run the MGP coordinate QC checks as vectorized masks (needs numpy),
+# over qcBatchRows records at a time
+qcVectorized = False
+qcBatchRows = 65536
+gffcolumns = None
 
 # accession ID logicalDB keys
 ensLDBKey = 60		# Ensembl
@@ -119,9 +189,9 @@ msgLDBKey = 212		# MGI Strain Gene
 mgiTypeKey = 44
 
 # input files
-infileDir = os.environ['INPUTDIR']
-mgpInputFileString = os.environ['INPUT_MGP_DIR_LIST']
-b6InputFile = os.environ['INPUT_MGI_GFF_FILE']
+infileDir = None
+mgpInputFileString = None
+b6InputFile = None
 fpB6Inputfile = ''
 
 #
@@ -129,47 +199,88 @@ fpB6Inputfile = ''
 #
 
 # curation log
-curLog = os.getenv('LOG_CUR')
+curLog = None
+fpLogCur = ''
 
 # output bcp files
-outputDir = os.environ['OUTPUTDIR']
+outputDir = None
 
-smBcpFile = os.environ['SM_BCP_FILE']
-strainMarkerFile = '%s/%s' % (outputDir, smBcpFile)
-fpStrainMarkerFile = ''
+smBcpFile = None
+strainMarkerFile = None
+smBcpWriter = ''
 
-accBcpFile = os.environ['ACC_BCP_FILE']
-accFile = '%s/%s' % (outputDir, accBcpFile)
-fpAccFile = ''
+accBcpFile = None
+accFile = None
+accBcpWriter = ''
 
-accRefBcpFile = os.environ['ACC_REF_BCP_FILE']
-accRefFile = '%s/%s' % (outputDir, accRefBcpFile)
-fpAccRefFile = ''
+accRefBcpFile = None
+accRefFile = None
+accRefBcpWriter = ''
 
 #
 # output for downstream loads
 #
 
 # MGP
-gmMgpFile = os.environ['GM_MGP_INPUT_FILE']
-fpGmMgpFile = ''
-biotypeMgpFile = os.environ['GM_MGP_BIOTYPE_FILE']
-fpBiotypeMgpFile = ''
+gmMgpFile = None
+gmMgpWriter = ''
+biotypeMgpFile = None
+biotypeMgpWriter = ''
 
 # MGI B6
-gmB6File = os.environ['GM_B6_INPUT_FILE']
-fpGmB6File = ''
-biotypeB6File = os.environ['GM_B6_BIOTYPE_FILE']
-fpBiotypeB6File = ''
+gmB6File = None
+gmB6Writer = ''
+biotypeB6File = None
+biotypeB6Writer = ''
+
+# format of the gene model output: 'text' (the four files above), 'binary' (one
+# gmhandoff file per pipeline instead) or 'both' (binary, plus the text files
+# exported from it when the files are closed)
+gmFormat = 'text'
+gmMgpHandoffFile = None
+gmMgpHandoff = None
+gmB6HandoffFile = None
+gmB6Handoff = None
 
 # QC reporting data structures
 qcDict = {} 
+qcCounts = {}   # {bucket: number of findings, ...}
 messageMap = {}
 
+# the buckets of the B6 QC rules, in the order they are written to the curator log
+b6QcBuckets = ['b6_chr_m', 'b6_chr_u', 'b6_start', 'b6_end', 'b6_start/end', 'b6_strand',
+    'b6_biotype_m', 'b6_smid', 'b6_mgi_m', 'b6_qname', 'b6_biotype_u']
+
+# QC findings are streamed to this JSONL sidecar as they occur, one object per finding;
+# the curator log is rendered from it, with at most qcLogCap findings per bucket (0 = all)
+qcJsonFile = None
+fpQcJsonFile = ''
+qcLogCap = 0
+
+# the QC rules, built by buildQcRules() once the lookups are loaded: the strain
+# of each MGP file, each MGP record, each B6 line (by line type, see parseB6File)
+# each rule counts the records it flagged and the time spent in it
+mgpFileQcRules = None
+mgpQcRules = None
+b6QcRules = None
+b6QcRulesByKind = {}
+
+# input files QC findings refer to; a finding stores (file id, byte offset, length)
+# instead of a copy of the line
+qcInputs = []       # [path, ...], indexed by file id
+qcLineOffsets = {}  # {file id: array of line start offsets}, only while the file is parsed
+qcMaps = {}         # {file id: mmap}, only while the curator log is written
+
+# every accession ID written to the ACC_Accession bcp file, to catch an ID being
+# emitted twice for the same logical DB before anything is deleted or bcp'd in
+accRegistry = {}    # {(ldbKey, accID): strain that emitted it first, ...}
+accCollisions = {}  # {(strain, ldbKey): [(accID, first strain, preferred), ...], ...}
+ldbNames = {60: 'Ensembl', 209: 'Mouse Genome Project', 212: 'MGI Strain Gene'}
+
 # Lookups
 strainTranslationLookup = {} # {badName: _Strain_key, ...}
-markerLookup = {}            # {MGI ID: Marker, ...}
-ensemblLookup = {}	     # {ENS ID: Marker MGI ID, ...}
+markerLookup = {}            # {MGI ID: MarkerRow, ...}, a lookuptables.MarkerTable
+ensemblLookup = {}	     # {ENS ID: [Marker MGI ID, ...], ...}, a lookuptables.EnsemblTable
 chrLookup = {}		     # {Mouse, Laboratory chr: chrKey, ...}
 biotypeLookup = {}           # {raw biotype:feature type, ...}
 mcvTermLookup = []	     # list of feature types (B6)
@@ -182,6 +293,7 @@ b6RefsKey = 282660
 
 # the MGI C57BL/6J strain key
 b6StrainKey = 38048
+b6Strain = 'C57BL/6J'
 
 # Data structure for B6 lines parsed from GFF file
 # {mgiID:[line1, ...], ...}
@@ -190,18 +302,88 @@ b6ToLoadDict = {}
 # strainmarkerload user key
 userKey = 1600
 
+# splits accession IDs into prefixPart/numericPart (fast paths for the ID shapes we
+# write); with ACC_SPLIT_VERIFY=true every ID is also split by accessionlib.split_accnum
+accSplitter = None
+
+# the trailing columns of every bcp row: created by, modified by, creation date, modification date
+auditColumns = (userKey, userKey, loaddate, loaddate)
+
 # database primary keys, will be set to the next available from the db
 nextSMKey = None	# MRK_StrainMarker._StrainMarker_key
 nextAccKey = None	# ACC_Accession._Accession_key
+firstSMKey = None	# the first key of each, for reserveKeys()
+firstAccKey = None
+
+# if true, the bcp files are written with keys numbered from 1; reserveKeys() then
+# takes exactly as many keys as were written from smKeySequence and accKeySequence
+# (nextval) and renumbers the bcp files; this does not make the load safe to run
+# alongside others: only writers that also use the sequences are kept apart, and
+# the other MGI loads take max(key) + 1 (see keyReservationLimit)
+# if false, the keys start at nextval(smKeySequence) and max(_Accession_key) + 1,
+# and nothing else may write ACC_Accession until the bcp is done
+# either way the keys used are recorded in manifestFile
+keyReservation = False
+smKeySequence = 'mrk_strainmarker_seq'
+accKeySequence = 'acc_accession_seq'
+keyRanges = {}		# {table: [[first key, last key], ...]}
+keyReservationLimit = 'reserved keys are only kept apart from writers that use the same sequence; ' + \
+    'loads that take max(key) + 1 must not run until this load is done'
+manifestFile = None
 
 # for bcp
-bcpin = '%s/bin/bcpin.csh' % os.environ['PG_DBUTILS']
-server = os.environ['MGD_DBSERVER']
-database = os.environ['MGD_DBNAME']
+bcpin = None
+server = None
+database = None
 strainmarker_table = 'MRK_StrainMarker'
 acc_table = 'ACC_Accession'
 accref_table = 'ACC_AccessionReference'
 
+# format of the bcp files: 'text' (tab-delimited, loaded by bcpin.csh) or 'binary'
+# (PostgreSQL binary COPY, loaded by psql \copy); see bcpwriter.py
+bcpFormat = 'text'
+
+# if true, bcp into unlogged staging tables and replace the live rows in one
+# short transaction (doStagedBcp) instead of doDeletes() followed by doBcp()
+stagedSwap = False
+stageSuffix = '_stage'
+
+# if true, the ACC_Accession bcp file is sorted on accID before it is loaded, and its
+# _Accession_keys renumbered in the new order (ACC_AccessionReference follows), so
+# the bulk load appends to the accID and primary key indexes instead of splitting pages
+# sorts larger than bcpSortMemory bytes spill to sorted runs in OUTPUTDIR
+bcpSorted = False
+bcpSortMemory = 256 * 1024 * 1024
+
+# if > 0, doDeletes() deletes the strain markers this many at a time, committing
+# each batch and pausing deleteBatchPause seconds in between (0 = one statement)
+deleteBatchSize = 0
+deleteBatchPause = 0
+
+# if true, doBcp() drops the non-critical indexes of MRK_StrainMarker and
+# ACC_AccessionReference, plus the ACC_Accession indexes in BULK_ACC_INDEXES,
+# and rebuilds them once the bcp is done, bulkIndexWorkers at a time
+bulkIndexes = False
+bulkAccIndexes = []
+bulkIndexWorkers = 4
+bulkIndexFile = None
+mgdUser = 'mgd_dbo'
+
+# if > 0, the memory budget of the load in bytes: when the resident set size
+# exceeds it, the parsed strain markers spill to sorted temp files in OUTPUTDIR
+# (see StrainMarkerGroups); the peak RSS is reported against it at the end
+memoryBudget = 0
+memoryCheckRows = 10000     # strain markers parsed between memory checks
+markerGroups = []           # every StrainMarkerGroups of the run, spilled together
+spillCt = 0                 # number of times the budget was exceeded
+
+# every statement run through traceSql() is logged to sqlTraceFile (JSON lines)
+# with its label, elapsed time and row count; statements that take sqlSlowSeconds
+# or more also get their plan (see sqltrace.py; 0 = no plans)
+sqlTraceFile = None
+sqlSlowSeconds = 0
+sqlTracer = None
+
 #
 # Stats
 # 
@@ -215,21 +397,6 @@ mgpSkipCt = 0 # total mgp skipped
 mgpNoMarkerCt = 0 # total mgp w/no marker
 ctByStrain = {} # {strain: ct, ...}
 
-class Marker:
-    # Is: data object for a marker
-    # Has: a set of marker attributes
-    # Does: provides direct access to its attributes
-    #
-    def __init__ (self):
-        # Purpose: constructor
-        self.markerID = None
-        self.symbol = None
-
-    def toString(self):
-        return '%s, %s' % (self.markerID, self.symbol)
-
-# end class Marker ---------------------------------
-
 class StrainMarker:
     # Is: data object for a strain marker
     # Has: a set of strain marker attributes
@@ -254,65 +421,497 @@ class StrainMarker:
 
 # end class StrainMarker ----------------------------
 
-def checkArgs ():
-    # Purpose: Validate the arguments to the script.
-    # Returns: 1 if error, else 0
+class StrainMarkerGroups:
+    # Is: the strain marker objects of one strain file, grouped by marker
+    #   (MGI ID) in the order each marker was first seen
+    # Has: the objects held in memory, the sorted runs spilled to temp files
+    # Does: adds objects; spills the objects in memory to a sorted run;
+    #   iterates the groups, merging the runs back in the original order
+    #
+    def __init__ (self, tmpDir=None):
+        # Purpose: constructor
+        self.tmpDir = tmpDir
+        self.groupNo = {}   # {mgiID: group number, ...}
+        self.batch = []     # [(group number, sequence number, strainMarkerObject), ...]
+        self.runs = []      # open temp files, see gff3lite.writeRun
+        self.seq = 0
+
+    def add (self, mgiID, strainMarkerObject):
+        if mgiID not in self.groupNo:
+            self.groupNo[mgiID] = len(self.groupNo)
+        self.batch.append((self.groupNo[mgiID], self.seq, strainMarkerObject))
+        self.seq += 1
+
+    def spill (self):
+        # Purpose: writes the objects in memory to a run sorted by (group, sequence)
+        if len(self.batch) == 0:
+            return
+        self.runs.append(gff3lite.writeRun(
+            [(r[:2], pickle.dumps(r, pickle.HIGHEST_PROTOCOL)) for r in self.batch], self.tmpDir))
+        self.batch = []
+
+    def __len__ (self):
+        return len(self.groupNo)
+
+    def close (self):
+        # Purpose: removes the spilled runs
+        for fd in self.runs:
+            fd.close()
+        self.runs = []
+
+    def __iter__ (self):
+        # Returns: generator of lists of strainMarkerObjects, one per marker
+        self.batch.sort(key=lambda r: r[:2])
+        records = heapq.merge(*[(r for k, r in gff3lite.readRun(fd, lambda r: r[:2])) for fd in self.runs],
+            self.batch, key=lambda r: r[:2])
+        try:
+            group = []
+            for r in records:
+                if group and r[0] != groupNo:
+                    yield group
+                    group = []
+                groupNo = r[0]
+                group.append(r[2])
+            if group:
+                yield group
+        finally:
+            for fd in self.runs:
+                fd.seek(0)
+
+# end class StrainMarkerGroups ----------------------------
+
+class LoadConfig:
+    # Is: the configuration of one load
+    # Has: one attribute per setting, named as in strainmarkerload.config
+    #   (config.INPUTDIR, config.QC_ONLY, ...); values are strings, as in
+    #   the environment
+    # Does: checks that the required settings are present, fills in defaults
+    #
+    REQUIRED = ['RELEASE_MGP', 'RELEASE_B6', 'QC_ONLY', 'B6_ONLY',
+        'INPUTDIR', 'INPUT_MGP_DIR_LIST', 'INPUT_MGI_GFF_FILE', 'LOG_CUR', 'OUTPUTDIR',
+        'SM_BCP_FILE', 'ACC_BCP_FILE', 'ACC_REF_BCP_FILE',
+        'GM_MGP_INPUT_FILE', 'GM_MGP_BIOTYPE_FILE', 'GM_B6_INPUT_FILE', 'GM_B6_BIOTYPE_FILE',
+        'PG_DBUTILS', 'MGD_DBSERVER', 'MGD_DBNAME']
+
+    # None: derived from other settings by configure()
+    DEFAULTS = {
+        'MIN_RECORDS': '0',
+        'MEMORY_BUDGET': '0',
+        'SQL_TRACE_FILE': None,
+        'SQL_SLOW_SECONDS': '5',
+        'STRAIN_FILTER': '',
+        'CHR_FILTER': '',
+        'SAMPLE_FRACTION': '1',
+        'GFF3_WORKERS': '1',
+        'GFF3_CACHE': 'false',
+        'QC_VECTORIZED': 'false',
+        'LOG_CUR_JSONL': None,
+        'QC_LOG_CAP': '0',
+        'GM_FORMAT': 'text',
+        'GM_MGP_HANDOFF_FILE': None,
+        'GM_B6_HANDOFF_FILE': None,
+        'ACC_SPLIT_VERIFY': 'false',
+        'BCP_FORMAT': 'text',
+        'STAGED_SWAP': 'false',
+        'KEY_RESERVATION': 'false',
+        'ACC_KEY_SEQUENCE': 'acc_accession_seq',
+        'RUN_MANIFEST': None,
+        'BCP_SORTED': 'false',
+        'BCP_SORT_MEMORY': str(256 * 1024 * 1024),
+        'DELETE_BATCH_SIZE': '0',
+        'DELETE_BATCH_PAUSE': '0',
+        'BULK_INDEXES': 'false',
+        'BULK_ACC_INDEXES': '',
+        'BULK_INDEX_WORKERS': '4',
+        'MGD_DBUSER': 'mgd_dbo',
+    }
+
+    def __init__ (self, **settings):
+        # Purpose: constructor
+        # Throws: KeyError if a required setting is missing,
+        #   TypeError for an unknown setting
+
+        missing = [k for k in self.REQUIRED if settings.get(k) is None]
+        if missing:
+            raise KeyError('missing settings: %s' % ', '.join(missing))
+        unknown = [k for k in settings if k not in self.REQUIRED and k not in self.DEFAULTS]
+        if unknown:
+            raise TypeError('unknown settings: %s' % ', '.join(unknown))
+        for k in self.DEFAULTS:
+            setattr(self, k, self.DEFAULTS[k])
+        for k in settings:
+            setattr(self, k, settings[k])
+
+    @classmethod
+    def fromEnvironment (cls, environ=None):
+        # Purpose: the configuration exported by strainmarkerload.config
+        # Returns: LoadConfig
+
+        if environ is None:
+            environ = os.environ
+        return cls(**{k: environ[k] for k in cls.REQUIRED + list(cls.DEFAULTS) if k in environ})
+
+# end class LoadConfig ----------------------------
+
+class Lookups:
+    # Is: the database lookups of a load
+    # Has: strainTranslation {badName: [_Strain_key, strain], ...},
+    #   marker {MGI ID: MarkerRow, ...}, ensembl {ENS ID: [MGI ID, ...], ...}
+    #   (compact, integer-coded lookuptables.MarkerTable and EnsemblTable),
+    #   chr {chromosome: _Chromosome_key, ...}, biotype {raw biotype: feature type, ...},
+    #   mcvTerm [feature type, ...]
+    # Does: loads them from the database, once; an instance passed to run()
+    #   is filled in by the first load and reused by later ones, and may be
+    #   shared with other loads
+    #
+    def __init__ (self):
+        # Purpose: constructor
+        self.strainTranslation = {}
+        self.marker = lookuptables.MarkerTable()
+        self.ensembl = lookuptables.EnsemblTable()
+        self.chr = {}
+        self.biotype = {}
+        self.mcvTerm = []
+        self.strainsLoaded = False
+        self.markersLoaded = False
+
+    def loadStrainTranslations (self):
+        # Purpose: loads the strain translations, unless already loaded
+        # Effects: queries the database
+
+        if self.strainsLoaded:
+            return
+        results = traceSql('lookup strain translations', '''
+            select t.badName, t._Object_key as strainKey, s.strain
+            from MGI_Translation t, PRB_Strain s
+            where t._TranslationType_key = 1021
+            and t._Object_key = s._Strain_key
+            order by s.strain
+            ''', 'auto')
+        for r in results:
+            self.strainTranslation[r['badName']] = [r['strainKey'], r['strain']]
+        self.strainsLoaded = True
+
+    def loadMarkers (self):
+        # Purpose: loads the marker, Ensembl, chromosome, biotype and feature
+        #   type lookups, unless already loaded
+        # Effects: queries the database
+
+        if self.markersLoaded:
+            return
+
+        # load lookup of all marker MGI IDs
+        # primary/preferred (preferred = 1)
+        # official (_Marker_Status_key = 1)
+        results = traceSql('lookup markers', '''
+            select m._Marker_key, m.symbol, a.accid as mgiID, a.preferred
+            from ACC_Accession a, MRK_Marker m
+            where a._MGIType_key = 2
+            and a._LogicalDB_key = 1
+            and a.prefixPart = 'MGI:'
+            and a.preferred = 1
+            and a._Object_key = m._Marker_key
+            and m._Organism_key = 1
+            and m._Marker_Status_key = 1
+            ''', 'auto')
+        for r in results:
+            self.marker.add(r['mgiID'], r['_Marker_key'], r['symbol'])
+        self.marker.freeze()
+
+        # load lookup of ensembl ID to marker relationships
+        results = traceSql('lookup ensembl markers', '''
+            select a1.accid as ensID, a2.accid as mgiID
+            from ACC_Accession a1, ACC_Accession a2
+            where a1._MGIType_key = 2
+            and a1._LogicalDB_key = 60
+            and a1._Object_key = a2._Object_key
+            and a2._MGIType_key = 2
+            and a2._LogicalDB_key = 1
+            and a2.preferred = 1
+            and a2.prefixPart = 'MGI:'
+            ''', 'auto')
+        for r in results:
+            self.ensembl.add(r['ensID'], r['mgiID'])
+        self.ensembl.freeze()
+
+        # load lookup of 'mouse, laboratory' chromosomes
+        results = traceSql('lookup chromosomes', '''
+            select chromosome, _Chromosome_key from MRK_Chromosome where _Organism_key = 1 ''', 'auto')
+        for r in results:
+            self.chr[r['chromosome']] = r['_Chromosome_key']
+
+        # load lookup of raw MGP biotype to feature type
+        results = traceSql('lookup biotypes', '''
+            select t1._vocab_key, t1.term as rawBiotype, t2.term as primaryMcvTerm
+            from VOC_Term t1, VOC_Term t2, MRK_BiotypeMapping m
+            where t1._Vocab_key = 136 --Biotype MGP
+            and t1._Term_key = m._BiotypeTerm_key
+            and m._PrimaryMCVTerm_key = t2._Term_key
+            ''', 'auto')
+        for r in results:
+            self.biotype[r['rawBiotype'].lower()] = r['primaryMcvTerm']
+
+        # load lookup of feature type vocabulary
+        results = traceSql('lookup feature types', '''select term from VOC_Term where _Vocab_key = 79''')
+        for r in results:
+            self.mcvTerm.append(r['term'].lower())
+
+        self.markersLoaded = True
+
+# end class Lookups ----------------------------
+
+def configure(config):
+    # Purpose: sets the load settings from a LoadConfig and resets the
+    #   state of any previous run in this process
+    # Returns: Nothing
+    # Assumes: Nothing
+    # Effects: sets global variables
+    # Throws: ValueError if a numeric setting is not a number
+
+    global releaseMGP, releaseB6, QC_ONLY, qcOnly, loadOnlyB6, minRecords
+    global strainFilter, chrFilter, sampleFraction, memoryBudget, sqlTraceFile, sqlSlowSeconds
+    global gff3Workers, gff3CacheEnabled, qcVectorized, gffcolumns
+    global infileDir, mgpInputFileString, b6InputFile, curLog, outputDir
+    global smBcpFile, strainMarkerFile, accBcpFile, accFile, accRefBcpFile, accRefFile
+    global gmMgpFile, biotypeMgpFile, gmB6File, biotypeB6File
+    global gmFormat, gmMgpHandoffFile, gmB6HandoffFile, qcJsonFile, qcLogCap
+    global accSplitter, bcpin, server, database, bcpFormat, stagedSwap
+    global keyReservation, accKeySequence, manifestFile
+    global bcpSorted, bcpSortMemory, deleteBatchSize, deleteBatchPause
+    global bulkIndexes, bulkAccIndexes, bulkIndexWorkers, bulkIndexFile, mgdUser
+
+    releaseMGP = config.RELEASE_MGP
+    releaseB6 = config.RELEASE_B6
+    QC_ONLY = config.QC_ONLY
+    qcOnly = QC_ONLY == 'true'
+    loadOnlyB6 = config.B6_ONLY
+    minRecords = int(config.MIN_RECORDS)
+    strainFilter = [x.strip() for x in config.STRAIN_FILTER.split(',') if x.strip()]
+    chrFilter = set(config.CHR_FILTER.replace(',', ' ').split())
+    sampleFraction = float(config.SAMPLE_FRACTION)
+    memoryBudget = int(config.MEMORY_BUDGET)
+    gff3Workers = int(config.GFF3_WORKERS)
+    gff3CacheEnabled = config.GFF3_CACHE == 'true'
+
+    qcVectorized = config.QC_VECTORIZED == 'true'
+    if qcVectorized:
+        try:
+            import gffcolumns
+        except ImportError:
+            print('QC_VECTORIZED: numpy not available, running QC per record')
+            qcVectorized = False
+
+    infileDir = config.INPUTDIR
+    mgpInputFileString = config.INPUT_MGP_DIR_LIST
+    b6InputFile = config.INPUT_MGI_GFF_FILE
+
+    curLog = config.LOG_CUR
+    qcJsonFile = config.LOG_CUR_JSONL or '%s.jsonl' % curLog
+    qcLogCap = int(config.QC_LOG_CAP)
+    sqlTraceFile = config.SQL_TRACE_FILE or '%s.sql.jsonl' % curLog
+    sqlSlowSeconds = float(config.SQL_SLOW_SECONDS)
+
+    outputDir = config.OUTPUTDIR
+    smBcpFile = config.SM_BCP_FILE
+    strainMarkerFile = '%s/%s' % (outputDir, smBcpFile)
+    accBcpFile = config.ACC_BCP_FILE
+    accFile = '%s/%s' % (outputDir, accBcpFile)
+    accRefBcpFile = config.ACC_REF_BCP_FILE
+    accRefFile = '%s/%s' % (outputDir, accRefBcpFile)
+
+    gmMgpFile = config.GM_MGP_INPUT_FILE
+    biotypeMgpFile = config.GM_MGP_BIOTYPE_FILE
+    gmB6File = config.GM_B6_INPUT_FILE
+    biotypeB6File = config.GM_B6_BIOTYPE_FILE
+    gmFormat = config.GM_FORMAT
+    gmMgpHandoffFile = config.GM_MGP_HANDOFF_FILE or '%s/gm_mgp.gmb' % outputDir
+    gmB6HandoffFile = config.GM_B6_HANDOFF_FILE or '%s/gm_b6.gmb' % outputDir
+
+    accSplitter = accsplit.AccSplitter(verify=config.ACC_SPLIT_VERIFY == 'true')
+
+    bcpin = '%s/bin/bcpin.csh' % config.PG_DBUTILS
+    server = config.MGD_DBSERVER
+    database = config.MGD_DBNAME
+    mgdUser = config.MGD_DBUSER
+    bcpFormat = config.BCP_FORMAT
+    stagedSwap = config.STAGED_SWAP == 'true'
+    keyReservation = config.KEY_RESERVATION == 'true'
+    accKeySequence = config.ACC_KEY_SEQUENCE
+    manifestFile = config.RUN_MANIFEST or '%s/strainmarkerload.manifest.json' % outputDir
+    bcpSorted = config.BCP_SORTED == 'true'
+    bcpSortMemory = int(config.BCP_SORT_MEMORY)
+    deleteBatchSize = int(config.DELETE_BATCH_SIZE)
+    deleteBatchPause = float(config.DELETE_BATCH_PAUSE)
+    bulkIndexes = config.BULK_INDEXES == 'true'
+    bulkAccIndexes = config.BULK_ACC_INDEXES.split()
+    bulkIndexWorkers = int(config.BULK_INDEX_WORKERS)
+    bulkIndexFile = '%s/dropped_indexes.sql' % outputDir
+
+    resetRun()
+
+# end configure() -------------------------------
+
+def resetRun():
+    # Purpose: clears the QC findings, registries, parsed data and counts
+    #   of a previous run
+    # Returns: Nothing
     # Assumes: Nothing
-    # Effects: exits if unexpected args found on the command line
+    # Effects: sets global variables
     # Throws: Nothing
 
-    if len(sys.argv) != 0:
-        print(USAGE)
-        return 1
+    global qcDict, qcCounts, messageMap, qcInputs, qcLineOffsets, qcMaps
+    global accRegistry, accCollisions, b6ToLoadDict, nextSMKey, nextAccKey
+    global firstSMKey, firstAccKey, keyRanges
+    global totalLoadedCt, b6LoadedCt, mgpFileCt, mgpLoadCt, mgpSkipCt, mgpNoMarkerCt, ctByStrain
+    global gmMgpHandoff, gmB6Handoff, markerGroups, spillCt
+    global smBcpWriter, accBcpWriter, accRefBcpWriter, fpLogCur, fpQcJsonFile
+    global gmMgpWriter, biotypeMgpWriter, fpB6InputFile, gmB6Writer, biotypeB6Writer
+    global mgpFileQcRules, mgpQcRules, b6QcRules, b6QcRulesByKind
+
+    qcDict = {}
+    qcCounts = {}
+    messageMap = {}
+    qcInputs = []
+    qcLineOffsets = {}
+    qcMaps = {}
+    accRegistry = {}
+    accCollisions = {}
+    b6ToLoadDict = {}
+    nextSMKey = None
+    nextAccKey = None
+    firstSMKey = None
+    firstAccKey = None
+    keyRanges = {}
+    totalLoadedCt = 0
+    b6LoadedCt = 0
+    mgpFileCt = 0
+    mgpLoadCt = 0
+    mgpSkipCt = 0
+    mgpNoMarkerCt = 0
+    ctByStrain = {}
+    gmMgpHandoff = None
+    gmB6Handoff = None
+    markerGroups = []
+    spillCt = 0
+    smBcpWriter = accBcpWriter = accRefBcpWriter = ''
+    gmMgpWriter = biotypeMgpWriter = gmB6Writer = biotypeB6Writer = ''
+    fpLogCur = fpQcJsonFile = fpB6InputFile = ''
+    mgpFileQcRules = mgpQcRules = b6QcRules = None
+    b6QcRulesByKind = {}
+
+# end resetRun() -------------------------------
+
+def traceSql(label, cmd, mode='auto', rows=None):
+    # Purpose: runs a statement through the SQL tracer of the run (db.sql
+    #   if there is none), under label
+    #   rows, if given, returns the rows affected from the results
+    # Returns: the results of db.sql
+    # Assumes: database connection exists
+    # Effects: queries the database, writes the statement, its time and
+    #   row count (and plan, if slow) to sqlTraceFile
+    # Throws: the exceptions of db.sql
+
+    if sqlTracer is None:
+        return db.sql(cmd, mode)
+    return sqlTracer.sql(label, cmd, mode, rows)
+
+# end traceSql() -------------------------------
+
+def traceCommand(label, cmd):
+    # Purpose: runs a shell command (a bcp) and logs its time to the
+    #   SQL trace under label
+    # Returns: the return code of the command
+    # Assumes: Nothing
+    # Effects: runs cmd, writes to sqlTraceFile
+    # Throws: Nothing
 
-    return 0
+    start = time.time()
+    rc = os.system(cmd)
+    if sqlTracer is not None:
+        sqlTracer.record(label, time.time() - start, statement=cmd)
+    return rc
+
+# end traceCommand() -------------------------------
+
+def deletedCount(results):
+    # Purpose: the row count of a "returning ... select count(*) as deletedCt"
+    #   delete, for traceSql()
+    # Returns: int
 
-# end checkArgs() -------------------------------
+    return results[0]['deletedCt']
 
-def init():
-    # Purpose: check args, create lookups, open files, create db connection, 
-    #   gets max keys from the db
+# end deletedCount() -------------------------------
+
+def init(lookups):
+    # Purpose: create lookups (unless already loaded into lookups), open
+    #   files, create db connection, gets max keys from the db
+    #   the command line is not read here, see main()
     # Returns: 1 if error, else 0
     # Assumes: Nothing
     # Effects: Sets global variables, exits if a file can't be opened,
     #  creates files in the file system, creates connection to a database
 
-    global nextSMKey, nextAccKey, strainTranslationLookup, markerLookup
-    global ensemblLookup, chrLookup
+    global nextSMKey, nextAccKey, firstSMKey, firstAccKey
+    global strainTranslationLookup, markerLookup, ensemblLookup, chrLookup
     global biotypeLookup, mcvTermLookup, messageMap
-   
-    checkArgs()
 
-    #
-    # Open input and output files
-    #
-    openFiles()
+    # load lookup of strain translations
+    # loaded first, the pre-flight checks need it
+    lookups.loadStrainTranslations()
+    strainTranslationLookup = lookups.strainTranslation
 
     #
-    # get next MRK_StrainMarker key
+    # fail fast on truncated or unexpected strain files, before the
+    # remaining lookups are loaded and before anything is deleted
     #
-    results = db.sql(''' select nextval('mrk_strainmarker_seq') as nextSMKey ''', 'auto')
-    nextSMKey = results[0]['nextSMKey']
+    if loadOnlyB6 == 'false' and preflight() != 0:
+        return 1
 
     #
-    # get next ACC_Accession key
+    # Open input and output files
     #
-    results = db.sql('''select max(_Accession_key) + 1 as nextAccKey from ACC_Accession''', 'auto')
-    nextAccKey = results[0]['nextAccKey']
-
-    # load qcDict with keys; one for each reporting bucket that will be written to the curation log
-    qcDict['chr_m'] = []     # chr is missing, report/skip 
-    qcDict['chr_u'] = []     # chromosome unresolved, report/skip
-    qcDict['start'] = []     # startCoordinate is missing, report/skip
-    qcDict['end'] = []       # endCoordinate is missing, report/skip
-    qcDict['start/end'] = [] # start > end, report/skip
-    qcDict['strand'] = []    # strand is missing, report/skip
+    if openFiles() != 0:
+        return 1
+
+    # a QC only run writes no bcp files and needs no keys
+    # with key reservation the keys are numbered from 1 until reserveKeys()
+    if not qcOnly and keyReservation:
+        nextSMKey = 1
+        nextAccKey = 1
+    elif not qcOnly:
+        #
+        # get next MRK_StrainMarker key
+        #
+        results = traceSql('next strain marker key', ''' select nextval('%s') as nextSMKey ''' % smKeySequence, 'auto')
+        nextSMKey = results[0]['nextSMKey']
+
+        #
+        # get next ACC_Accession key
+        #
+        results = traceSql('next accession key', '''select max(_Accession_key) + 1 as nextAccKey from ACC_Accession''', 'auto')
+        nextAccKey = results[0]['nextAccKey']
+
+    firstSMKey = nextSMKey
+    firstAccKey = nextAccKey
+
+    # load qcCounts with keys; one for each reporting bucket that will be written to the curation log
+    # the findings themselves are streamed to the QC sidecar, see qcReport()
+    qcCounts['chr_m'] = 0     # chr is missing, report/skip 
+    qcCounts['chr_u'] = 0     # chromosome unresolved, report/skip
+    qcCounts['start'] = 0     # startCoordinate is missing, report/skip
+    qcCounts['end'] = 0       # endCoordinate is missing, report/skip
+    qcCounts['start/end'] = 0 # start > end, report/skip
+    qcCounts['strand'] = 0    # strand is missing, report/skip
+    qcCounts['strain_u'] = 0  # strain unresolved, fatal
+    qcCounts['mgpens'] = 0    # Strain (non-B6) Ensembl ID missing from input, record(s) skipped
+    qcCounts['mgi_u'] = 0     # Ensembl ID unresolved, report create strain marker with null marker
+    qcCounts['ens_no'] = 0    # projection_parent_gene does not contain ENS ID, report, create strain marker with null marker
+    qcCounts['ens_multi'] = 0 # ensembl ID assoc > 1 marker, report, create strain marker with null marker
+    # the B6 checks only report, see parseB6Feature() and writeB6CuratorLog()
+    for key in b6QcBuckets:
+        qcCounts[key] = 0
+
     qcDict['biotype_u'] = {} # biotype missing from MGI, report/skip
-    qcDict['strain_u'] = []  # strain unresolved, fatal
-    qcDict['mgpens'] = []    # Strain (non-B6) Ensembl ID missing from input, record(s) skipped
-    qcDict['mgi_u'] = []     # Ensembl ID unresolved, report create strain marker with null marker
-    qcDict['ens_no'] = []    # projection_parent_gene does not contain ENS ID, report, create strain marker with null marker
-    qcDict['ens_multi'] = [] # ensembl ID assoc > 1 marker, report, create strain marker with null marker
     qcDict['mgi_mgp'] = []   # list of {mgiID: ([set of mpIDs]), ...}, one for each strain file used to 
                              # a) determine multiple MGP IDs (within a given strain) per marker, report and create strain gene
                              # b) write out to bcp files
@@ -332,154 +931,320 @@ def init():
     messageMap['ens_multi'] = 'Ensembl ID associated with > 1 marker, strain marker created with null marker'
     messageMap['mgi_mgp'] = 'Markers from input with > 1 Strain specific MGP ID, report and load strain marker and MGI marker association'
 
+    messageMap['b6_chr_m'] = 'B6: Chromosome missing from MGI GFF file, reported only'
+    messageMap['b6_chr_u'] = 'B6: Chromosome from MGI GFF file unresolved, reported only'
+    messageMap['b6_start'] = 'B6: Start Coordinate missing from MGI GFF file, reported only'
+    messageMap['b6_end'] = 'B6: End Coordinate missing from MGI GFF file, reported only'
+    messageMap['b6_start/end'] = 'B6: Start Coordinate > End Coordinate, reported only'
+    messageMap['b6_strand'] = 'B6: Strand missing from MGI GFF file, reported only'
+    messageMap['b6_biotype_m'] = 'B6: Biotype missing from MGI GFF file, reported only'
+    messageMap['b6_smid'] = 'B6: Strain/Marker ID missing from MGI GFF file, reported only'
+    messageMap['b6_mgi_m'] = 'B6: MGI ID missing from MGI GFF file, reported only'
+    messageMap['b6_qname'] = 'B6: qName missing from BlatAlignment, reported only'
+    messageMap['b6_biotype_u'] = 'B6: Biotype from MGI GFF file not in MGI, reported only'
+
     #
     # create lookups
     #
+    lookups.loadMarkers()
+    markerLookup = lookups.marker
+    ensemblLookup = lookups.ensembl
+    chrLookup = lookups.chr
+    biotypeLookup = lookups.biotype
+    mcvTermLookup = lookups.mcvTerm
 
-    # load lookup of strain translations
-    results = db.sql('''
-        select t.badName, t._Object_key as strainKey, s.strain
-        from MGI_Translation t, PRB_Strain s
-        where t._TranslationType_key = 1021
-        and t._Object_key = s._Strain_key
-	order by s.strain
-        ''', 'auto')
-    for r in results:
-        strainTranslationLookup[r['badName']] = [r['strainKey'], r['strain']]
-    #print(strainTranslationLookup)
-
-    # load lookup of all marker MGI IDs
-    # primary/preferred (preferred = 1)
-    # official (_Marker_Status_key = 1)
-    results = db.sql('''
-        select m._Marker_key, m.symbol, a.accid as mgiID, a.preferred
-        from ACC_Accession a, MRK_Marker m
-        where a._MGIType_key = 2
-        and a._LogicalDB_key = 1
-        and a.prefixPart = 'MGI:'
-	and a.preferred = 1
-        and a._Object_key = m._Marker_key
-        and m._Organism_key = 1
-        and m._Marker_Status_key = 1
-        ''', 'auto')
-    for r in results:
-        m = Marker()
-        m.markerKey = r['_Marker_key']
-        m.markerID = r['mgiID']
-        m.symbol = r['symbol']
-        markerLookup[m.markerID] = m
-   
-    # load lookup of ensembl ID to marker relationships
-    results = db.sql('''
-        select a1.accid as ensID, a2.accid as mgiID
-        from ACC_Accession a1, ACC_Accession a2
-        where a1._MGIType_key = 2
-        and a1._LogicalDB_key = 60
-        and a1._Object_key = a2._Object_key
-        and a2._MGIType_key = 2
-        and a2._LogicalDB_key = 1
-        and a2.preferred = 1
-        and a2.prefixPart = 'MGI:' 
-        ''', 'auto') 
-    for r in results:
-        ensID = r['ensID']
-        mgiID = r['mgiID']
-        if ensID not in ensemblLookup:
-            ensemblLookup[ensID] = []
-        ensemblLookup[ensID].append(mgiID)
-    #print(ensemblLookup['ENSMUSG00000022561'])
-
-    # load lookup of 'mouse, laboratory' chromosomes
-    results = db.sql('''
-        select chromosome, _Chromosome_key from MRK_Chromosome where _Organism_key = 1 ''', 'auto')
-    for r in results:
-        chrLookup[r['chromosome']] = r['_Chromosome_key']
-
-    # load lookup of raw MGP biotype to feature type
-    results = db.sql('''
-        select t1._vocab_key, t1.term as rawBiotype, t2.term as primaryMcvTerm
-        from VOC_Term t1, VOC_Term t2, MRK_BiotypeMapping m
-        where t1._Vocab_key = 136 --Biotype MGP
-        and t1._Term_key = m._BiotypeTerm_key
-        and m._PrimaryMCVTerm_key = t2._Term_key
-        ''', 'auto')
-    for r in results:
-        biotypeLookup[r['rawBiotype'].lower()] = r['primaryMcvTerm']
-    #print(biotypeLookup)
-
-    # load lookup of feature type vocabulary
-    results = db.sql('''select term from VOC_Term where _Vocab_key = 79''')
-    for r in results:
-        mcvTermLookup.append(r['term'].lower())
+    buildQcRules()
 
     return 0
 
 # end init() -------------------------------
 
+def buildQcRules():
+    # Purpose: declares the QC rules of the MGP and B6 pipelines, each once,
+    #   with its bucket, predicate, severity and message (see qcrules.py)
+    #   MGP record rules take a tokenizeMGPLine() tuple plus the MGI IDs of
+    #   its Ensembl ID (None if it is not an Ensembl ID or not in MGI);
+    #   B6 rules take (chr, start, end, strand, smID, mgiID, biotype,
+    #   gmIdString, qName) and apply to the line types in kinds
+    # Returns: Nothing
+    # Assumes: messageMap and the lookups have been loaded
+    # Effects: sets global variables
+    # Throws: Nothing
+
+    global mgpFileQcRules, mgpQcRules, b6QcRules, b6QcRulesByKind
+
+    def rule(name, predicate, severity, bucket=None, kinds=None):
+        return qcrules.Rule(name, predicate, severity, messageMap[bucket or name], bucket, kinds)
+
+    REPORT, SKIP, FATAL = qcrules.REPORT, qcrules.SKIP, qcrules.FATAL
+
+    mgpFileQcRules = qcrules.RuleSet([
+        rule('strain_u', lambda strain: strain not in strainTranslationLookup, FATAL),
+    ])
+
+    # in the order the findings were reported before the rules were declarative
+    mgpQcRules = qcrules.RuleSet([
+        # unresolved Ensembl IDs load a markerless strain gene
+        rule('ens_no', lambda r: r[5] is not None and not r[5].startswith('ENSMUS') and {'ensemblID': r[5]}, REPORT),
+        rule('ens_u', lambda r: r[5] is not None and r[8] is None and r[5].startswith('ENSMUS') and {'ensemblID': r[5]},
+            REPORT, bucket='mgi_u'),
+        rule('ens_multi', lambda r: r[8] is not None and len(r[8]) > 1 and {'ensemblID': r[5], 'mgiIDs': r[8]}, REPORT),
+        rule('chr_m', lambda r: r[0] == '', REPORT),
+        rule('chr_u', lambda r: r[0] != '' and r[0] not in chrLookup, SKIP),
+        rule('start', lambda r: r[1] == '', SKIP),
+        rule('end', lambda r: r[2] == '', SKIP),
+        rule('start/end', lambda r: r[1] != '' and r[2] != '' and int(r[1]) > int(r[2]), SKIP),
+        rule('strand', lambda r: r[3] == '', SKIP),
+        rule('mgpens', lambda r: r[4] == '', SKIP),
+        # counted by biotype in qcDict, see parseMGPFile()
+        rule('biotype_u', lambda r: r[7].lower().strip() not in biotypeLookup, SKIP),
+        rule('mgi_u', lambda r: r[8] is not None and len(r[8]) == 1 and r[8][0] not in markerLookup and {'mgiID': r[8][0]},
+            REPORT),
+    ])
+
+    f, bf, b = ('f',), ('f', 'bf'), ('b',)
+    b6QcRules = qcrules.RuleSet([
+        rule('b6_chr_m', lambda r: r[0] == '', REPORT, kinds=f),
+        rule('b6_chr_u', lambda r: r[0] not in chrLookup, REPORT, kinds=f),
+        rule('b6_start', lambda r: r[1] == '', REPORT, kinds=f),
+        rule('b6_end', lambda r: r[2] == '', REPORT, kinds=f),
+        rule('b6_start/end', lambda r: r[1] != '' and r[2] != '' and int(r[1]) > int(r[2]), REPORT, kinds=f),
+        rule('b6_strand', lambda r: r[3] == '', REPORT, kinds=f),
+        rule('b6_biotype_m', lambda r: r[6] == '', REPORT, kinds=f),
+        rule('b6_smid', lambda r: r[4] == '', REPORT, kinds=f),
+        rule('b6_mgi_m', lambda r: r[5] == '', REPORT, kinds=bf),
+        rule('b6_qname', lambda r: r[8] == '', REPORT, kinds=b),
+        rule('b6_biotype_u', lambda r: r[6].lower().strip() not in mcvTermLookup, REPORT, kinds=f),
+    ])
+    b6QcRulesByKind = dict([(kind, b6QcRules.select(kind)) for kind in ('f', 'bf', 'b')])
+
+# end buildQcRules() -------------------------------
+
+def genomeVersionStrain(line):
+    # Purpose: extracts the strain name from a genome-version pragma
+    #   e.g. "#!genome-version 129S1_SvImJ_v3" -> "129S1_SvImJ"
+    # Returns: strain name
+    # Assumes: line contains '#!genome-version'
+    # Effects: Nothing
+    # Throws: Nothing
+
+    tokens = line.split(' ')
+    inputStrain = tokens[1].replace('_v3', '')
+    inputStrain = inputStrain.replace('_v1.1', '')
+    inputStrain = inputStrain.replace('\n', '')
+    return inputStrain
+
+# end genomeVersionStrain() -------------------------------
+
+def headerStrain(inputFile):
+    # Purpose: reads the genome-version strain of a strain file from its header
+    # Returns: strain name, or None
+    # Assumes: the genome-version pragma is in the header ("#" lines at the top)
+    # Effects: reads the file system
+    # Throws: Nothing
+
+    with open(inputFile, 'r') as fp:
+        for line in fp:
+            if line[0] != '#':
+                break
+            if line.find('#!genome-version') != -1:
+                return genomeVersionStrain(line)
+    return None
+
+# end headerStrain() -------------------------------
+
+def mgpInputFiles():
+    # Purpose: the strain files of the load, restricted to strainFilter
+    #   a file is selected if its MGI strain, its genome-version strain or
+    #   its file name is in strainFilter
+    # Returns: [inputFile, ...]
+    # Assumes: strainTranslationLookup has been loaded
+    # Effects: reads the headers of the strain files if strainFilter is set
+    # Throws: Nothing
+
+    inputFiles = []
+    for file in mgpInputFileString.split():
+        inputFile = '%s/%s' % (infileDir, file.strip())
+        if strainFilter:
+            inputStrain = headerStrain(inputFile) if os.path.isfile(inputFile) else None
+            names = [file.strip(), inputStrain]
+            if inputStrain in strainTranslationLookup:
+                names.append(strainTranslationLookup[inputStrain][1])
+            if not set(names) & set(strainFilter):
+                continue
+        inputFiles.append(inputFile)
+    return inputFiles
+
+# end mgpInputFiles() -------------------------------
+
+def loadB6():
+    # Purpose: whether B6 (MGI.gff3) is in strainFilter
+    # Returns: True if there is no strain filter or it names C57BL/6J
+    # Assumes: Nothing
+    # Effects: Nothing
+    # Throws: Nothing
+
+    return not strainFilter or b6Strain in strainFilter
+
+# end loadB6() -------------------------------
+
+def preflightScan(inputFile):
+    # Purpose: multiprocessing worker for preflight(); scans one strain file
+    #   without parsing it
+    # Returns: (inputFile, inputStrain or None, number of gene records)
+    #   a gene record is a line with an ID=gene: attribute, whatever its
+    #   type (gene, ncRNA_gene, pseudogene, ...), as tokenizeMGPAttributes()
+    #   takes its mgpensID from it
+    # Assumes: the genome-version pragma is in the header ("#" lines at the top)
+    # Effects: memory-maps the file
+    # Throws: Nothing
+
+    return (inputFile, headerStrain(inputFile), gff3lite.countLines(inputFile, 'ID=gene:'))
+
+# end preflightScan() -------------------------------
+
+def preflight():
+    # Purpose: pre-flight checks of the MGP strain files, run before
+    #   the load commits to anything:
+    #   a) every file has at least minRecords gene records
+    #   b) the genome-version strain of every file is in strainTranslationLookup
+    # Returns: 1 if any check fails, else 0
+    # Assumes: strainTranslationLookup has been loaded
+    # Effects: scans the strain files in parallel
+    # Throws: Nothing
+
+    inputFiles = mgpInputFiles()
+    if len(inputFiles) == 0:
+        if loadB6():
+            return 0
+        print('preflight: nothing selected by STRAIN_FILTER: %s' % ', '.join(strainFilter))
+        return 1
+
+    for inputFile in inputFiles:
+        if not os.path.isfile(inputFile):
+            print('preflight: missing strain file: %s' % inputFile)
+            return 1
+
+    nWorkers = max(1, min(len(inputFiles), os.cpu_count() or 1))
+    if nWorkers > 1:
+        with poolContext.Pool(nWorkers) as pool:
+            results = pool.map(preflightScan, inputFiles)
+    else:
+        results = list(map(preflightScan, inputFiles))
+
+    rc = 0
+    for inputFile, inputStrain, geneCt in results:
+        print('preflight: %s strain: %s gene records: %s' % (inputFile, inputStrain, geneCt))
+        if geneCt < minRecords:
+            print('preflight: %s has %s gene records (ID=gene:), MIN_RECORDS is %s' % (inputFile, geneCt, minRecords))
+            rc = 1
+        if inputStrain is None:
+            print('preflight: %s has no #!genome-version' % inputFile)
+            rc = 1
+        elif inputStrain not in strainTranslationLookup:
+            print('preflight: %s strain not in strainTranslationLookup: %s' % (inputFile, inputStrain))
+            rc = 1
+
+    return rc
+
+# end preflight() -------------------------------
+
 def openFiles ():
     # Purpose: Open input/output files.
     # Returns: 1 if error, else 0
     # Assumes: Nothing
-    # Effects: Sets global variables, exits if a file can't be opened, 
-    #  creates files in the file system
+    # Effects: Sets global variables, creates files in the file system
 
-    global fpStrainMarkerFile, fpAccFile, fpAccRefFile, fpLogCur
-    global fpGmMgpFile, fpBiotypeMgpFile
-    global fpB6InputFile, fpGmB6File, fpBiotypeB6File
+    global smBcpWriter, accBcpWriter, accRefBcpWriter, fpLogCur, fpQcJsonFile
+    global gmMgpWriter, biotypeMgpWriter
+    global fpB6InputFile, gmB6Writer, biotypeB6Writer
+    global gmMgpHandoff, gmB6Handoff
 
     try:
-        fpStrainMarkerFile = open(strainMarkerFile, 'w')
+        fpLogCur = open(curLog, 'a')
     except:
-        print('ERROR: Cannot open Strain Marker BCP file: %s' % strainMarkerFile)
-        sys.exit(1)
+        print('ERROR: Cannot open Curator Log file: %s' % curLog)
+        return 1
 
     try:
-        fpAccFile = open(accFile, 'w')
+        fpQcJsonFile = open(qcJsonFile, 'w')
     except:
-        print('ERROR: Cannot open ACC_Accession bcp  file: %s' % accFile)
-        sys.exit(1)
+        print('ERROR: Cannot open QC sidecar file: %s' % qcJsonFile)
+        return 1
 
     try:
-        fpAccRefFile = open(accRefFile, 'w')
+        fpB6InputFile = open(b6InputFile, 'r', newline='\n') # as parseMGPFile() opens its input
     except:
-        print('ERROR: Cannot open ACC_AccessionReference bcp file: %s' % accRefFile)
-        sys.exit(1)
+        print('ERROR: Cannot open MGI.gff3 B6 file: %s' % b6InputFile)
+        return 1
+
+    # a QC only run writes only the curator log and the QC sidecar
+    if qcOnly:
+        return 0
 
     try:
-        fpLogCur = open(curLog, 'a')
+        smBcpWriter = bcpwriter.openWriter(strainMarkerFile, strainmarker_table, bcpFormat, auditColumns)
     except:
-        print('ERROR: Cannot open Curator Log file: %s' % curLog)
-        sys.exit(1)
+        print('ERROR: Cannot open Strain Marker BCP file: %s' % strainMarkerFile)
+        return 1
 
     try:
-        fpGmMgpFile = open(gmMgpFile, 'w')
+        accBcpWriter = bcpwriter.openWriter(accFile, acc_table, bcpFormat, auditColumns)
     except:
-        print('ERROR: Cannot open MGP Gene Model file: %s' % gmMgpFile)
-        sys.exit(1)
+        print('ERROR: Cannot open ACC_Accession bcp  file: %s' % accFile)
+        return 1
 
     try:
-        fpBiotypeMgpFile = open(biotypeMgpFile, 'w')
+        accRefBcpWriter = bcpwriter.openWriter(accRefFile, accref_table, bcpFormat, auditColumns)
     except:
-        print('ERROR: Cannot open MGP Gene Model Biotype file: %s' % biotypeMgpFile)
-        sys.exit(1)
+        print('ERROR: Cannot open ACC_AccessionReference bcp file: %s' % accRefFile)
+        return 1
 
     try:
-        fpB6InputFile = open(b6InputFile, 'r')
+        if gmFormat == 'memory':
+            gmMgpWriter = bcpwriter.ListWriter()
+        elif gmFormat == 'text':
+            gmMgpWriter = bcpwriter.TextWriter(gmMgpFile)
+        else:
+            gmMgpHandoff = gmhandoff.HandoffWriter(gmMgpHandoffFile)
+            gmMgpWriter = gmMgpHandoff.gmWriter
     except:
-        print('ERROR: Cannot open MGI.gff3 B6 file: %s' % b6InputFile)
-        sys.exit(1)
+        print('ERROR: Cannot open MGP Gene Model file: %s' % gmMgpFile)
+        return 1
 
     try:
-        fpGmB6File = open(gmB6File, 'w')
+        if gmFormat == 'memory':
+            biotypeMgpWriter = bcpwriter.ListWriter()
+        elif gmFormat == 'text':
+            biotypeMgpWriter = bcpwriter.TextWriter(biotypeMgpFile)
+        else:
+            biotypeMgpWriter = gmMgpHandoff.biotypeWriter
+    except:
+        print('ERROR: Cannot open MGP Gene Model Biotype file: %s' % biotypeMgpFile)
+        return 1
+
+    try:
+        if gmFormat == 'memory':
+            gmB6Writer = bcpwriter.ListWriter()
+        elif gmFormat == 'text':
+            gmB6Writer = bcpwriter.TextWriter(gmB6File)
+        else:
+            gmB6Handoff = gmhandoff.HandoffWriter(gmB6HandoffFile)
+            gmB6Writer = gmB6Handoff.gmWriter
     except:
         print('ERROR: Cannot open MGI B6 Gene Model file: %s' % gmB6File)
-        sys.exit(1)
+        return 1
 
     try:
-        fpBiotypeB6File = open(biotypeB6File, 'w')
+        if gmFormat == 'memory':
+            biotypeB6Writer = bcpwriter.ListWriter()
+        elif gmFormat == 'text':
+            biotypeB6Writer = bcpwriter.TextWriter(biotypeB6File)
+        else:
+            biotypeB6Writer = gmB6Handoff.biotypeWriter
     except:
         print('ERROR: Cannot open MGI B6 Gene Model Biotype file: %s' % biotypeB6File)
-        sys.exit(1)
+        return 1
 
     return 0
 
@@ -493,14 +1258,21 @@ def closeFiles ():
     # Throws: Nothing
    
     try:
-        fpStrainMarkerFile.close()
-        fpAccFile.close()
-        fpAccRefFile.close()
-        fpGmMgpFile.close()
-        fpBiotypeMgpFile.close()
-        fpB6InputFile.close()
-        fpGmB6File.close()
-        fpBiotypeB6File.close()
+        # a QC only run opens no bcp or gene model writers
+        for fp in [smBcpWriter, accBcpWriter, accRefBcpWriter, gmMgpWriter, biotypeMgpWriter,
+                   fpB6InputFile, gmB6Writer, biotypeB6Writer, fpQcJsonFile]:
+            if fp:
+                fp.close()
+        for groups in markerGroups:
+            groups.close()
+        for handoff, gmFile, biotypeFile in [(gmMgpHandoff, gmMgpFile, biotypeMgpFile), (gmB6Handoff, gmB6File, biotypeB6File)]:
+            if handoff is None:
+                continue
+            handoff.close()
+            if gmFormat == 'both':
+                reader = gmhandoff.HandoffReader(handoff.path)
+                reader.export(gmFile, biotypeFile)
+                reader.close()
     except:
         return 1
 
@@ -508,370 +1280,897 @@ def closeFiles ():
 
 # end closeFiles() -------------------------------
 
-def parseMGPFiles( ): 
-    # Purpose: parses input files looping, opening and closing
-    # Returns: 1 if error, else 0
-    # Assumes: output file descriptors have been initialized
-    # Effects: sets global variables, writes to the file system
+def currentRSS():
+    # Purpose: the resident set size of this process
+    # Returns: bytes; the peak RSS where /proc is not available
+    # Assumes: Nothing
+    # Effects: Nothing
     # Throws: Nothing
-   
-    global qcDict, mgpFileCt, mgpLoadCt, mgpSkipCt, ctByStrain, mgpNoMarkerCt
 
-    inputFileList = str.split(mgpInputFileString, ' ')
+    try:
+        with open('/proc/self/statm', 'r') as fp:
+            return int(fp.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return peakRSS()
 
-    # iterate through all the strain-specific MGP files 
-    for file in inputFileList:
+# end currentRSS() -------------------------------------
 
-        recordCt = 0  # current number of records in this file
-        file = file.strip() # in case extra spaces btwn filenames in config
-        inputFile = '%s/%s' % (infileDir, file)
-        print('inputFile: %s' % inputFile)
-        fpIn = open(inputFile, 'r')
-
-	#
-	# find genome-version and extract strain name
-	# #!genome-version 129S1_SvImJ_v3
-	#
-        for line in fpIn.readlines():
-           if line.find('#!genome-version') != -1:
-              tokens = line.split(' ')
-              inputStrain = tokens[1].replace('_v3', '')
-              inputStrain = inputStrain.replace('_v1.1', '')
-              inputStrain = inputStrain.replace('\n', '')
-              break
-	    
-        # resolve strain with translation lookup
-        if inputStrain not in strainTranslationLookup:
-            print('inputStrain not in strainTranslationLookup:', inputStrain, len(inputStrain))
-            qcDict['strain_u'].append(inputStrain)
-            fpIn.close()
-            continue 
-
-        # get the strain key
-        strainList= strainTranslationLookup[inputStrain] 
-        strainKey = strainList[0]
-        strain = strainList[1]
-        print('strain: %s strainKey: %s' % (strain, strainKey))
-        # build this as we parse each file - adding strainMarkerObject(s) i
-        # there can be > 1 strainMarker objects/gene with different MGP IDs and diff coords/strand/biotypes
-        strainMarkerDict = {}   # {mgiID:[strainMarkerObject, ... ], ...}
-
-        # after file parsed copy the strainMarkerObjects from strainMarkerDict to this mapping by strain
-        strainMarkerInput = {} 		# {strain: list of strainMarkerObjects, ...}
-        strainMarkerInput[strain] = []	# initialize 
-
-        # iterate thru lines in this strain file
-        fpIn.seek(0)
-        for line in fpIn.readlines():
+def peakRSS():
+    # Purpose: the peak resident set size of this process
+    # Returns: bytes
+    # Assumes: ru_maxrss is in kilobytes (Linux)
+    # Effects: Nothing
+    # Throws: Nothing
 
-            # skip "#, "[" rows
-            if line[0] == '#':
-               continue
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
 
-            if line[0] == '[':
-               continue
+# end peakRSS() -------------------------------------
 
-            recordCt +=1
-            mgpFileCt += 1
-            isSkip = 0  # if errors, set to true (1) to skip this record
-            
-            tokens = line.split('\t')
-            chr = tokens[0]
-            start = tokens[3]
-            end = tokens[4]
-            strand = tokens[6]
-
-            mgpensID = ''
-            ensemblID = ''
-            mgpIDs = []
-            mgiIDs = []
-            symbol = ''
-            markerKey = ''
-            biotype = ''
-            hasProjectionParent = 0
-
-            # split col9 by ";"
-	    # interested in: "ID=", "biotype=", "projection_parent_gene"
-            tokens2 = tokens[8].split(';')
-            for t in tokens2: # col9 tokens
-                #print(t)
-
-                # 'ID=gene:ENSMUSG00200002660'
-                if t.find('ID=gene:') != -1:
-                    mgpensID = t.split(':')[1]
-
-                # if projection_parent_gene not found, mgiID = '' and markerless strain gene will be loaded
-                elif t.find('projection_parent_gene=') != -1:
-                    hasProjectionParent = 1
-                    allEns = t.split('=')[1].split('.')[0]
-                    allEns = allEns.replace('\n', '').split(',')
-                    ensemblID = allEns[0]
-                    if ensemblID.find('ENSMUS')!= 0:
-                        # not an ensembl ID report/load markerless strain gene
-                        qcDict['ens_no'].append(line)
-                    elif ensemblID not in ensemblLookup:
-                        # ensembl id not in MGI or not assoc w/marker
-                        qcDict['mgi_u'].append('%s : %s' % (ensemblID, line))
-                    else:
-                        # get mgiID(s)
-                        mgiIDs = ensemblLookup[ensemblID]
-                        if len(mgiIDs) > 1:
-                            qcDict['ens_multi'].append('%s : %s : %s ' % (ensemblID, mgiIDs, line))
-                            mgiIDs = [] # reset to empty list to load a markerless strain gene
-
-                # if mgp=MGP_AJ_G0015774
-                # ignore MGP_CAROLIEiJ
-                elif t.find('mgp=') != -1 and t.find('mgp=MGP_CAROLIEiJ') != 0:
-                    mgp = t.split('=')[1]
-                    mgpIDs = mgp.replace('\n', '').split(',')
-
-                elif t.find('biotype=') != -1:
-                    biotype = t.split('=')[1]
-
-	    # else perform some sanity checks
-
-            if chr == '':
-                qcDict['chr_m'].append(line)
-
-            if chr != '' and chr not in chrLookup:
-                qcDict['chr_u'].append(line)
-                isSkip = 1
-
-            if start == '':
-                qcDict['start'].append(line)
-                isSkip = 1
-
-            if end == '':
-                qcDict['end'].append(line)
-                isSkip = 1
-
-            if start != '' and end != '' and (int(start) > int(end)):
-                qcDict['start/end'].append(line)
-                isSkip = 1
-
-            if strand == '':
-                qcDict['strand'].append(line)
-                isSkip = 1
-
-            if mgpensID == '':
-                qcDict['mgpens'].append(line)
-                isSkip = 1
-
-            # check that biotype is in the database
-            biotypeLower = biotype.lower().strip()
-            if biotypeLower not in biotypeLookup:
-                if biotype not in qcDict['biotype_u']:     
-                    qcDict['biotype_u'][biotype] = 1
-                else:
-                    qcDict['biotype_u'][biotype] += 1
-                isSkip = 1
-            else: # resolve the rawbiotype to feature type term
-                biotype = biotypeLookup[biotypeLower]
-
-            # resolve MGI ID(s)
-	    # unresolved MGI ID(s) will be reported, but not skipped
-            for mgiID in mgiIDs:
-                if mgiID not in markerLookup:
-                    qcDict['mgi_u'].append('%s : %s' % (mgiID, line))
-                else:
-                    marker = markerLookup[mgiID]
-                    markerKey = marker.markerKey 
-                    symbol = marker.symbol
-
-	    # if sanity checks fail, then continue to next fpIn()
-            if isSkip == 1:
-                mgpSkipCt += 1
-                continue
-            
-	    # else, continue with current fpIn() row
+def checkMemory():
+    # Purpose: spills every StrainMarkerGroups of the run to disk if the
+    #   resident set size is over memoryBudget
+    # Returns: Nothing
+    # Assumes: memoryBudget > 0
+    # Effects: writes temp files to OUTPUTDIR
+    # Throws: Nothing
 
-            mgpLoadCt += 1
+    global spillCt
 
-            # default to gene present description, if no gene, template will be updated below
-            if strainKey in nonMuscStrainKeys:
-                description = mgpNonMuscGeneDescriptTemplate % (chr, start, end, strand, releaseMGP, strain, biotype, symbol)
-            else:
-                description = mgpMuscGeneDescriptTemplate % (chr, start, end, strand, releaseMGP, strain, biotype, symbol)
-
-	    # marker-less row can still be processed
-            if markerKey == '': # count them
-                mgpNoMarkerCt += 1
-                if strainKey in nonMuscStrainKeys:
-                    description = mgpNonMuscNoGeneDescriptTemplate % (chr, start, end, strand, releaseMGP, strain, biotype)
-                else:
-                    description = mgpMuscNoGeneDescriptTemplate % (chr, start, end, strand, releaseMGP, strain, biotype)
-                # create a temporary ID of markerless strain marker object - 
-                # each must have its own uniq set of coordinate attributes
-                mgiID = 'TEMP:%s' % mgpNoMarkerCt
-        
-	    # default to a new strain/marker object
-            strainMarkerObject = StrainMarker()
-            if mgiID not in strainMarkerDict:
-                strainMarkerDict[mgiID] = []
-	    # append new strainMarkerObject to strainMarkerDict
-            strainMarkerObject.markerID = mgiID
-            strainMarkerObject.markerKey = markerKey
-            strainMarkerObject.strainKey = strainKey
-            strainMarkerObject.mgpensID = mgpensID
-            strainMarkerObject.mgpIDs = mgpIDs
-            strainMarkerObject.chr = chr
-            strainMarkerObject.start = start
-            strainMarkerObject.end = end
-            strainMarkerObject.strand = strand
-            strainMarkerObject.biotype = biotype
-            strainMarkerObject.description = description
-            strainMarkerDict[mgiID].append(strainMarkerObject)
+    rss = currentRSS()
+    if rss <= memoryBudget:
+        return
+    spillCt += 1
+    print('memory: RSS %.1f MB over budget %.1f MB, spilling strain markers' \
+        % (rss / 1048576.0, memoryBudget / 1048576.0))
+    for groups in markerGroups:
+        groups.spill()
 
-        fpIn.close()
-        # end of fpIn.readlines()
+# end checkMemory() -------------------------------------
 
-        ctByStrain[strain] = recordCt
+def reportMemory():
+    # Purpose: reports the peak resident set size against memoryBudget
+    # Returns: Nothing
+    # Assumes: Nothing
+    # Effects: writes to stdout (the run log)
+    # Throws: Nothing
 
-        # ------------ end for line in file --------------------
+    peak = peakRSS()
+    if memoryBudget > 0:
+        print('memory: peak RSS %.1f MB, budget %.1f MB (%.0f%%), spilled %s times%s' \
+            % (peak / 1048576.0, memoryBudget / 1048576.0, 100.0 * peak / memoryBudget, spillCt,
+               ', OVER BUDGET' if peak > memoryBudget else ''))
+    else:
+        print('memory: peak RSS %.1f MB, no budget' % (peak / 1048576.0))
 
-        # copy strainMarker objects from strainMarkerDict(by MGI ID) to strainMarkerInput (By strain)
-        for mgiID in strainMarkerDict:
-            strainMarkerInput[strain].append(strainMarkerDict[mgiID])
+# end reportMemory() -------------------------------------
 
-        # add this strain to the qcDict
-        qcDict['mgi_mgp'].append(strainMarkerInput)
+def checkFilters():
+    # Purpose: refuses the subset filters for runs that load: the load deletes
+    #   every strain marker before bcp, so the filtered out ones would be lost
+    # Returns: 1 if error, else 0
+    # Assumes: configure() has been run
+    # Effects: Nothing
+    # Throws: Nothing
 
+    if not (0 < sampleFraction <= 1):
+        print('SAMPLE_FRACTION must be > 0 and <= 1: %s' % sampleFraction)
+        return 1
+    if (strainFilter or chrFilter or sampleFraction < 1) and not qcOnly:
+        print('STRAIN_FILTER, CHR_FILTER and SAMPLE_FRACTION are only allowed with QC_ONLY=true')
+        return 1
     return 0
 
-# end parseMGPFiles() -------------------------------------
+# end checkFilters() -------------------------------------
 
-def writeMGPOutput():
-    # Purpose: writes to Accession, AccessionReference & StrainMarker BCP file and Gene Model and GM Assoc files if there are no errors
-    # Returns: 1 if error, else 0
-    # Assumes: file descriptors have been initialized
-    # Effects: writes to the file system
+def inSample(key):
+    # Purpose: the deterministic sample filter; a key is always in, or always
+    #   out of, the sample for a given sampleFraction
+    # Returns: True if key is in the sample
+    # Assumes: Nothing
+    # Effects: Nothing
     # Throws: Nothing
 
-    global nextSMKey, nextAccKey, mgpSkipCt, totalLoadedCt
+    return sampleFraction >= 1 or zlib.crc32(key.encode()) < sampleFraction * 2**32
 
-    # for markers with >1 strain specific MGP ID
-    # report and load a strain marker and a accession for each MGP ID
-    strainMarkerInputList = qcDict['mgi_mgp']
-    for strainMarkerInputDict in strainMarkerInputList:
-        #print('strainMarkerInputDict')
-        for strain in strainMarkerInputDict:
-            #print('strain in strainMarkerInputDict: ', strain)
-            strainMarkerObjectsList = strainMarkerInputDict[strain]
-            #print(strainMarkerObjectsList)
-            for coordsForMarkerList in strainMarkerObjectsList:
-                #print('coordsForMarkerList in strainMarkerObjectsList')
-                for strainMarkerObject in coordsForMarkerList:
-                    #print('strainMarkerObject in coordsForMarkerList')
+# end inSample() -------------------------------------
 
-                    # write out to bcp file
-                    mgpensID = strainMarkerObject.mgpensID
-                    mgpIDs = strainMarkerObject.mgpIDs
-                    mgiID = strainMarkerObject.markerID 
-                    markerKey = strainMarkerObject.markerKey
+def keepLine(line, sample=True):
+    # Purpose: the chromosome filter, and unless sample is false the sample
+    #   filter (keyed by the whole line), applied to a GFF3 line before it is tokenized
+    # Returns: True if the line passes; "#" and "[" lines always do
+    # Assumes: Nothing
+    # Effects: Nothing
+    # Throws: Nothing
 
-                    if mgiID.find('TEMP:') == 0: # temp ID for no marker strain marker
-                        markerKey = ''
-                        
-                    strainKey = strainMarkerObject.strainKey
-                    chr = strainMarkerObject.chr
-                    start = strainMarkerObject.start
-                    end = strainMarkerObject.end
-                    strand = strainMarkerObject.strand
-                    description = strainMarkerObject.description
-                    biotype = strainMarkerObject.biotype
+    if line[0] == '#' or line[0] == '[':
+        return True
+    if chrFilter and line[:line.find('\t')] not in chrFilter:
+        return False
+    return not sample or inSample(line)
 
-                    totalLoadedCt += 1
-                    fpStrainMarkerFile.write('%s\t%s\t%s\t%s\t%s\t%s\t%s\t%s\n' \
-		    	% (nextSMKey, strainKey, markerKey, mgpRefsKey, userKey, userKey, loaddate, loaddate))
+# end keepLine() -------------------------------------
 
-                    prefixPart, numericPart = accessionlib.split_accnum(mgpensID)
-		    # use proper logicaldb key
-                    if mgpensID.find('ENSMUS') == 0:
-                       ldbKey = ensLDBKey
-                    else:
-                       ldbKey = mgpLDBKey
-                    fpAccFile.write('%s\t%s\t%s\t%s\t%s\t%s\t%s\t0\t1\t%s\t%s\t%s\t%s\n' \
-                    	% (nextAccKey, mgpensID, prefixPart, numericPart, ldbKey, nextSMKey, mgiTypeKey, userKey, userKey, loaddate, loaddate))
+def tokenizeMGPAttributes(tokens):
+    # Purpose: picks the fields parseMGPFiles needs out of the col9 tokens
+    # Returns: (mgpensID, ensemblID, mgpIDs, biotype)
+    #   ensemblID is None if there is no projection_parent_gene
+    # Assumes: tokens are col9 split by ";" (the last one may end in a newline)
+    # Effects: Nothing
+    # Throws: Nothing
 
-                    fpAccRefFile.write('%s\t%s\t%s\t%s\t%s\t%s\n' 
-                    	% (nextAccKey, mgpRefsKey, userKey, userKey, loaddate, loaddate))
-                    nextAccKey += 1
+    mgpensID = ''
+    ensemblID = None
+    mgpIDs = []
+    biotype = ''
 
-		    # optional : if mgpIDs exists, attach as secondary id
-                    if len(mgpIDs) > 0:
-                       for mgp in mgpIDs:
-                           prefixPart, numericPart = accessionlib.split_accnum(mgp)
-                           ldbKey = mgpLDBKey
-                           fpAccFile.write('%s\t%s\t%s\t%s\t%s\t%s\t%s\t0\t0\t%s\t%s\t%s\t%s\n' \
-                                 % (nextAccKey, mgp, prefixPart, numericPart, ldbKey, nextSMKey, mgiTypeKey, userKey, userKey, loaddate, loaddate))
-                           nextAccKey += 1
+    # interested in: "ID=", "biotype=", "projection_parent_gene", "mgp="
+    for t in tokens: # col9 tokens
 
-                    fpGmMgpFile.write('%s\t%s\t%s\t%s\t%s\t%s\t\n' % (mgpensID, chr, start, end, strand, description))
-                    fpBiotypeMgpFile.write('%s\t%s\n' % (mgpensID, biotype))
+        # 'ID=gene:ENSMUSG00200002660'
+        if t.find('ID=gene:') != -1:
+            mgpensID = t.split(':')[1]
 
-                    nextSMKey += 1
+        elif t.find('projection_parent_gene=') != -1:
+            allEns = t.split('=')[1].split('.')[0]
+            allEns = allEns.replace('\n', '').split(',')
+            ensemblID = allEns[0]
 
-    return 0
+        # if mgp=MGP_AJ_G0015774
+        # ignore MGP_CAROLIEiJ
+        elif t.find('mgp=') != -1 and t.find('mgp=MGP_CAROLIEiJ') != 0:
+            mgp = t.split('=')[1]
+            mgpIDs = mgp.replace('\n', '').split(',')
 
-# end writeMGPOutput() ---------------------------------------------------
+        elif t.find('biotype=') != -1:
+            biotype = t.split('=')[1]
 
-def parseB6File( ):
-    # Purpose: parses  MGI.gff3 file
-    # Returns: 1 if error, else 0
-    # Assumes: file descriptors have been initialized
-    # Effects: sets global variables, writes to the file system
-    # Throws: Nothing
-        # example with dbXref in col9
-        # 1       MGI     gene    4807560 4848410 .       +       .       ID=MGI:1344588;Name=Lypla1;mgi_type=protein coding gene;so_term_name=protein_coding_gene;gene_id=MGI:1344588;curie=MGI:1344588;strain_gene_id=MGI_C57BL6J_1344588;Dbxref=ENSEMBL:ENSMUSG00000025903,NCBI_Gene:18777,NCBI_Gene:105243856;description=lysophospholipase 1
+    return (mgpensID, ensemblID, mgpIDs, biotype)
 
-        # example  with no dbXref in col9
-        # 1       MGI     gene    5156597 5158506 .       +       .       ID=MGI:2443922;Name=B230334L07Rik;curie=MGI:2443922;so_term_name=gene;mcv_type=unclassified gene;description=RIKEN cDNA B230334L07 gene
+# end tokenizeMGPAttributes() -------------------------------------
 
-        # example BlatAlignment for above example
-        # 1       BlatAlignment   match   5156597 5158506 .       +       .       ID=MGI:2443922.m2;Name=AK046028.1;Parent=MGI:2443922;qSize=1910;pctLen=100.0;matches=1909;qName=AK046028.1;mgi_id=MGI:2443922;matchLen=1910;pctIdentity=99.9476439791;qEnd=1910;qStart=0
+def tokenizeMGPLine(line):
+    # Purpose: splits one MGP GFF3 line into the fields parseMGPFiles needs
+    # Returns: None for "#" and "[" rows and rows filtered out (see keepLine), else a tuple
+    #   (chr, start, end, strand, mgpensID, ensemblID, mgpIDs, biotype)
+    #   ensemblID is None if there is no projection_parent_gene
+    #   the line itself is not kept; QC findings refer to it by offset
+    # Assumes: Nothing
+    # Effects: Nothing
+    # Throws: Nothing
 
-    global b6ToLoadDict 
+    if line[0] == '#' or line[0] == '[' or not keepLine(line):
+        return None
 
-    # iterate thru lines in the B6 file
-    for line in fpB6InputFile.readlines():
-        #print('parseB6File line: %s' % line)
-        if line.find('#') == 0: # skip commented lines
-            #print('comment line, skipping')
-            continue
-        
-        tokens = line.split('\t')
-        if tokens[1] == 'BlatAlignment':
-            feature = tokens[1]
-            #print('BlatAlignment feature: %s' % feature)
-        
-        else:
-            feature = tokens[2]
-            #print('Non-blatAlignment feature: %s' % feature)
-        # these are the only features we are interested in
-        if feature not in ['gene', 'pseudogene', 'BlatAlignment']:
-            #print("Skipping, feature not in ['gene', 'pseudogene', 'BlatAlignment']")
-            continue
+    tokens = line.split('\t')
+    mgpensID, ensemblID, mgpIDs, biotype = tokenizeMGPAttributes(tokens[8].split(';'))
+    return (tokens[0], tokens[3], tokens[4], tokens[6], mgpensID, ensemblID, mgpIDs, biotype)
 
-        col9 = tokens[8]
-        tokens2 = col9.split(';')
+# end tokenizeMGPLine() -------------------------------------
 
-        mgiID = ''
-        for t in tokens2: # col9 tokens
-            if t.find('curie=MGI:') != -1: # top level feature
-                mgiID = str.strip(t.split('=')[1])
-                #print('found top level feature: "%s"' % mgiID)
-            elif t.find('mgi_id=') != -1:  # blat hit
-                mgiID = str.strip(t.split('=')[1])
-                #print('found blat hit: "%s"' % mgiID)
-        if mgiID != '':
-            #print('adding mgiID to b6ToLoadDict')
-            if mgiID not in b6ToLoadDict:
-                b6ToLoadDict[mgiID] = []
-                #print('new mgiID in dict')
-            b6ToLoadDict[mgiID].append(line)
-    return 0
+def tokenizeMGPChunk(lines):
+    # Purpose: gff3lite.mapChunks worker; tokenizes a chunk of an MGP file
+    # Returns: list of tokenizeMGPLine() results, in input order
+    # Assumes: Nothing
+    # Effects: Nothing
+    # Throws: Nothing
 
-# end parseB6File() ---------------------------------------------------
+    return list(map(tokenizeMGPLine, lines))
+
+# end tokenizeMGPChunk() -------------------------------------
+
+def qcOpenInput(path, indexLines=True):
+    # Purpose: registers an input file that QC findings will refer to
+    # Returns: the file id
+    # Assumes: the QC sidecar file descriptor has been initialized
+    # Effects: indexes the line offsets of the file (kept until qcCloseInput)
+    #   unless indexLines is false (the file is parsed elsewhere),
+    #   writes a {"file": id, "path": path} object to the QC sidecar
+    # Throws: Nothing
+
+    fileId = len(qcInputs)
+    qcInputs.append(path)
+    if indexLines:
+        qcLineOffsets[fileId] = gff3lite.lineOffsets(path)
+    fpQcJsonFile.write(json.dumps({'file': fileId, 'path': path}) + CRT)
+    return fileId
+
+# end qcOpenInput() -------------------------------------
+
+def qcCloseInput(fileId):
+    # Purpose: drops the line offset index of a registered input file
+    # Returns: Nothing
+    # Assumes: Nothing
+    # Effects: Nothing
+    # Throws: Nothing
+
+    qcLineOffsets.pop(fileId, None)
+
+# end qcCloseInput() -------------------------------------
+
+def qcReport(key, line=None, strain=None, fileId=None, lineNo=None, **fields):
+    # Purpose: records one QC finding
+    #   a finding in a registered input file is stored as (file id, byte offset, length);
+    #   its text is only read back when the curator log is written
+    # Returns: Nothing
+    # Assumes: the QC sidecar file descriptor has been initialized
+    # Effects: writes one JSON object to the QC sidecar, counts the finding in qcCounts
+    # Throws: Nothing
+
+    entry = {'bucket': key, 'strain': strain, 'lineNo': lineNo}
+    entry.update(fields)
+    if fileId is not None:
+        offsets = qcLineOffsets[fileId]
+        entry['file'] = fileId
+        entry['offset'] = offsets[lineNo - 1]
+        entry['length'] = offsets[lineNo] - offsets[lineNo - 1]
+    else:
+        entry['line'] = line
+    fpQcJsonFile.write(json.dumps(entry) + CRT)
+    qcCounts[key] += 1
+
+# end qcReport() -------------------------------------
+
+def qcReportMGP(key, record, strain, fileId, lineNo, **fields):
+    # Purpose: records one QC finding for a tokenizeMGPLine() record
+    # Returns: Nothing
+    # Assumes: Nothing
+    # Effects: see qcReport()
+    # Throws: Nothing
+
+    chr, start, end, strand, mgpensID = record[:5]
+    qcReport(key, None, strain, fileId, lineNo, mgpensID=mgpensID, chr=chr, start=start, end=end, strand=strand, **fields)
+
+# end qcReportMGP() -------------------------------------
+
+def qcMGPBatch(records, strain, fileId, firstLineNo=1):
+    # Purpose: runs the MGP coordinate QC checks (chr, start, end, strand, 
+    #   mgpens, biotype) over a batch of records at once, using gffcolumns
+    # Returns: boolean array, true for each record (by index) that must be skipped
+    # Assumes: records are tokenizeMGPLine() results, one per input line,
+    #   starting at line firstLineNo
+    # Effects: reports the findings (see qcReport), in input line order
+    # Throws: Nothing
+
+    start = time.perf_counter()
+    rows = [i for i, r in enumerate(records) if r is not None]
+    batch = gffcolumns.FeatureBatch(
+        [firstLineNo + i for i in rows],
+        [records[i][0] for i in rows],
+        [records[i][1] for i in rows],
+        [records[i][2] for i in rows],
+        [records[i][3] for i in rows],
+        [records[i][4] for i in rows],
+        [records[i][7] for i in rows])
+    masks = gffcolumns.qcMasks(batch, chrLookup, biotypeLookup)
+    for key in gffcolumns.QC_KEYS:
+        mgpQcRules.record(key, int(masks[key].sum()))
+    mgpQcRules.addBatchTime(time.perf_counter() - start)
+
+    # map the failing rows back to their input lines
+    for key in ['chr_m', 'chr_u', 'start', 'end', 'start/end', 'strand', 'mgpens']:
+        for lineNo in batch.lineNo[masks[key]]:
+            qcReportMGP(key, records[lineNo - firstLineNo], strain, fileId, int(lineNo))
+
+    for biotype, count in gffcolumns.countByCategory(batch.biotypeNames, batch.biotypeCode, masks['biotype_u']):
+        qcDict['biotype_u'][biotype] = qcDict['biotype_u'].get(biotype, 0) + count
+
+    skipFlags = [False] * len(records)
+    for i in batch.lineNo[masks['skip']]:
+        skipFlags[i - firstLineNo] = True
+    return skipFlags
+
+# end qcMGPBatch() -------------------------------------
+
+def qcMGPRecords(records, strain, fileId):
+    # Purpose: numbers the records of a file; with qcVectorized, runs
+    #   qcMGPBatch() over each qcBatchRows of them as they are read, so
+    #   the file is never held in memory as a whole
+    # Returns: generator of (lineNo, record, true if qcMGPBatch() skips
+    #   the record)
+    # Assumes: records are tokenizeMGPLine() results, one per input line
+    # Effects: see qcMGPBatch
+    # Throws: Nothing
+
+    if not qcVectorized:
+        for lineIdx, record in enumerate(records):
+            yield lineIdx + 1, record, False
+        return
+
+    records = iter(records)
+    lineNo = 1
+    while True:
+        batch = list(itertools.islice(records, qcBatchRows))
+        if not batch:
+            return
+        for record, skip in zip(batch, qcMGPBatch(batch, strain, fileId, lineNo)):
+            yield lineNo, record, skip
+            lineNo += 1
+
+# end qcMGPRecords() -------------------------------------
+
+def tokenizeMGPCache(cache):
+    # Purpose: same as tokenizeMGPLine() over every line of a file, but reads 
+    #   the pre-parsed columns from the file's gff3cache sidecar
+    # Returns: generator of tokenizeMGPLine() results, one per input line
+    # Assumes: cache is a fresh gff3cache.Gff3Cache, open until the
+    #   generator is done
+    # Effects: Nothing
+    # Throws: Nothing
+
+    for i in range(len(cache)):
+        chr = cache.column(i, 0) if cache.isFeature(i) else ''
+        if not cache.isFeature(i) or chr[0:1] == '[':
+            yield tokenizeMGPLine(cache.line(i))
+            continue
+        if (chrFilter or sampleFraction < 1) and not keepLine(cache.line(i)):
+            yield None
+            continue
+        mgpensID, ensemblID, mgpIDs, biotype = tokenizeMGPAttributes(cache.tokens(i, withNewline=True))
+        yield (chr, cache.column(i, 3), cache.column(i, 4), cache.column(i, 6),
+            mgpensID, ensemblID, mgpIDs, biotype)
+
+# end tokenizeMGPCache() -------------------------------------
+
+def parseMGPFiles( ): 
+    # Purpose: parses input files looping, opening and closing
+    # Returns: 1 if error, else 0
+    # Assumes: output file descriptors have been initialized
+    # Effects: sets global variables, writes to the file system
+    # Throws: Nothing
+   
+    # iterate through all the strain-specific MGP files 
+    for inputFile in mgpInputFiles():
+        print('inputFile: %s' % inputFile)
+        strainMarkerInput = parseMGPFile(inputFile)
+
+        # add this strain to the qcDict
+        if strainMarkerInput is not None:
+            qcDict['mgi_mgp'].append(strainMarkerInput)
+
+    return 0
+
+# end parseMGPFiles() -------------------------------------
+
+def parseMGPFile(inputFile, fileId=None):
+    # Purpose: parses and QCs one strain-specific MGP file
+    # Returns: {strain: list of lists of strainMarkerObjects, one list per marker},
+    #   or None if the strain is unresolved
+    # Assumes: the QC sidecar file descriptor has been initialized
+    # Effects: sets global variables, reports QC findings; registers the file
+    #   with qcOpenInput unless fileId is given
+    # Throws: Nothing
+
+    global mgpFileCt, mgpLoadCt, mgpSkipCt, ctByStrain, mgpNoMarkerCt
+
+    recordCt = 0  # current number of records in this file
+    # lines end at '\n' only, as in gff3lite.readChunk and lineOffsets, so a stray
+    # '\r' splits no line and the serial and parallel parses see the same lines
+    fpIn = open(inputFile, 'r', newline='\n')
+
+    #
+    # find genome-version and extract strain name
+    # #!genome-version 129S1_SvImJ_v3
+    #
+    for line in fpIn:
+       if line.find('#!genome-version') != -1:
+          inputStrain = genomeVersionStrain(line)
+          break
+
+    # resolve strain with translation lookup
+    findings, severity = mgpFileQcRules.check(inputStrain)
+    if severity == qcrules.FATAL:
+        print('inputStrain not in strainTranslationLookup:', inputStrain, len(inputStrain))
+        for rule, fields in findings:
+            qcReport(rule.bucket, inputStrain, strain=inputStrain, **fields)
+        fpIn.close()
+        return None
+
+    # get the strain key
+    strainList= strainTranslationLookup[inputStrain] 
+    strainKey = strainList[0]
+    strain = strainList[1]
+    print('strain: %s strainKey: %s' % (strain, strainKey))
+
+    # QC findings refer to lines of this file by offset
+    if fileId is None:
+        fileId = qcOpenInput(inputFile)
+    else:
+        qcLineOffsets[fileId] = gff3lite.lineOffsets(inputFile)
+
+    # build this as we parse each file - adding strainMarkerObject(s) i
+    # there can be > 1 strainMarker objects/gene with different MGP IDs and diff coords/strand/biotypes
+    # grouped by mgiID; spills to disk if the memory budget is exceeded
+    strainMarkerGroups = StrainMarkerGroups(outputDir)
+    markerGroups.append(strainMarkerGroups)
+
+    # after file parsed this maps the strain to its strainMarkerGroups
+    strainMarkerInput = {} 		# {strain: StrainMarkerGroups, ...}
+
+    # iterate thru lines in this strain file
+    # use the pre-parsed sidecar if there is a fresh one
+    # large files may be tokenized in parallel; records come back in file order
+    # records are streamed, only the strain markers are kept (see memoryBudget)
+    cache = gff3cache.openCache(inputFile) if gff3CacheEnabled else None
+    if cache:
+        print('using gff3cache: %s' % gff3cache.cachePath(inputFile))
+        records = tokenizeMGPCache(cache)
+    elif gff3Workers > 1:
+        nChunks = max(4 * gff3Workers, os.path.getsize(inputFile) // gff3ChunkBytes)
+        records = itertools.chain.from_iterable(
+            gff3lite.mapChunks(inputFile, tokenizeMGPChunk, gff3Workers, nChunks=nChunks))
+    else:
+        fpIn.seek(0)
+        records = map(tokenizeMGPLine, fpIn)
+
+    # with qcVectorized the coordinate QC checks run as vectorized masks over
+    # batches of records (see qcMGPRecords), the other rules per record
+    mgpRecordQcRules = mgpQcRules
+    if qcVectorized:
+        mgpRecordQcRules = mgpQcRules.select(exclude=gffcolumns.QC_KEYS)
+
+    for lineNo, record, batchSkip in qcMGPRecords(records, strain, fileId):
+
+        # skip "#, "[" rows
+        if record is None:
+           continue
+
+        chr, start, end, strand, mgpensID, ensemblID, mgpIDs, biotype = record
+
+        recordCt +=1
+        mgpFileCt += 1
+        symbol = ''
+        markerKey = ''
+
+        # the MGI IDs of the Ensembl ID; None if it is not an Ensembl ID or not in MGI
+        ensMgiIDs = None
+        if ensemblID is not None and ensemblID.startswith('ENSMUS'):
+            ensMgiIDs = ensemblLookup.get(ensemblID)
+
+        # one pass of the QC rules over the record, see buildQcRules()
+        findings, severity = mgpRecordQcRules.check(record + (ensMgiIDs,))
+        for rule, fields in findings:
+            if rule.bucket == 'biotype_u':
+                qcDict['biotype_u'][biotype] = qcDict['biotype_u'].get(biotype, 0) + 1
+            else:
+                qcReportMGP(rule.bucket, record, strain, fileId, lineNo, **fields)
+        # with qcVectorized, the coordinate rules were run over the batch, see qcMGPBatch()
+        isSkip = int(severity in (qcrules.SKIP, qcrules.FATAL) or batchSkip)
+
+        # resolve the rawbiotype to feature type term
+        biotype = biotypeLookup.get(biotype.lower().strip(), biotype)
+
+        # resolve MGI ID; an Ensembl ID associated with > 1 marker
+        # loads a markerless strain gene
+        mgiIDs = ensMgiIDs if ensMgiIDs is not None and len(ensMgiIDs) == 1 else []
+        for mgiID in mgiIDs:
+            if mgiID in markerLookup:
+                marker = markerLookup[mgiID]
+                markerKey = marker.markerKey 
+                symbol = marker.symbol
+
+	# if sanity checks fail, then continue to next fpIn()
+        if isSkip == 1:
+            mgpSkipCt += 1
+            continue
+        
+	# else, continue with current fpIn() row
+
+        mgpLoadCt += 1
+
+        # default to gene present description, if no gene, template will be updated below
+        # QC only runs write no gene model files, so render no descriptions
+        description = ''
+        if qcOnly:
+            pass
+        elif strainKey in nonMuscStrainKeys:
+            description = mgpNonMuscGeneDescriptTemplate % (chr, start, end, strand, releaseMGP, strain, biotype, symbol)
+        else:
+            description = mgpMuscGeneDescriptTemplate % (chr, start, end, strand, releaseMGP, strain, biotype, symbol)
+
+	# marker-less row can still be processed
+        if markerKey == '': # count them
+            mgpNoMarkerCt += 1
+            if qcOnly:
+                pass
+            elif strainKey in nonMuscStrainKeys:
+                description = mgpNonMuscNoGeneDescriptTemplate % (chr, start, end, strand, releaseMGP, strain, biotype)
+            else:
+                description = mgpMuscNoGeneDescriptTemplate % (chr, start, end, strand, releaseMGP, strain, biotype)
+            # create a temporary ID of markerless strain marker object - 
+            # each must have its own uniq set of coordinate attributes
+            mgiID = 'TEMP:%s' % mgpNoMarkerCt
+    
+	# default to a new strain/marker object
+        strainMarkerObject = StrainMarker()
+	# add new strainMarkerObject to strainMarkerGroups
+        strainMarkerObject.markerID = mgiID
+        strainMarkerObject.markerKey = markerKey
+        strainMarkerObject.strainKey = strainKey
+        strainMarkerObject.mgpensID = mgpensID
+        strainMarkerObject.mgpIDs = mgpIDs
+        strainMarkerObject.chr = chr
+        strainMarkerObject.start = start
+        strainMarkerObject.end = end
+        strainMarkerObject.strand = strand
+        strainMarkerObject.biotype = biotype
+        strainMarkerObject.description = description
+        strainMarkerGroups.add(mgiID, strainMarkerObject)
+
+        if memoryBudget > 0 and mgpLoadCt % memoryCheckRows == 0:
+            checkMemory()
+
+    fpIn.close()
+    if cache:
+        cache.close()
+    qcCloseInput(fileId)
+    # end of records
+
+    ctByStrain[strain] = recordCt
+
+    # ------------ end for line in file --------------------
+
+    strainMarkerInput[strain] = strainMarkerGroups
+
+    return strainMarkerInput
+
+# end parseMGPFile() -------------------------------------
+
+def qcStrainFile(task):
+    # Purpose: multiprocessing worker for qcMGPFiles(); parses and QCs one
+    #   strain file in a QC only run
+    # Returns: (QC sidecar text, qcCounts, biotype_u counts,
+    #   (records, skipped, loaded, loaded with no marker), ctByStrain,
+    #   [(strain, mgpensID, mgpIDs), ...] in bcp file order,
+    #   (MGP file, MGP record) QC rule stats)
+    # Assumes: task is (inputFile, file id from qcOpenInput)
+    # Effects: sets global variables (of the worker process)
+    # Throws: Nothing
+
+    global fpQcJsonFile, qcCounts, qcDict, gff3Workers
+    global mgpFileCt, mgpLoadCt, mgpSkipCt, mgpNoMarkerCt, ctByStrain
+
+    inputFile, fileId = task
+
+    # collect the findings and counts of this file only
+    fpQcJsonFile = io.StringIO()
+    qcCounts = dict.fromkeys(qcCounts, 0)
+    qcDict = {'biotype_u': {}, 'mgi_mgp': []}
+    mgpFileCt = mgpLoadCt = mgpSkipCt = mgpNoMarkerCt = 0
+    ctByStrain = {}
+    gff3Workers = 1     # a pool worker cannot start its own pool
+    mgpFileQcRules.reset()
+    mgpQcRules.reset()
+
+    accessions = []
+    strainMarkerInput = parseMGPFile(inputFile, fileId)
+    if strainMarkerInput is not None:
+        for strain in strainMarkerInput:
+            for coordsForMarkerList in strainMarkerInput[strain]:
+                for strainMarkerObject in coordsForMarkerList:
+                    accessions.append((strain, strainMarkerObject.mgpensID, strainMarkerObject.mgpIDs))
+
+    return (fpQcJsonFile.getvalue(), qcCounts, qcDict['biotype_u'],
+        (mgpFileCt, mgpSkipCt, mgpLoadCt, mgpNoMarkerCt), ctByStrain, accessions,
+        (mgpFileQcRules.stats(), mgpQcRules.stats()))
+
+# end qcStrainFile() -------------------------------------
+
+def qcMGPFiles():
+    # Purpose: the QC only counterpart of parseMGPFiles() and writeMGPOutput():
+    #   QCs the strain files in parallel, one worker per file (at most one per
+    #   CPU), and registers the accession IDs the load would write
+    # Returns: 1 if error, else 0
+    # Assumes: the curator log and QC sidecar file descriptors have been initialized
+    # Effects: sets global variables, writes the findings to the QC sidecar
+    #   in input file order
+    # Throws: Nothing
+
+    global mgpFileCt, mgpLoadCt, mgpSkipCt, mgpNoMarkerCt, totalLoadedCt
+
+    tasks = []
+    for inputFile in mgpInputFiles():
+        print('inputFile: %s' % inputFile)
+        tasks.append((inputFile, qcOpenInput(inputFile, indexLines=False)))
+
+    # nothing buffered may be inherited by the workers
+    fpQcJsonFile.flush()
+    fpLogCur.flush()
+
+    # always in worker processes, qcStrainFile() replaces the QC globals
+    # the workers are forked (see poolContext): they need the configured globals,
+    # the lookups and the QC rules, whose predicates cannot be pickled
+    nWorkers = max(1, min(len(tasks), os.cpu_count() or 1))
+    with poolContext.Pool(nWorkers) as pool:
+        results = pool.map(qcStrainFile, tasks)
+
+    for sidecar, counts, biotypes, fileCounts, strainCounts, accessions, ruleStats in results:
+        fpQcJsonFile.write(sidecar)
+        for key in counts:
+            qcCounts[key] += counts[key]
+        for biotype in biotypes:
+            qcDict['biotype_u'][biotype] = qcDict['biotype_u'].get(biotype, 0) + biotypes[biotype]
+        mgpFileCt += fileCounts[0]
+        mgpSkipCt += fileCounts[1]
+        mgpLoadCt += fileCounts[2]
+        mgpNoMarkerCt += fileCounts[3]
+        ctByStrain.update(strainCounts)
+        for strain, mgpensID, mgpIDs in accessions:
+            registerMGPAccessions(strain, mgpensID, mgpIDs)
+        totalLoadedCt += len(accessions)
+        mgpFileQcRules.merge(ruleStats[0])
+        mgpQcRules.merge(ruleStats[1])
+
+    return 0
+
+# end qcMGPFiles() -------------------------------------
+
+def registerAccession(accID, ldbKey, strain, preferred):
+    # Purpose: records an accession ID about to be written to the ACC_Accession bcp file
+    # Returns: Nothing
+    # Assumes: Nothing
+    # Effects: adds accID to accRegistry; if it is already there for this logical DB,
+    #   records the collision in accCollisions
+    # Throws: Nothing
+
+    key = (ldbKey, accID)
+    if key not in accRegistry:
+        accRegistry[key] = strain
+        return
+
+    collisionKey = (strain, ldbKey)
+    if collisionKey not in accCollisions:
+        accCollisions[collisionKey] = []
+    accCollisions[collisionKey].append((accID, accRegistry[key], preferred))
+
+# end registerAccession() -------------------------------------
+
+def registerMGPAccessions(strain, mgpensID, mgpIDs):
+    # Purpose: registers the accession IDs of one MGP strain marker, see registerAccession
+    # Returns: Nothing
+    # Assumes: Nothing
+    # Effects: see registerAccession
+    # Throws: Nothing
+
+    registerAccession(mgpensID, ensLDBKey if mgpensID.find('ENSMUS') == 0 else mgpLDBKey, strain, 1)
+    for mgp in mgpIDs:
+        registerAccession(mgp, mgpLDBKey, strain, 0)
+
+# end registerMGPAccessions() -------------------------------------
+
+def writeAccCollisions():
+    # Purpose: reports accession IDs emitted more than once, per strain and logical DB
+    #   a collision is fatal if the repeated ID is a preferred (primary) ID, i.e. the
+    #   same ID would identify two strain markers; repeated secondary (mgp=) IDs are
+    #   reported only
+    # Returns: 1 if any collision is fatal, else 0
+    # Assumes: file descriptors have been initialized
+    # Effects: writes to the curator log
+    # Throws: Nothing
+
+    if len(accCollisions) == 0:
+        return 0
+
+    rc = 0
+    fpLogCur.write('%sAccession IDs emitted more than once for the same logical DB%s' % (CRT, CRT))
+    fpLogCur.write('-' * 80 + CRT)
+    for strain, ldbKey in sorted(accCollisions):
+        collisions = accCollisions[(strain, ldbKey)]
+        fpLogCur.write('%s, %s (%s): %s%s' % (strain, ldbNames.get(ldbKey, ldbKey), ldbKey, len(collisions), CRT))
+        for accID, firstStrain, preferred in collisions:
+            if preferred:
+                rc = 1
+            fpLogCur.write('    %s : first emitted by %s%s%s' \
+                % (accID, firstStrain, ' (preferred, fatal)' if preferred else '', CRT))
+    fpLogCur.write('Total accession collisions: %s%s' % (sum(map(len, accCollisions.values())), CRT))
+    fpLogCur.flush()
+
+    return rc
+
+# end writeAccCollisions() -------------------------------------
+
+def writeMGPOutput():
+    # Purpose: writes to Accession, AccessionReference & StrainMarker BCP file and Gene Model and GM Assoc files if there are no errors
+    # Returns: 1 if error, else 0
+    # Assumes: file descriptors have been initialized
+    # Effects: writes to the file system
+    # Throws: Nothing
+
+    global nextSMKey, nextAccKey, mgpSkipCt, totalLoadedCt
+
+    # for markers with >1 strain specific MGP ID
+    # report and load a strain marker and a accession for each MGP ID
+    strainMarkerInputList = qcDict['mgi_mgp']
+    for strainMarkerInputDict in strainMarkerInputList:
+        #print('strainMarkerInputDict')
+        for strain in strainMarkerInputDict:
+            #print('strain in strainMarkerInputDict: ', strain)
+            strainMarkerObjectsList = strainMarkerInputDict[strain]
+            #print(strainMarkerObjectsList)
+            for coordsForMarkerList in strainMarkerObjectsList:
+                #print('coordsForMarkerList in strainMarkerObjectsList')
+                for strainMarkerObject in coordsForMarkerList:
+                    #print('strainMarkerObject in coordsForMarkerList')
+
+                    # write out to bcp file
+                    mgpensID = strainMarkerObject.mgpensID
+                    mgpIDs = strainMarkerObject.mgpIDs
+                    mgiID = strainMarkerObject.markerID 
+                    markerKey = strainMarkerObject.markerKey
+
+                    if mgiID.find('TEMP:') == 0: # temp ID for no marker strain marker
+                        markerKey = ''
+                        
+                    strainKey = strainMarkerObject.strainKey
+                    chr = strainMarkerObject.chr
+                    start = strainMarkerObject.start
+                    end = strainMarkerObject.end
+                    strand = strainMarkerObject.strand
+                    description = strainMarkerObject.description
+                    biotype = strainMarkerObject.biotype
+
+                    totalLoadedCt += 1
+                    registerMGPAccessions(strain, mgpensID, mgpIDs)
+
+                    smBcpWriter.write((nextSMKey, strainKey, markerKey, mgpRefsKey))
+
+                    prefixPart, numericPart = accSplitter.split(mgpensID)
+		    # use proper logicaldb key
+                    if mgpensID.find('ENSMUS') == 0:
+                       ldbKey = ensLDBKey
+                    else:
+                       ldbKey = mgpLDBKey
+                    accBcpWriter.write((nextAccKey, mgpensID, prefixPart, numericPart, ldbKey, nextSMKey, mgiTypeKey, 0, 1))
+
+                    accRefBcpWriter.write((nextAccKey, mgpRefsKey))
+                    nextAccKey += 1
+
+		    # optional : if mgpIDs exists, attach as secondary id
+                    if len(mgpIDs) > 0:
+                       for mgp in mgpIDs:
+                           prefixPart, numericPart = accSplitter.split(mgp)
+                           ldbKey = mgpLDBKey
+                           accBcpWriter.write((nextAccKey, mgp, prefixPart, numericPart, ldbKey, nextSMKey, mgiTypeKey, 0, 0))
+                           nextAccKey += 1
+
+                    gmMgpWriter.write((mgpensID, chr, start, end, strand, description, ''))
+                    biotypeMgpWriter.write((mgpensID, biotype))
+
+                    nextSMKey += 1
+
+    return 0
+
+# end writeMGPOutput() ---------------------------------------------------
+
+def tokenizeB6Chunk(lines):
+    # Purpose: picks the gene, pseudogene and BlatAlignment lines out of MGI.gff3 lines;
+    #   also the gff3lite.mapChunks worker for parseB6File
+    # Returns: list of (mgiID, line), in input order
+    # Assumes: Nothing
+    # Effects: Nothing
+    # Throws: Nothing
+
+    records = []
+    for line in lines:
+        #print('parseB6File line: %s' % line)
+        if line.find('#') == 0: # skip commented lines
+            #print('comment line, skipping')
+            continue
+
+        # chromosome filter; the sample is drawn by MGI ID in parseB6File()
+        if chrFilter and not keepLine(line, sample=False):
+            continue
+        
+        tokens = line.split('\t')
+        if tokens[1] == 'BlatAlignment':
+            feature = tokens[1]
+            #print('BlatAlignment feature: %s' % feature)
+        
+        else:
+            feature = tokens[2]
+            #print('Non-blatAlignment feature: %s' % feature)
+        # these are the only features we are interested in
+        if feature not in ['gene', 'pseudogene', 'BlatAlignment']:
+            #print("Skipping, feature not in ['gene', 'pseudogene', 'BlatAlignment']")
+            continue
+
+        col9 = tokens[8]
+        tokens2 = col9.split(';')
+
+        mgiID = ''
+        for t in tokens2: # col9 tokens
+            if t.find('curie=MGI:') != -1: # top level feature
+                mgiID = str.strip(t.split('=')[1])
+                #print('found top level feature: "%s"' % mgiID)
+            elif t.find('mgi_id=') != -1:  # blat hit
+                mgiID = str.strip(t.split('=')[1])
+                #print('found blat hit: "%s"' % mgiID)
+        if mgiID != '':
+            records.append((mgiID, line))
+    return records
+
+# end tokenizeB6Chunk() ---------------------------------------------------
+
+def tokenizeB6Cache(cache):
+    # Purpose: same as tokenizeB6Chunk() over every line of MGI.gff3, but reads
+    #   the pre-parsed columns from its gff3cache sidecar
+    # Returns: list of (mgiID, line), in input order
+    # Assumes: cache is a fresh gff3cache.Gff3Cache
+    # Effects: Nothing
+    # Throws: Nothing
+
+    records = []
+    for i in range(len(cache)):
+        if not cache.isFeature(i):
+            records.extend(tokenizeB6Chunk([cache.line(i)]))
+            continue
+        if chrFilter and cache.column(i, 0) not in chrFilter:
+            continue
+        if cache.column(i, 1) == 'BlatAlignment':
+            feature = 'BlatAlignment'
+        else:
+            feature = cache.column(i, 2)
+        if feature not in ['gene', 'pseudogene', 'BlatAlignment']:
+            continue
+
+        mgiID = ''
+        for t in cache.tokens(i, withNewline=True): # col9 tokens
+            if t.find('curie=MGI:') != -1: # top level feature
+                mgiID = str.strip(t.split('=')[1])
+            elif t.find('mgi_id=') != -1:  # blat hit
+                mgiID = str.strip(t.split('=')[1])
+        if mgiID != '':
+            records.append((mgiID, cache.line(i)))
+    return records
+
+# end tokenizeB6Cache() ---------------------------------------------------
+
+def parseB6File( ):
+    # Purpose: parses  MGI.gff3 file
+    # Returns: 1 if error, else 0
+    # Assumes: file descriptors have been initialized
+    # Effects: sets global variables, writes to the file system
+    # Throws: Nothing
+        # example with dbXref in col9
+        # 1       MGI     gene    4807560 4848410 .       +       .       ID=MGI:1344588;Name=Lypla1;mgi_type=protein coding gene;so_term_name=protein_coding_gene;gene_id=MGI:1344588;curie=MGI:1344588;strain_gene_id=MGI_C57BL6J_1344588;Dbxref=ENSEMBL:ENSMUSG00000025903,NCBI_Gene:18777,NCBI_Gene:105243856;description=lysophospholipase 1
+
+        # example  with no dbXref in col9
+        # 1       MGI     gene    5156597 5158506 .       +       .       ID=MGI:2443922;Name=B230334L07Rik;curie=MGI:2443922;so_term_name=gene;mcv_type=unclassified gene;description=RIKEN cDNA B230334L07 gene
+
+        # example BlatAlignment for above example
+        # 1       BlatAlignment   match   5156597 5158506 .       +       .       ID=MGI:2443922.m2;Name=AK046028.1;Parent=MGI:2443922;qSize=1910;pctLen=100.0;matches=1909;qName=AK046028.1;mgi_id=MGI:2443922;matchLen=1910;pctIdentity=99.9476439791;qEnd=1910;qStart=0
+
+    global b6ToLoadDict 
+
+    if not loadB6():
+        print('skipping %s, %s not in STRAIN_FILTER' % (b6InputFile, b6Strain))
+        return 0
+
+    # iterate thru lines in the B6 file
+    # use the pre-parsed sidecar if there is a fresh one
+    # a large file may be tokenized in parallel; records come back in file order
+    cache = gff3cache.openCache(b6InputFile) if gff3CacheEnabled else None
+    if cache:
+        print('using gff3cache: %s' % gff3cache.cachePath(b6InputFile))
+        records = tokenizeB6Cache(cache)
+        cache.close()
+    elif gff3Workers > 1:
+        records = itertools.chain.from_iterable(
+            gff3lite.mapChunks(b6InputFile, tokenizeB6Chunk, gff3Workers))
+    else:
+        records = tokenizeB6Chunk(fpB6InputFile.readlines())
+
+    for mgiID, line in records:
+        # the sample keeps a gene together with its BlatAlignment lines
+        if not inSample(mgiID):
+            continue
+        #print('adding mgiID to b6ToLoadDict')
+        if mgiID not in b6ToLoadDict:
+            b6ToLoadDict[mgiID] = []
+            #print('new mgiID in dict')
+        b6ToLoadDict[mgiID].append(line)
+    return 0
+
+# end parseB6File() ---------------------------------------------------
 
 def parseB6Feature(line, type):
     #print('In parseB6Feature type: %s line: %s' % (type, line))
@@ -912,49 +2211,19 @@ def parseB6Feature(line, type):
             qName = qName.split('.')[0]
     
     # IMPLEMENTATION NOTE: We expect no errors given that this data is from 
-    # Joel's gff3 file. I added print statements to confirm there were no errors
-    # there were not, we don't expect any, so won't take the time to log, just print
-    if chr == '':
-        if type == 'f':
-            print('ERROR: no chr')
-    if  chr not in chrLookup:
-        if type == 'f':
-            print('ERROR: chr not resolved')
-    if start == '':
-        if type == 'f':
-            print('ERROR: no start coord')
-    if end == '':
-        if type == 'f':
-            print('ERROR: no end coord')
-    if start != '' and end != '' and (int(start) > int(end)):
-        if type == 'f':
-            print('ERROR: start > end')
-    if strand == '':
-        if type == 'f':
-            print('ERROR: missing strand')
-    if biotype == '':
-        if type == 'f':
-            print('ERROR: missing biotype')
-    if smID == '':
-        if type == 'f':
-            print('ERROR: missing strain/marker id')
-    if mgiID == '':
-        if type == 'f' or type == 'bf':
-            print('ERROR: missing mgi ID')
-    else:
+    # Joel's gff3 file; the checks are the B6 QC rules for this type of line
+    # (see buildQcRules), counted and reported like the MGP ones, but the line
+    # is loaded either way
+    findings, severity = b6QcRulesByKind[type].check((chr, start, end, strand, smID, mgiID, biotype, gmIdString, qName))
+    for rule, fields in findings:
+        qcReport(rule.bucket, line, strain=b6Strain, **fields)
+    if mgiID != '':
         symbol = markerLookup[mgiID].symbol
-
-    if qName == '' and type == 'b':
-        print('ERROR: missing qName: %s' % qName)
-
-    # check that feature is in the database
-    if biotype.lower().strip() not in mcvTermLookup:
-        if type == 'f':
-            print('ERROR: biotype not in MGI')
-    # Nothing is reported from the adhoc QC checks above
     
-    # calculate the description
-    if type == 'bf': # blat feature has no qName values, create a place holder; filled in later
+    # calculate the description; QC only runs write no gene model files
+    if qcOnly:
+        pass
+    elif type == 'bf': # blat feature has no qName values, create a place holder; filled in later
         description = b6BlatDescriptTemplate % (chr, start, end, strand, symbol, biotype, releaseB6, '%s') 
     elif type == 'f': # feature, has gene model IDs
         description = b6DescriptTemplate % (chr, start, end, strand, symbol, biotype, releaseB6, gmIdString)
@@ -996,36 +2265,36 @@ def writeB6Output():
             #print('This is non-BlatAlignment gene/pseudogene and nextSMKey: %s' % nextSMKey
             line = lineList[0]
             chr, start, end, strand, smID, mgiID, biotype, gmIdString, qName, description = parseB6Feature(line, 'f')
-            fpStrainMarkerFile.write('%s\t%s\t%s\t%s\t%s\t%s\t%s\t%s\n' \
-	    	% (nextSMKey, b6StrainKey, markerKey, b6RefsKey, userKey, userKey, loaddate, loaddate))
+            registerAccession(smID, msgLDBKey, b6Strain, 1)
+            smBcpWriter.write((nextSMKey, b6StrainKey, markerKey, b6RefsKey))
 
-            prefixPart, numericPart = accessionlib.split_accnum(smID)
+            prefixPart, numericPart = accSplitter.split(smID)
 
-            fpAccFile.write('%s\t%s\t%s\t%s\t%s\t%s\t%s\t0\t1\t%s\t%s\t%s\t%s\n' \
-                % (nextAccKey, smID, prefixPart, numericPart, msgLDBKey, nextSMKey, mgiTypeKey, userKey, userKey, loaddate, loaddate))
+            accBcpWriter.write((nextAccKey, smID, prefixPart, numericPart, msgLDBKey, nextSMKey, mgiTypeKey, 0, 1))
 
-            fpAccRefFile.write('%s\t%s\t%s\t%s\t%s\t%s\n' \
-                % (nextAccKey, b6RefsKey, userKey, userKey, loaddate, loaddate))
+            accRefBcpWriter.write((nextAccKey, b6RefsKey))
             
-            fpGmB6File.write('%s\t%s\t%s\t%s\t%s\t%s\t\n' % (smID, chr, start, end, strand, description))
-            fpBiotypeB6File.write('%s\t%s\n' % (smID, biotype))
+            gmB6Writer.write((smID, chr, start, end, strand, description, ''))
+            biotypeB6Writer.write((smID, biotype))
   
             nextAccKey += 1
         
             # get gmIDs from the input file for the sequence description, if they exist
             # gmIDs example:
             # Dbxref=miRBase:MI0005004,ENSEMBL:ENSMUSG00000076010,NCBI_Gene:751557
+            # the strain marker is written either way, so is its key used
+            nextSMKey += 1
+
             if gmIdString == '': 
                 continue
             gmIdList = gmIdString.split(',')
-                
-            nextSMKey += 1
         else: # This is BlatAlignment set
             #print('this is a BlatAlignment set nextSMKey: %s' % nextSMKey
             # The first line is feature line, the following are BlatAlignments
             featureLine = lineList[0]
 
             chr, start, end, strand, smID, mgiID, biotype, gmIdString, qName, description = parseB6Feature(featureLine, 'bf')	    
+            registerAccession(smID, msgLDBKey, b6Strain, 1)
             
             # remainder of the list are blat hits - save them to a set
             lineList = lineList[1:] # remove the blat feature
@@ -1039,20 +2308,17 @@ def writeB6Output():
             #
             # Create the strain marker and its accession ID
             #
-            fpStrainMarkerFile.write('%s\t%s\t%s\t%s\t%s\t%s\t%s\t%s\n' \
-	    	% (nextSMKey, b6StrainKey, markerKey, b6RefsKey, userKey, userKey, loaddate, loaddate))
+            smBcpWriter.write((nextSMKey, b6StrainKey, markerKey, b6RefsKey))
 
-            prefixPart, numericPart = accessionlib.split_accnum(smID)
-            fpAccFile.write('%s\t%s\t%s\t%s\t%s\t%s\t%s\t0\t1\t%s\t%s\t%s\t%s\n' \
-                % (nextAccKey, smID, prefixPart, numericPart, msgLDBKey, nextSMKey, mgiTypeKey, userKey, userKey, loaddate, loaddate))
+            prefixPart, numericPart = accSplitter.split(smID)
+            accBcpWriter.write((nextAccKey, smID, prefixPart, numericPart, msgLDBKey, nextSMKey, mgiTypeKey, 0, 1))
 
-            fpAccRefFile.write('%s\t%s\t%s\t%s\t%s\t%s\n' \
-                % (nextAccKey, b6RefsKey, userKey, userKey, loaddate, loaddate))
+            accRefBcpWriter.write((nextAccKey, b6RefsKey))
 
             nextAccKey += 1
 
-            fpGmB6File.write('%s\t%s\t%s\t%s\t%s\t%s\n' % (smID, chr, start, end, strand, description))
-            fpBiotypeB6File.write('%s\t%s\n' % (smID, biotype))
+            gmB6Writer.write((smID, chr, start, end, strand, description))
+            biotypeB6Writer.write((smID, biotype))
             
             # 6/12 GF-184, removed all associated IDs from strain gene	
             # for blat hits in the input file associate the GenBank IDs that was
@@ -1064,6 +2330,130 @@ def writeB6Output():
 
 # end writeB6Output() ---------------------------------------------------
 
+def qcB6Output():
+    # Purpose: the QC only counterpart of writeB6Output(): runs the B6 checks
+    #   and registers the accession IDs the load would write, without
+    #   descriptions, keys or bcp rows
+    # Returns: 1 if error, else 0
+    # Assumes: parseB6File() has been run
+    # Effects: sets global variables
+    # Throws: Nothing
+
+    global totalLoadedCt, b6LoadedCt
+
+    for mgiID in b6ToLoadDict:
+        lineList = b6ToLoadDict[mgiID]
+
+        # Resolve MGI ID
+        if mgiID not in markerLookup:
+            print('%s in MGI GFF File, but NOT IN MGI' % (mgiID))
+            continue
+
+        if len(lineList) == 1:  # This is non-BlatAlignment gene/pseudogene
+            tokens = parseB6Feature(lineList[0], 'f')
+            registerAccession(tokens[4], msgLDBKey, b6Strain, 1)
+            # counted as writeB6Output() counts them
+            if tokens[7] == '':
+                continue
+        else: # This is BlatAlignment set, the first line is the feature line
+            registerAccession(parseB6Feature(lineList[0], 'bf')[4], msgLDBKey, b6Strain, 1)
+            for line in lineList[1:]:
+                parseB6Feature(line, 'b')
+
+        totalLoadedCt += 1
+        b6LoadedCt += 1
+    return 0
+
+# end qcB6Output() ---------------------------------------------------
+
+def readQcEntries(keys, cap):
+    # Purpose: reads the findings of the buckets in keys back from the QC
+    #   sidecar, in one pass
+    # Returns: {bucket: [JSON line, ...]}, in the order they were reported;
+    #   at most cap of each bucket, unless cap is 0; decoded by the caller
+    # Assumes: the QC sidecar has been flushed
+    # Effects: reads the file system
+    # Throws: Nothing
+
+    # the number of findings still to read of each bucket; the pass stops
+    # once every bucket has all it needs
+    wanted = {}
+    for key in keys:
+        if qcCounts[key] > 0:
+            wanted[key] = min(cap, qcCounts[key]) if cap > 0 else qcCounts[key]
+    entries = dict([(key, []) for key in keys])
+    if not wanted:
+        return entries
+
+    decoder = json.JSONDecoder()
+    prefix = '{"bucket": '
+    with open(qcJsonFile, 'r') as fp:
+        for jsonLine in fp:
+            # the bucket is always the first key of a finding, see qcReport();
+            # the other lines register the input files, see qcOpenInput()
+            if not jsonLine.startswith(prefix):
+                continue
+            key = decoder.raw_decode(jsonLine, len(prefix))[0]
+            if wanted.get(key, 0) == 0:
+                continue
+            entries[key].append(jsonLine)
+            wanted[key] -= 1
+            if wanted[key] == 0:
+                del wanted[key]
+                if not wanted:
+                    break
+    return entries
+
+# end readQcEntries() -------------------------------
+
+def qcLineText(entry):
+    # Purpose: materializes the input line of a QC finding
+    # Returns: string
+    # Assumes: Nothing
+    # Effects: memory-maps the registered input files on first use (see qcUnmapInputs)
+    # Throws: Nothing
+
+    if 'file' not in entry:
+        return entry['line']
+    fileId = entry['file']
+    if fileId not in qcMaps:
+        with open(qcInputs[fileId], 'rb') as fp:
+            qcMaps[fileId] = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+    offset = entry['offset']
+    return qcMaps[fileId][offset:offset + entry['length']].decode()
+
+# end qcLineText() -------------------------------
+
+def qcUnmapInputs():
+    # Purpose: unmaps the input files mapped by qcLineText
+    # Returns: Nothing
+    # Assumes: Nothing
+    # Effects: Nothing
+    # Throws: Nothing
+
+    for m in qcMaps.values():
+        m.close()
+    qcMaps.clear()
+
+# end qcUnmapInputs() -------------------------------
+
+def formatQcEntry(entry):
+    # Purpose: renders one QC finding for the curator log
+    # Returns: string
+    # Assumes: Nothing
+    # Effects: Nothing
+    # Throws: Nothing
+
+    key = entry['bucket']
+    line = qcLineText(entry)
+    if key == 'mgi_u':
+        return '%s : %s' % (entry.get('ensemblID', entry.get('mgiID')), line)
+    if key == 'ens_multi':
+        return '%s : %s : %s ' % (entry['ensemblID'], entry['mgiIDs'], line)
+    return line
+
+# end formatQcEntry() -------------------------------
+
 def writeCuratorLog():
     # Purpose: writes QC errors to the curator log
     # Returns: 1 if error, else 0
@@ -1121,30 +2511,291 @@ def writeCuratorLog():
     #  process mgpens skipped
     order = ['mgpens']
     for key in order:
-        qcList = qcDict[key]
-        if qcList == []:
+        if qcCounts[key] == 0:
             continue
         msg = messageMap[key]
-        fpLogCur.write('Total %s: %s%s%s' % (key, len(qcList), CRT, CRT))
+        fpLogCur.write('Total %s: %s%s%s' % (key, qcCounts[key], CRT, CRT))
     
     #
-    #  process remaining QC
+    #  process remaining QC, rendered from the QC sidecar
     #order = ['strain_u', 'chr_u', 'chr_m', 'start', 'end', 'strand', 'start/end', 'mgi_u', 'ens_no', 'ens_multi']
-    order = ['strain_u', 'start', 'end', 'strand', 'start/end', 'mgi_u', 'ens_no', 'ens_multi']
+    writeQcBuckets(['strain_u', 'start', 'end', 'strand', 'start/end', 'mgi_u', 'ens_no', 'ens_multi'])
+    
+    return 0
+
+# end writeCuratorLog() -------------------------------
+
+def writeQcBuckets(order):
+    # Purpose: writes the findings of the buckets in order to the curator log,
+    #   read back from the QC sidecar; at most qcLogCap findings are written
+    #   per bucket, the sidecar has all of them
+    # Returns: Nothing
+    # Assumes: file descriptors have been initialized
+    # Effects: writes to the file system
+    # Throws: Nothing
+
+    fpQcJsonFile.flush()
+    entries = readQcEntries(order, qcLogCap)
     for key in order:
-        qcList = qcDict[key]
-        if qcList == []:
+        count = qcCounts[key]
+        if count == 0:
             continue
         msg = messageMap[key]
         fpLogCur.write(CRT)
         fpLogCur.write('%s%s'% (msg,CRT))
         fpLogCur.write('-' * 80 + CRT)
-        fpLogCur.write(CRT.join(qcList) + CRT)
-        fpLogCur.write('Total %s: %s%s' % (key, len(qcList), CRT))
-    
+        for jsonLine in entries.pop(key):
+            fpLogCur.write(formatQcEntry(json.loads(jsonLine)) + CRT)
+        if qcLogCap > 0 and count > qcLogCap:
+            fpLogCur.write('... %s more, see %s%s' % (count - qcLogCap, qcJsonFile, CRT))
+        fpLogCur.write('Total %s: %s%s' % (key, count, CRT))
+    qcUnmapInputs()
+
+# end writeQcBuckets() -------------------------------
+
+def writeB6CuratorLog():
+    # Purpose: writes the B6 QC findings to the curator log; they are only
+    #   known once the B6 lines have been parsed, after writeCuratorLog()
+    # Returns: 0
+    # Assumes: file descriptors have been initialized
+    # Effects: writes to the file system
+    # Throws: Nothing
+
+    writeQcBuckets(b6QcBuckets)
+    fpLogCur.flush()
+
     return 0
 
-# end writeCuratorLog() -------------------------------
+# end writeB6CuratorLog() -------------------------------
+
+def accSortKey(row):
+    # Purpose: sort key of an ACC_Accession bcp row: (accID, _LogicalDB_key)
+    # Returns: tuple
+    # Assumes: row is a list of column strings (bcpwriter.readRows)
+    # Effects: Nothing
+    # Throws: Nothing
+
+    return (row[1], int(row[4]))
+
+# end accSortKey() -------------------------------------
+
+def accRefSortKey(row):
+    # Purpose: sort key of an ACC_AccessionReference bcp row: _Accession_key
+    # Returns: int
+    # Assumes: row is a list of column strings (bcpwriter.readRows)
+    # Effects: Nothing
+    # Throws: Nothing
+
+    return int(row[0])
+
+# end accRefSortKey() -------------------------------------
+
+def sortBcpFiles():
+    # Purpose: rewrites the ACC_Accession bcp file sorted on accSortKey(), giving the
+    #   rows consecutive _Accession_keys (the same key range) in the new order, and
+    #   rewrites the ACC_AccessionReference bcp file with the new keys, in key order
+    #   MRK_StrainMarker is already written in key order
+    # Returns: 1 if error, else 0
+    # Assumes: the bcp files have been closed; the ACC_Accession keys in the file
+    #   are a consecutive range (as assigned by the writers)
+    # Effects: replaces the two bcp files
+    # Throws: Nothing
+
+    keys = [int(row[0]) for row in bcpwriter.readRows(accFile, acc_table, bcpFormat)]
+    if len(keys) == 0:
+        return 0
+    firstKey = min(keys)
+    if max(keys) - firstKey + 1 != len(keys):
+        print('sortBcpFiles: %s keys are not a consecutive range, not sorting' % accFile)
+        return 1
+    keys = None
+
+    # newKeys[oldKey - firstKey] = key of the row in sorted order
+    newKeys = array('Q', bytes(8 * (nextAccKey - firstKey)))
+    rows = bcpwriter.readRows(accFile, acc_table, bcpFormat)
+    writer = bcpwriter.openWriter(accFile + '.tmp', acc_table, bcpFormat)
+    nextKey = firstKey
+    for row in gff3lite.externalSort(rows, bcpSortMemory, outputDir, accSortKey):
+        newKeys[int(row[0]) - firstKey] = nextKey
+        row[0] = nextKey
+        writer.write(row)
+        nextKey += 1
+    writer.close()
+    os.replace(accFile + '.tmp', accFile)
+
+    rows = ([newKeys[int(row[0]) - firstKey]] + row[1:] \
+        for row in bcpwriter.readRows(accRefFile, accref_table, bcpFormat))
+    writer = bcpwriter.openWriter(accRefFile + '.tmp', accref_table, bcpFormat)
+    for row in gff3lite.externalSort(rows, bcpSortMemory, outputDir, accRefSortKey):
+        writer.write(row)
+    writer.close()
+    os.replace(accRefFile + '.tmp', accRefFile)
+
+    return 0
+
+# end sortBcpFiles() -------------------------------------
+
+def reserveSequenceKeys(sequence, table, keyColumn, count):
+    # Purpose: reserves count keys of table from sequence, in one statement;
+    #   the sequence is first moved past the largest key in the table if it
+    #   is behind (it is never moved back)
+    # Returns: list of [first key, last key] ranges in key order: one range,
+    #   unless another session took values from the sequence at the same time
+    # Assumes: database connection exists; no session adds keys to table
+    #   without the sequence (max(key) + 1) until the bcp is done, since the
+    #   catch-up only sees the keys in table now
+    # Effects: advances the sequence
+    # Throws: Nothing
+
+    if count == 0:
+        return []
+
+    traceSql('catch up %s' % sequence, '''
+        select setval('%s', m.maxKey)
+        from (select max(%s) as maxKey from %s) m, %s s
+        where m.maxKey > s.last_value
+        ''' % (sequence, keyColumn, table, sequence), 'auto')
+    results = traceSql('reserve %s keys' % table, '''
+        select min(key) as firstKey, max(key) as lastKey
+        from (select key, key - row_number() over (order by key) as grp
+            from (select nextval('%s') as key from generate_series(1, %s)) k) r
+        group by grp
+        order by firstKey
+        ''' % (sequence, count), 'auto')
+    db.commit()
+
+    return [[r['firstKey'], r['lastKey']] for r in results]
+
+# end reserveSequenceKeys() -------------------------------------
+
+def keyMap(ranges):
+    # Purpose: the keys of ranges, in order
+    # Returns: array; the row written with key n gets keys[n - 1]
+    # Assumes: Nothing
+    # Effects: Nothing
+    # Throws: Nothing
+
+    keys = array('q')
+    for first, last in ranges:
+        keys.extend(range(first, last + 1))
+    return keys
+
+# end keyMap() -------------------------------------
+
+def rebaseBcpFiles():
+    # Purpose: renumbers the bcp files from the keys the writers assigned
+    #   (1, 2, ...) to the keys reserved by reserveKeys(): _StrainMarker_key
+    #   (also the _Object_key of ACC_Accession) and _Accession_key (also in
+    #   ACC_AccessionReference); the row order is kept
+    # Returns: 1 if error, else 0
+    # Assumes: the bcp files have been closed
+    # Effects: replaces the three bcp files
+    # Throws: Nothing
+
+    smKeys = keyMap(keyRanges[strainmarker_table])
+    accKeys = keyMap(keyRanges[acc_table])
+
+    for path, table, columns in ((strainMarkerFile, strainmarker_table, [(0, smKeys)]),
+                                 (accFile, acc_table, [(0, accKeys), (5, smKeys)]),
+                                 (accRefFile, accref_table, [(0, accKeys)])):
+        writer = bcpwriter.openWriter(path + '.tmp', table, bcpFormat)
+        for row in bcpwriter.readRows(path, table, bcpFormat):
+            for i, keys in columns:
+                row[i] = keys[int(row[i]) - 1]
+            writer.write(row)
+        writer.close()
+        os.replace(path + '.tmp', path)
+
+    return 0
+
+# end rebaseBcpFiles() -------------------------------------
+
+def reserveKeys():
+    # Purpose: records the keys used by the bcp files in keyRanges and the run
+    #   manifest; with keyReservation, first reserves exactly as many keys as
+    #   were written from the sequences (rebaseBcpFiles() puts them in the files)
+    # Returns: 1 if error, else 0
+    # Assumes: all rows have been written, database connection exists
+    # Effects: advances the key sequences, writes manifestFile
+    # Throws: Nothing
+
+    global keyRanges
+
+    smCt = nextSMKey - firstSMKey
+    accCt = nextAccKey - firstAccKey
+
+    # every row written takes exactly one key; a writer that skips its increment
+    # (as writeB6Output() once did for features without gene model IDs) reuses
+    # a key, and the load must stop before anything is deleted
+    for table, writer, count in ((strainmarker_table, smBcpWriter, smCt), (acc_table, accBcpWriter, accCt)):
+        if writer.rowCt != count:
+            print('reserveKeys: %s: %s rows written with %s keys' % (table, writer.rowCt, count))
+            return 1
+
+    if not keyReservation:
+        keyRanges = {
+            strainmarker_table: [[firstSMKey, nextSMKey - 1]] if smCt else [],
+            acc_table: [[firstAccKey, nextAccKey - 1]] if accCt else [],
+        }
+        writeManifest('keys assigned')
+        return 0
+
+    keyRanges = {
+        strainmarker_table: reserveSequenceKeys(smKeySequence, strainmarker_table, '_StrainMarker_key', smCt),
+        acc_table: reserveSequenceKeys(accKeySequence, acc_table, '_Accession_key', accCt),
+    }
+    # recorded right away, so a failed run still shows what it reserved
+    writeManifest('keys reserved')
+
+    for table, count in ((strainmarker_table, smCt), (acc_table, accCt)):
+        reserved = sum([last - first + 1 for first, last in keyRanges[table]])
+        if reserved != count:
+            print('reserveKeys: %s: reserved %s keys, %s needed' % (table, reserved, count))
+            return 1
+        print('reserved %s keys: %s' % (table, ', '.join(['%s-%s' % tuple(r) for r in keyRanges[table]])))
+
+    return 0
+
+# end reserveKeys() -------------------------------------
+
+def writeManifest(status):
+    # Purpose: writes the run manifest: the releases, the bcp files, the load
+    #   counts and the keys used (keyRanges) and what they are safe against,
+    #   with the status of the run
+    # Returns: Nothing
+    # Assumes: Nothing
+    # Effects: replaces manifestFile
+    # Throws: Nothing
+
+    manifest = {
+        'load': 'strainmarkerload',
+        'status': status,
+        'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'releaseMGP': releaseMGP,
+        'releaseB6': releaseB6,
+        'loadOnlyB6': loadOnlyB6,
+        'bcpFormat': bcpFormat,
+        'bcpFiles': {strainmarker_table: strainMarkerFile, acc_table: accFile, accref_table: accRefFile},
+        'counts': {'total': totalLoadedCt, 'b6': b6LoadedCt, 'mgp': mgpLoadCt},
+        'keyLimit': keyReservationLimit if keyReservation else 'keys are max(key) + 1; this load must run alone',
+        'keys': {},
+    }
+    for table, sequence in ((strainmarker_table, smKeySequence), (acc_table, accKeySequence)):
+        ranges = keyRanges.get(table, [])
+        manifest['keys'][table] = {
+            'reserved': keyReservation,
+            'sequence': sequence if keyReservation else None,
+            'count': sum([last - first + 1 for first, last in ranges]),
+            'ranges': ranges,
+        }
+
+    fp = open(manifestFile + '.tmp', 'w')
+    json.dump(manifest, fp, indent=2)
+    fp.write(CRT)
+    fp.close()
+    os.replace(manifestFile + '.tmp', manifestFile)
+
+# end writeManifest() -------------------------------------
 
 def doDeletes(refsKeys):
     # Purpose: deletes all MGI_Relationships created by this load
@@ -1153,52 +2804,322 @@ def doDeletes(refsKeys):
     # Effects: queries a database, writes number deleted to curation log
     # Throws: Nothing
 
-    db.sql('''
+    if deleteBatchSize > 0:
+        return doBatchedDeletes(refsKeys)
+
+    traceSql('select strain markers to delete', '''
     	select _StrainMarker_key
         into temporary table toDelete
         from MRK_StrainMarker
         where _Refs_key in (%s)
 	''' % refsKeys, None)
-    db.sql('''create index idx1 on toDelete(_StrainMarker_key)''', 'auto')
-    db.sql('''delete from MRK_StrainMarker sm using toDelete d where d._StrainMarker_key = sm._StrainMarker_key''', None)
+    traceSql('index strain markers to delete', '''create index idx1 on toDelete(_StrainMarker_key)''', 'auto')
+    results = traceSql('delete strain markers', '''
+        with deleted as (
+            delete from MRK_StrainMarker sm using toDelete d
+            where d._StrainMarker_key = sm._StrainMarker_key
+            returning sm._StrainMarker_key)
+        select count(*) as deletedCt from deleted
+        ''', 'auto', deletedCount)
     db.commit()
 
+    print('deleted %s strain markers' % deletedCount(results))
+
     return 0
 
 # end doDeletes() -------------------------------------
 
+def doBatchedDeletes(refsKeys):
+    # Purpose: deletes the strain markers of refsKeys deleteBatchSize at a time,
+    #   in key order, committing each batch; the cascades to ACC_Accession then
+    #   also run one batch at a time
+    #   every batch selects from what is left in MRK_StrainMarker, so an interrupted
+    #   run is resumed by simply running it again
+    # Returns: 1 if error, else 0
+    # Assumes:  database connection exists
+    # Effects: deletes from the database, prints the row count and time of each batch,
+    #   sleeps deleteBatchPause seconds between batches
+    # Throws: Nothing
+
+    batchCt = 0
+    totalCt = 0
+    start = time.time()
+    while True:
+        batchStart = time.time()
+        results = traceSql('delete strain marker batch', '''
+            with d as (
+                delete from MRK_StrainMarker
+                where _StrainMarker_key in (
+                    select _StrainMarker_key
+                    from MRK_StrainMarker
+                    where _Refs_key in (%s)
+                    order by _StrainMarker_key
+                    limit %s)
+                returning _StrainMarker_key)
+            select count(*) as deletedCt from d
+            ''' % (refsKeys, deleteBatchSize), 'auto', deletedCount)
+        db.commit()
+        deletedCt = deletedCount(results)
+        if deletedCt == 0:
+            break
+        batchCt += 1
+        totalCt += deletedCt
+        print('delete batch %s: %s rows in %.2f sec, %s total' % (batchCt, deletedCt, time.time() - batchStart, totalCt))
+        sys.stdout.flush()
+        if deleteBatchPause > 0:
+            time.sleep(deleteBatchPause)
+
+    print('deleted %s strain markers in %s batches, %.2f sec' % (totalCt, batchCt, time.time() - start))
+
+    return 0
+
+# end doBatchedDeletes() -------------------------------------
+
 def doBcp():
-    # Purpose: executes bcp
+    # Purpose: executes bcp; in bulk index mode, the non-critical indexes are
+    #   dropped for the duration of the bcp and rebuilt afterwards
     # Returns: 1 if error, else 0
     # Assumes: file descriptors have been initialized
     # Effects: sets global variables, writes to the file system
     # Throws: Nothing
 
-    bcpCmd = '%s %s %s %s %s %s "\\t" "\\n" mgd' % (bcpin, server, database, strainmarker_table, outputDir, smBcpFile)
-    print(bcpCmd)
-    rc = os.system(bcpCmd)
-    
+    droppedIndexes = []
+    if bulkIndexes:
+        droppedIndexes = dropIndexes()
+
+    rc = bcpTables()
+
+    # rebuild even if bcp failed, the tables must not be left without their indexes
+    if droppedIndexes and rebuildIndexes(droppedIndexes) != 0 and rc == 0:
+        rc = 1
+
     if rc:
         return rc
 
-    bcpCmd = '%s %s %s %s %s %s "\\t" "\\n" mgd' % (bcpin, server, database, acc_table, outputDir, accBcpFile)
+    writeLoadCounts()
+
+    return 0
+
+# end doBcp() -----------------------------------------
+
+def bcpCommand(table, bcpFile):
+    # Purpose: builds the shell command that loads bcpFile (in OUTPUTDIR) into table
+    # Returns: string
+    # Assumes: Nothing
+    # Effects: Nothing
+    # Throws: Nothing
+
+    if bcpFormat == 'binary':
+        return '''psql -h %s -d %s -U %s -v ON_ERROR_STOP=1 -c "\\copy mgd.%s from '%s/%s' with (format binary)"''' \
+            % (server, database, mgdUser, table, outputDir, bcpFile)
+
+    return '%s %s %s %s %s %s "\\t" "\\n" mgd' % (bcpin, server, database, table, outputDir, bcpFile)
+
+# end bcpCommand() -----------------------------------------
+
+def bcpTables():
+    # Purpose: bcps the three bcp files into the live tables
+    # Returns: bcp return code, 0 if all succeeded
+    # Assumes: file descriptors have been closed
+    # Effects: loads the tables, updates mrk_strainmarker_seq
+    # Throws: Nothing
+
+    bcpCmd = bcpCommand(strainmarker_table, smBcpFile)
     print(bcpCmd)
-    rc = os.system(bcpCmd)
-    
-    # update mrk_strainmarker_seq auto-sequence
-    db.sql(''' select setval('mrk_strainmarker_seq', (select max(_StrainMarker_key) from MRK_StrainMarker)) ''', None)
-    db.commit()
+    rc = traceCommand('bcp %s' % strainmarker_table, bcpCmd)
     
     if rc:
         return rc
 
-    bcpCmd = '%s %s %s %s %s %s "\\t" "\\n" mgd' % (bcpin, server, database, accref_table, outputDir, accRefBcpFile)
+    bcpCmd = bcpCommand(acc_table, accBcpFile)
     print(bcpCmd)
-    rc = os.system(bcpCmd)
+    rc = traceCommand('bcp %s' % acc_table, bcpCmd)
+    
+    # update mrk_strainmarker_seq auto-sequence; reserved keys came from it already
+    if not keyReservation:
+        traceSql('reset strain marker sequence', ''' select setval('%s', (select max(_StrainMarker_key) from MRK_StrainMarker)) ''' % smKeySequence, None)
+        db.commit()
     
     if rc:
         return rc
 
+    bcpCmd = bcpCommand(accref_table, accRefBcpFile)
+    print(bcpCmd)
+    rc = traceCommand('bcp %s' % accref_table, bcpCmd)
+
+    return rc
+
+# end bcpTables() -----------------------------------------
+
+def dropIndexes():
+    # Purpose: drops the non-critical indexes for a bulk load:
+    #   every index of MRK_StrainMarker and ACC_AccessionReference that does not
+    #   back a primary key or unique constraint, plus the ACC_Accession indexes
+    #   named in bulkAccIndexes
+    # Returns: list of (index name, create index statement) that were dropped
+    # Assumes: database connection exists
+    # Effects: drops indexes; writes their definitions to bulkIndexFile first,
+    #   so they can be recreated by hand if the load dies before rebuildIndexes()
+    # Throws: Nothing
+
+    tableClauses = ["t.relname in ('%s', '%s')" % (strainmarker_table.lower(), accref_table.lower())]
+    if bulkAccIndexes:
+        tableClauses.append("(t.relname = '%s' and i.relname in (%s))" \
+            % (acc_table.lower(), ', '.join(["'%s'" % i.lower() for i in bulkAccIndexes])))
+
+    results = traceSql('find bulk indexes', '''
+        select i.relname as indexName, pg_get_indexdef(i.oid) as indexDef
+        from pg_index x, pg_class i, pg_class t, pg_namespace n
+        where x.indexrelid = i.oid
+        and x.indrelid = t.oid
+        and t.relnamespace = n.oid
+        and n.nspname = 'mgd'
+        and not x.indisprimary
+        and not x.indisunique
+        and (%s)
+        order by t.relname, i.relname
+        ''' % ' or '.join(tableClauses), 'auto')
+    indexes = [(r['indexName'], r['indexDef']) for r in results]
+
+    fp = open(bulkIndexFile, 'w')
+    for indexName, indexDef in indexes:
+        fp.write('%s;%s' % (indexDef, CRT))
+    fp.close()
+
+    for indexName, indexDef in indexes:
+        print('dropping index %s' % indexName)
+        traceSql('drop index', '''drop index if exists mgd.%s''' % indexName, None)
+    db.commit()
+
+    return indexes
+
+# end dropIndexes() -----------------------------------------
+
+def rebuildIndex(index):
+    # Purpose: rebuilds one index in its own psql session; worker for rebuildIndexes()
+    # Returns: (index name, return code, seconds)
+    # Assumes: psql can connect as mgdUser without a password prompt (.pgpass)
+    # Effects: creates the index
+    # Throws: Nothing
+
+    indexName, indexDef = index
+    start = time.time()
+    rc = subprocess.call(['psql', '-h', server, '-d', database, '-U', mgdUser,
+        '-v', 'ON_ERROR_STOP=1', '-q', '-c', indexDef])
+    return (indexName, rc, time.time() - start)
+
+# end rebuildIndex() -----------------------------------------
+
+def rebuildIndexes(indexes):
+    # Purpose: rebuilds the indexes dropped by dropIndexes(), bulkIndexWorkers at a time
+    # Returns: 1 if any index failed to build, else 0
+    # Assumes: the curator log file descriptor has been initialized
+    # Effects: creates indexes, writes the rebuild time of each to the curator log;
+    #   removes bulkIndexFile if every index was rebuilt
+    # Throws: Nothing
+
+    start = time.time()
+    with concurrent.futures.ThreadPoolExecutor(max(1, bulkIndexWorkers)) as pool:
+        results = list(pool.map(rebuildIndex, indexes))
+    elapsed = time.time() - start
+
+    rc = 0
+    fpLogCur.write('%sIndex rebuilds (%s workers)%s' % (CRT, bulkIndexWorkers, CRT))
+    fpLogCur.write('-' * 80 + CRT)
+    for indexName, indexRc, seconds in results:
+        status = 'ok' if indexRc == 0 else 'FAILED rc=%s' % indexRc
+        print('rebuilt index %s: %.2f sec %s' % (indexName, seconds, status))
+        fpLogCur.write('%s: %.2f sec %s%s' % (indexName, seconds, status, CRT))
+        if indexRc != 0:
+            rc = 1
+    fpLogCur.write('Total index rebuild: %.2f sec%s' % (elapsed, CRT))
+
+    if rc == 0:
+        os.remove(bulkIndexFile)
+    else:
+        print('index definitions are in %s' % bulkIndexFile)
+
+    return rc
+
+# end rebuildIndexes() -----------------------------------------
+
+def doStagedBcp(refsKeys):
+    # Purpose: loads the bcp files into unlogged staging tables, indexes them, then
+    #   replaces the live strain markers of refsKeys, with their MGI type 44
+    #   ACC_Accession/ACC_AccessionReference rows, in one transaction
+    #   readers keep seeing the old rows until the commit, so the live tables are
+    #   never empty or partially loaded
+    # Returns: 1 if error, else 0
+    # Assumes: file descriptors have been closed, database connection exists,
+    #   doDeletes() has not been run
+    # Effects: creates and drops the staging tables, deletes and inserts rows
+    # Throws: Nothing
+
+    tables = [(strainmarker_table, smBcpFile), (acc_table, accBcpFile), (accref_table, accRefBcpFile)]
+
+    for table, bcpFile in tables:
+        traceSql('drop staging table', '''drop table if exists %s%s''' % (table, stageSuffix), None)
+        traceSql('create staging table', '''create unlogged table %s%s (like %s including defaults)''' % (table, stageSuffix, table), None)
+    db.commit()
+
+    for table, bcpFile in tables:
+        bcpCmd = bcpCommand(table + stageSuffix, bcpFile)
+        print(bcpCmd)
+        rc = traceCommand('bcp %s' % (table + stageSuffix), bcpCmd)
+        if rc:
+            return rc
+
+    # index the staging tables here, outside the swap transaction
+    traceSql('index staging table', '''create index %s%s_idx1 on %s%s(_StrainMarker_key)''' % (strainmarker_table, stageSuffix, strainmarker_table, stageSuffix), None)
+    traceSql('index staging table', '''create index %s%s_idx1 on %s%s(_Accession_key)''' % (acc_table, stageSuffix, acc_table, stageSuffix), None)
+    traceSql('index staging table', '''create index %s%s_idx1 on %s%s(_Accession_key)''' % (accref_table, stageSuffix, accref_table, stageSuffix), None)
+    for table, bcpFile in tables:
+        traceSql('analyze staging table', '''analyze %s%s''' % (table, stageSuffix), None)
+    db.commit()
+
+    # the swap: one transaction
+    traceSql('select strain markers to delete', '''
+    	select _StrainMarker_key
+        into temporary table toDelete
+        from MRK_StrainMarker
+        where _Refs_key in (%s)
+	''' % refsKeys, None)
+    traceSql('index strain markers to delete', '''create index idx1 on toDelete(_StrainMarker_key)''', None)
+    traceSql('delete strain marker accession references', '''
+        delete from ACC_AccessionReference r using ACC_Accession a, toDelete d
+        where r._Accession_key = a._Accession_key
+        and a._MGIType_key = %s
+        and a._Object_key = d._StrainMarker_key
+        ''' % mgiTypeKey, None)
+    traceSql('delete strain marker accessions', '''
+        delete from ACC_Accession a using toDelete d
+        where a._MGIType_key = %s
+        and a._Object_key = d._StrainMarker_key
+        ''' % mgiTypeKey, None)
+    traceSql('delete strain markers', '''delete from MRK_StrainMarker sm using toDelete d where d._StrainMarker_key = sm._StrainMarker_key''', None)
+    for table, bcpFile in tables:
+        traceSql('insert from staging table', '''insert into %s select * from %s%s''' % (table, table, stageSuffix), None)
+    if not keyReservation:
+        traceSql('reset strain marker sequence', ''' select setval('%s', (select max(_StrainMarker_key) from MRK_StrainMarker)) ''' % smKeySequence, None)
+    db.commit()
+
+    for table, bcpFile in tables:
+        traceSql('drop staging table', '''drop table if exists %s%s''' % (table, stageSuffix), None)
+    db.commit()
+
+    writeLoadCounts()
+
+    return 0
+
+# end doStagedBcp() -----------------------------------------
+
+def writeLoadCounts():
+    # Purpose: writes the load counts to the curator log and closes it
+    # Returns: Nothing
+    # Assumes: the curator log file descriptor has been initialized
+    # Effects: writes to the file system
+    # Throws: Nothing
+
     fpLogCur.write('\nLoaded %s Strain Markers\n\n' % totalLoadedCt)
     fpLogCur.write('Total MGP in input: %s\n\n' % mgpFileCt)
     fpLogCur.write('Total MGP skipped: %s\n\n' % mgpSkipCt)
@@ -1207,88 +3128,280 @@ def doBcp():
     fpLogCur.write('Total B6 Strain Markers Loaded: %s\n\n' % b6LoadedCt)
     fpLogCur.close()
 
-    return 0
+# end writeLoadCounts() -----------------------------------------
 
+def writeQcCounts():
+    # Purpose: writes the counts of a QC only run to the curator log
+    # Returns: Nothing
+    # Assumes: the curator log file descriptor has been initialized
+    # Effects: writes to the file system
+    # Throws: Nothing
 
-# end doBcp() -----------------------------------------
+    fpLogCur.write('\nQC only, nothing loaded: %s Strain Markers would be loaded\n\n' % totalLoadedCt)
+    if strainFilter or chrFilter or sampleFraction < 1:
+        fpLogCur.write('Subset: strains %s, chromosomes %s, sample %s\n\n' \
+            % (', '.join(strainFilter) or 'all', ', '.join(sorted(chrFilter)) or 'all', sampleFraction))
+    fpLogCur.write('Total MGP in input: %s\n\n' % mgpFileCt)
+    fpLogCur.write('Total MGP skipped: %s\n\n' % mgpSkipCt)
+    fpLogCur.write('Total MGP Strain Markers that would be loaded: %s\n\n' % mgpLoadCt)
+    fpLogCur.write('Total MGP Strain Markers that would be loaded with no Marker: %s\n\n' % mgpNoMarkerCt)
+    fpLogCur.write('Total B6 Strain Markers that would be loaded: %s\n\n' % b6LoadedCt)
+    for strain in ctByStrain:
+        fpLogCur.write('%s: %s records in input\n' % (strain, ctByStrain[strain]))
+
+# end writeQcCounts() -----------------------------------------
+
+def geneModels():
+    # Purpose: the gene model output of the last run, when GM_FORMAT is 'memory'
+    # Returns: {'mgp': (gene model rows, biotype rows), 'b6': (...)}; rows are
+    #   the tuples that would be written to the gene model and biotype files
+    # Assumes: run() has been called with GM_FORMAT 'memory'
+    # Effects: Nothing
+    # Throws: Nothing
 
-#####################
-#
-# Main
-#
-#####################
+    return {'mgp': (gmMgpWriter.rows, biotypeMgpWriter.rows),
+            'b6': (gmB6Writer.rows, biotypeB6Writer.rows)}
 
-print('%s' % mgi_utils.date())
-print('running init')
-if init() != 0:
-    print('Initialization failed')
-    closeFiles()
-    sys.exit(1)
+# end geneModels() -------------------------------
+
+def run(config, lookups=None):
+    # Purpose: runs one load: QC, the bcp files and (unless QC_ONLY)
+    #   the delete and reload of the strain markers
+    # Returns: the exit code, see the header
+    # Assumes: Nothing
+    # Effects: see the header; lookups, if given, are loaded if empty and
+    #   may be passed to later runs
+    # Throws: Nothing
+
+    global sqlTracer
+
+    configure(config)
+    if lookups is None:
+        lookups = Lookups()
+    print('loadOnlyB6: %s' % loadOnlyB6)
+
+    # subset runs never delete
+    if checkFilters() != 0:
+        return 1
+
+    sqlTracer = sqltrace.SqlTracer(sqlTraceFile, sqlSlowSeconds)
+
+    try:
+        return runSteps(lookups)
+    finally:
+        if fpLogCur and not fpLogCur.closed:
+            fpLogCur.close()
+        reportMemory()
+        for title, rules in [('QC rules (MGP files)', mgpFileQcRules), ('QC rules (MGP)', mgpQcRules),
+                ('QC rules (B6)', b6QcRules)]:
+            if rules is not None:
+                for line in rules.report(title):
+                    print(line)
+        for line in sqlTracer.report():
+            print(line)
+        sqlTracer.close()
+        sqlTracer = None
+
+# end run() -------------------------------
+
+def runSteps(lookups):
+    # Purpose: the steps of run()
+    # Returns: the exit code
 
-# parse MGP input files, write MGP QC and write MGP BCP, unless we are only reloading B6
-if loadOnlyB6 == 'false':
     print('%s' % mgi_utils.date())
-    print('running parseMGPFiles')
-    if parseMGPFiles() != 0:
-        print('Parsing MGP Files failed')
+    print('running init')
+    if init(lookups) != 0:
+        print('Initialization failed')
         closeFiles()
-        sys.exit(1)
+        return 1
+
+    # parse MGP input files, write MGP QC and write MGP BCP, unless we are only reloading B6
+    # a QC only run parses and QCs the strain files in parallel and writes no BCP
+    if loadOnlyB6 == 'false' and qcOnly:
+        print('%s' % mgi_utils.date())
+        print('running qcMGPFiles')
+        if qcMGPFiles() != 0:
+            print('QC of MGP Files failed')
+            closeFiles()
+            return 1
+
+        print('%s' % mgi_utils.date())
+        print('running writeCuratorLog')
+        if writeCuratorLog() != 0:
+            print('Fatal error writing Curator Log - see %s' % curLog)
+            closeFiles()
+            return 1
+
+    elif loadOnlyB6 == 'false':
+        print('%s' % mgi_utils.date())
+        print('running parseMGPFiles')
+        if parseMGPFiles() != 0:
+            print('Parsing MGP Files failed')
+            closeFiles()
+            return 1
+
+        # write QC
+        print('%s' % mgi_utils.date())
+        print('running writeCuratorLog')
+        if writeCuratorLog() != 0:
+            print('Fatal error writing Curator Log - see %s' % curLog)
+            closeFiles()
+            return 1
+
+        # write MGP to the bcp files
+        print('%s' % mgi_utils.date())
+        print('running writeMGPOutput')
+        if writeMGPOutput() != 0:
+            print('Writing MGP Output Files failed')
+            closeFiles()
+            return 1
 
-    # write QC
     print('%s' % mgi_utils.date())
-    print('running writeCuratorLog')
-    if writeCuratorLog() != 0:
+    print('running parseB6File')
+    if parseB6File() != 0:
+        print('Parsing MGI GFF file failed')
+        closeFiles()
+        return 1
+    if qcOnly:
+        print('%s' % mgi_utils.date())
+        print('running qcB6Output')
+        if qcB6Output() != 0:
+            print('QC of MGI GFF file failed')
+            closeFiles()
+            return 1
+    else:
+        print('%s' % mgi_utils.date())
+        print('running writeB6Output')
+        if writeB6Output () != 0:
+            print('Writing B6 Output Files failed')
+            closeFiles()
+            return 1
+        for accID, fast, expected in accSplitter.mismatches:
+            print('accsplit disagreement: %s fast %s, split_accnum %s' % (accID, fast, expected))
+        print(accSplitter.report())
+
+    print('%s' % mgi_utils.date())
+    print('running writeB6CuratorLog')
+    if writeB6CuratorLog() != 0:
         print('Fatal error writing Curator Log - see %s' % curLog)
         closeFiles()
-        sys.exit(1)
+        return 1
 
-    # write MGP to the bcp files
+    # the same accession ID twice for a logical DB would only fail in bcp, after the deletes
     print('%s' % mgi_utils.date())
-    print('running writeMGPOutput')
-    if writeMGPOutput() != 0:
-        print('Writing MGP Output Files failed')
+    print('running writeAccCollisions')
+    if writeAccCollisions() != 0:
+        print('Fatal accession ID collisions - see %s' % curLog)
         closeFiles()
-        sys.exit(1)
-
-print('%s' % mgi_utils.date())
-print('running parseB6File')
-if parseB6File() != 0:
-    print('Parsing MGI GFF file failed')
-    closeFiles()
-    sys.exit(1)
-print('%s' % mgi_utils.date())
-print('running writeB6Output')
-if writeB6Output () != 0:
-    print('Writing B6 Output Files failed')
-    closeFiles()
-    sys.exit(1)
-
-if QC_ONLY == 'false':
+        return 1
 
+    if qcOnly:
+        writeQcCounts()
+        print('%s' % mgi_utils.date())
+        print('running closeFiles()')
+        if closeFiles() != 0:
+            print('Closing Files failed')
+            return 1
+        return 0
+
+    # before anything is deleted
     print('%s' % mgi_utils.date())
+    print('running reserveKeys()')
+    if reserveKeys() != 0:
+        print('Reserving keys failed')
+        closeFiles()
+        return 1
+
     refsKeys = '%s, %s' % (b6RefsKey, mgpRefsKey) # default is B6 and MGP
     if loadOnlyB6 == 'true': # load only B6
         refsKeys = b6RefsKey
 
-    print('running doDeletes(%s)' % refsKeys)
+    # in staged mode the live rows are replaced by doStagedBcp(), after bcp
+    if QC_ONLY == 'false' and not stagedSwap:
 
-    if doDeletes(refsKeys) != 0:
-        print('Deleting Strain Markers failed')
-        sys.exit(1)
-        
-# close all output files
-print('%s' % mgi_utils.date())
-print('running closeFiles()')
-if closeFiles() != 0:
-    print('Closing Files failed')
-    sys.exit(1)
-
-if QC_ONLY == 'false':
-    # execute bcp
+        print('%s' % mgi_utils.date())
+        print('running doDeletes(%s)' % refsKeys)
+
+        if doDeletes(refsKeys) != 0:
+            print('Deleting Strain Markers failed')
+            return 1
+
+    # close all output files
     print('%s' % mgi_utils.date())
-    print('running doBcp()')
-    if doBcp() != 0:
-        print('Do BCP failed')
-        sys.exit(1)
+    print('running closeFiles()')
+    if closeFiles() != 0:
+        print('Closing Files failed')
+        return 1
+
+    if QC_ONLY == 'false' and bcpSorted:
+        print('%s' % mgi_utils.date())
+        print('running sortBcpFiles()')
+        if sortBcpFiles() != 0:
+            print('Sorting BCP files failed')
+            return 1
+
+    if QC_ONLY == 'false' and keyReservation:
+        print('%s' % mgi_utils.date())
+        print('running rebaseBcpFiles()')
+        if rebaseBcpFiles() != 0:
+            print('Renumbering BCP files failed')
+            return 1
+
+    if QC_ONLY == 'false' and stagedSwap:
+        # bcp into the staging tables, then swap
+        print('%s' % mgi_utils.date())
+        print('running doStagedBcp(%s)' % refsKeys)
+        if doStagedBcp(refsKeys) != 0:
+            print('Do Staged BCP failed')
+            writeManifest('bcp failed')
+            return 1
+        writeManifest('loaded')
+    elif QC_ONLY == 'false':
+        # execute bcp
+        print('%s' % mgi_utils.date())
+        print('running doBcp()')
+        if doBcp() != 0:
+            print('Do BCP failed')
+            writeManifest('bcp failed')
+            return 1
+        writeManifest('loaded')
+
+    return 0
+
+# end runSteps() -------------------------------
+
+def main():
+    # Purpose: command line entry point; the configuration is read from
+    #   the environment (see strainmarkerload.config); the subset filters
+    #   may also be given as options
+    # Returns: the exit code
+
+    # unexpected arguments print the usage and exit 2
+    parser = argparse.ArgumentParser(prog=USAGE, description='Strain marker load; configured by strainmarkerload.config.')
+    parser.add_argument('--strains', metavar='LIST',
+        help='QC only: comma-separated strains (MGI strain, genome-version strain or file name; C57BL/6J for B6). Overrides STRAIN_FILTER')
+    parser.add_argument('--chromosomes', metavar='LIST',
+        help='QC only: comma-separated chromosomes. Overrides CHR_FILTER')
+    parser.add_argument('--sample', metavar='FRACTION',
+        help='QC only: deterministic sample of the records, 0 < FRACTION <= 1. Overrides SAMPLE_FRACTION')
+    args = parser.parse_args()
+
+    config = LoadConfig.fromEnvironment()
+    if args.strains is not None:
+        config.STRAIN_FILTER = args.strains
+    if args.chromosomes is not None:
+        config.CHR_FILTER = args.chromosomes
+    if args.sample is not None:
+        config.SAMPLE_FRACTION = args.sample
+
+    db.setTrace(True)
+    return run(config)
+
+#####################
+#
+# Main
+#
+#####################
 
-sys.exit(0)
+if __name__ == '__main__':
+    sys.exit(main())
@@ -41,7 +41,8 @@
 #      1) run ensembl gff3 116 patching : 'patched' folder
 #      2) copy patched files from 'patched' folder to 'input' folder and unzip
 #      3) copy & unzip the MGI gff3 file from '/export/???/ftp/pub/mgigff3' folder to 'input' folder
-#      4) run strainmarkerload.py
+#      4) build gff3cache sidecars of the input files (if GFF3_CACHE=true)
+#      5) run strainmarkerload.py
 #
 ###########################################################################
 #
@@ -163,6 +164,31 @@ else
     echo "${INPUTDIR}/lastrun exists; skipping GFF3 copy" >> ${LOG_DIAG} 2>&1
 fi
 
+#
+# build pre-parsed sidecars for any GFF3 input whose sidecar is missing or stale
+# if a sidecar cannot be built, it is removed and strainmarkerload.py reads the
+# GFF3 text of that file instead
+#
+if [ "${GFF3_CACHE}" = "true" ]
+then
+    date >> ${LOG_DIAG} 2>&1
+    echo "Building gff3cache sidecars" >> ${LOG_DIAG} 2>&1
+    GFF3_FILES=""
+    for i in ${INPUT_MGP_DIR_LIST}
+    do
+        GFF3_FILES="${GFF3_FILES} ${INPUTDIR}/$i"
+    done
+    for i in ${GFF3_FILES} ${INPUT_MGI_GFF_FILE}
+    do
+        ${PYTHON} ${STRAINMARKERLOAD}/bin/patching/gff3cache.py $i >> ${LOG_DIAG} 2>&1
+        if [ $? -ne 0 ]
+        then
+            echo "gff3cache failed for $i; reading the GFF3 text instead" >> ${LOG_DIAG} 2>&1
+            rm -f $i.g3c
+        fi
+    done
+fi
+
 #
 # run the load
 #